@@ -4,8 +4,11 @@ set -u -o pipefail
 
 SCRIPT_DIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" &>/dev/null && pwd)
 ANALYSIS_SCRIPT="$SCRIPT_DIR/trace-analyze2.py"
+CACHE_SCRIPT="$SCRIPT_DIR/trace-result-cache.py"
 TARGET_DIR=$(pwd)
 RESULTS_DIR="$TARGET_DIR/results"
+# Results of unchanged traces are reused from here, see trace-result-cache.py.
+CACHE_DIR="${TRACE_RESULT_CACHE_DIR:-$RESULTS_DIR/.cache}"
 
 declare -a PIDS=()
 
@@ -22,6 +25,24 @@ resolve_max_jobs() {
     echo "$jobs_value"
 }
 
+resolve_cache_mode() {
+    local cache_mode
+
+    # on: reuse cached results; refresh: re-analyze and replace them (after analyzer
+    # changes the cache key does not see); off: neither read nor write the cache.
+    cache_mode="${TRACE_RESULT_CACHE:-on}"
+
+    case "$cache_mode" in
+        on|refresh|off)
+            echo "$cache_mode"
+            ;;
+        *)
+            echo "Error: TRACE_RESULT_CACHE must be 'on', 'refresh' or 'off', got '$cache_mode'." >&2
+            return 1
+            ;;
+    esac
+}
+
 action_on_signal() {
     local pid
     echo
@@ -35,23 +56,33 @@ action_on_signal() {
 
 process_trace() {
     local zst_file="$1"
-    local base_name output_file
+    local base_name output_file json_file cache_key
 
     base_name=$(basename -- "$zst_file" .zst)
     output_file="$RESULTS_DIR/${base_name}.log"
+    json_file="$RESULTS_DIR/${base_name}.json"
 
     (
-        temp_file=$(mktemp --tmpdir="$TARGET_DIR" ".${base_name}.trace-analyze2.XXXXXX")
-        trap 'rm -f -- "$temp_file"' EXIT INT TERM
-
-        echo " - Processing '$(basename -- "$zst_file")'..."
+        cache_key=""
+        if [ "$CACHE_MODE" != "off" ]; then
+            cache_key=$(python3 "$CACHE_SCRIPT" key "$zst_file" "$ANALYSIS_SCRIPT" --json) || cache_key=""
+        fi
 
-        if ! zstd -d -c -- "$zst_file" > "$temp_file"; then
-            echo "   -> Failed to decompress '$zst_file'" >&2
-            exit 1
+        if [ -n "$cache_key" ] && [ "$CACHE_MODE" = "on" ] \
+            && python3 "$CACHE_SCRIPT" get "$CACHE_DIR" "$cache_key" "$zst_file" "$output_file" "$json_file"; then
+            echo " - Skipping unchanged '$(basename -- "$zst_file")', cached result restored to '$output_file'"
+            exit 0
         fi
 
-        if python3 "$ANALYSIS_SCRIPT" "$temp_file" > "$output_file"; then
+        echo " - Processing '$(basename -- "$zst_file")'..."
+
+        # trace-analyze2.py decompresses .zst input as a stream, no temp file needed.
+        # The JSON record is what trace-summarize-results.py reads.
+        if python3 "$ANALYSIS_SCRIPT" "$zst_file" --json "$json_file" > "$output_file"; then
+            if [ -n "$cache_key" ]; then
+                python3 "$CACHE_SCRIPT" put "$CACHE_DIR" "$cache_key" "$output_file" "$json_file" \
+                    || echo "   -> Warning: could not cache the result of '$zst_file'" >&2
+            fi
             echo "   -> Result saved to '$output_file'"
             exit 0
         fi
@@ -67,6 +98,10 @@ if ! MAX_JOBS=$(resolve_max_jobs); then
     exit 1
 fi
 
+if ! CACHE_MODE=$(resolve_cache_mode); then
+    exit 1
+fi
+
 echo "Searching for .zst traces in '$TARGET_DIR'..."
 echo "Running up to $MAX_JOBS analysis process(es) in parallel."
 
@@ -107,6 +142,7 @@ done
 echo
 if [ "$failed_any" -eq 0 ]; then
     echo "Analysis complete. All results are in '$RESULTS_DIR'."
+    echo "Summary table: python3 '$SCRIPT_DIR/trace-summarize-results.py' '$RESULTS_DIR'"
 else
     echo "Analysis complete with errors. Partial results are in '$RESULTS_DIR'." >&2
     exit 1
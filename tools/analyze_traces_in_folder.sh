@@ -19,6 +19,18 @@ TRACE_DIR=$1
 # Directory to store analysis results, inside the trace directory
 RESULTS_DIR="$TRACE_DIR/results"
 ANALYSIS_SCRIPT=""
+# Results of unchanged traces are reused from here, see trace-result-cache.py
+CACHE_DIR="${TRACE_RESULT_CACHE_DIR:-$RESULTS_DIR/.cache}"
+# on: reuse cached results; refresh: re-analyze and replace them; off: no cache
+CACHE_MODE="${TRACE_RESULT_CACHE:-on}"
+
+case "$CACHE_MODE" in
+  on|refresh|off) ;;
+  *)
+    echo "Error: TRACE_RESULT_CACHE must be 'on', 'refresh' or 'off', got '$CACHE_MODE'." >&2
+    exit 1
+    ;;
+esac
 
 # 2. Locate the analysis script
 # First, check if 'trace-analyze.py' is in the PATH
@@ -40,6 +52,14 @@ if [ -z "$ANALYSIS_SCRIPT" ]; then
     exit 1
 fi
 
+# The cache helper lives next to the analysis script
+ANALYSIS_PATH=$(command -v "$ANALYSIS_SCRIPT")
+CACHE_SCRIPT="$(dirname -- "$ANALYSIS_PATH")/trace-result-cache.py"
+if [ "$CACHE_MODE" != "off" ] && [ ! -f "$CACHE_SCRIPT" ]; then
+    echo "Warning: '$CACHE_SCRIPT' not found, results will not be cached." >&2
+    CACHE_MODE="off"
+fi
+
 # 3. Create results directory
 mkdir -p "$RESULTS_DIR"
 
@@ -54,6 +74,17 @@ find "$TRACE_DIR" -maxdepth 1 -type f -name '*.zst' -print0 | while IFS= read -r
   # Construct the output filename
   output_file="$RESULTS_DIR/${base_name}.log"
 
+  cache_key=""
+  if [ "$CACHE_MODE" != "off" ]; then
+    cache_key=$(python3 "$CACHE_SCRIPT" key "$zst_file" "$ANALYSIS_PATH") || cache_key=""
+  fi
+
+  if [ -n "$cache_key" ] && [ "$CACHE_MODE" = "on" ] \
+      && python3 "$CACHE_SCRIPT" get "$CACHE_DIR" "$cache_key" "$zst_file" "$output_file"; then
+    echo " - Skipping unchanged '$zst_file', cached result restored to '$output_file'"
+    continue
+  fi
+
   echo " - Processing '$zst_file'..."
 
   # Decompress the file and pipe it to the analysis script via process substitution <().
@@ -63,6 +94,10 @@ find "$TRACE_DIR" -maxdepth 1 -type f -name '*.zst' -print0 | while IFS= read -r
 
   # Check the exit code of the last command
   if [ $? -eq 0 ]; then
+    if [ -n "$cache_key" ]; then
+      python3 "$CACHE_SCRIPT" put "$CACHE_DIR" "$cache_key" "$output_file" \
+        || echo "   -> Warning: could not cache the result of '$zst_file'" >&2
+    fi
     echo "   -> Result saved to '$output_file'"
   else
     echo "   -> Error processing '$zst_file'. The file '$output_file' may contain error details."
@@ -1,6 +1,203 @@
 #!/usr/bin/env python3
 import sys
 import argparse
+import heapq
+import tempfile
+from itertools import islice
+
+from trace_access_counts import row_fields
+from trace_columns import ColumnarTrace, is_columnar_trace
+from trace_locations import parse_source
+
+DEFAULT_RUN_ROWS = 500_000
+ROLLUP_LEVELS = ("source", "line", "file", "function")
+
+
+def read_rows(input_file):
+    """Yields the per-address rows of a get-stats log or a columnar trace, split into fields."""
+    if is_columnar_trace(input_file):
+        # Build the per-address table straight from the columns instead of a get-stats log
+        with ColumnarTrace(input_file) as trace:
+            for row in trace.address_table():
+                yield row_fields(row)
+        return
+
+    with open(input_file, 'r') as f:
+        for line in f:
+            yield line.split()
+
+
+def valid_rows(rows, totals):
+    """
+    Yields (R/W count, W count, R count, address, source locations) for the
+    rows with numeric counts, adding the counts to `totals` as they go; the
+    totals are complete once the rows are exhausted.
+    """
+    for parts in rows:
+        # A valid line must have at least 6 columns
+        if len(parts) < 6:
+            continue
+
+        try:
+            rw_count = int(parts[1])
+            w_count = int(parts[2])
+            r_count = int(parts[3])
+            int(parts[4])  # Validate SWMR flag is numeric
+        except ValueError:
+            # Silently ignore lines that don't match the expected numeric format
+            continue
+
+        totals[0] += rw_count
+        totals[1] += w_count
+        totals[2] += r_count
+        # Re-join the source location parts (from the 6th element onwards)
+        yield rw_count, w_count, r_count, parts[0], ' '.join(parts[5:])
+
+
+def rw_count_of(row):
+    return row[0]
+
+
+def read_run(run_file):
+    for line in run_file:
+        rw_count, w_count, r_count, address, source_locations = line.rstrip('\n').split(' ', 4)
+        yield int(rw_count), int(w_count), int(r_count), address, source_locations
+
+
+def external_sort(rows, run_rows, temp_dir=None):
+    """
+    Sorts rows by R/W count, descending, holding at most `run_rows` of them in
+    memory: sorted runs are spilled to temporary files and merged lazily.
+    Ties keep their input order, as with sorted().
+    """
+    runs = []
+    while True:
+        run = list(islice(rows, run_rows))
+        if not run:
+            break
+        run.sort(key=rw_count_of, reverse=True)
+
+        run_file = tempfile.TemporaryFile('w+', dir=temp_dir, prefix='sort-stats-run-')
+        run_file.writelines(f"{rw_count} {w_count} {r_count} {address} {source_locations}\n" for rw_count, w_count, r_count, address, source_locations in run)
+        run_file.seek(0)
+        runs.append(run_file)
+        del run
+
+    return merge_runs(runs)
+
+
+def merge_runs(runs):
+    try:
+        # heapq.merge takes equal keys from earlier runs first, so the merge is stable too
+        yield from heapq.merge(*(read_run(run_file) for run_file in runs), key=rw_count_of, reverse=True)
+    finally:
+        for run_file in runs:
+            run_file.close()
+
+
+def rollup(rows, level):
+    """
+    Groups the rows by source location at `level` (source, line, file or
+    function) in one pass. An address's writes are split evenly between its
+    W: locations and its reads between its R: locations, as get-stats does
+    not count per source; the shares of all groups add up to the totals.
+    Returns {key: [R/W, W, R, addresses, location]}.
+    """
+    groups = {}
+    locations = {}  # source -> (location, key), parsed once per distinct source
+
+    def keys_of(tokens, prefix):
+        keys = {}
+        for token in tokens:
+            if not token.startswith(prefix) or len(token) == 2:
+                continue
+            source = token[2:]
+            cached = locations.get(source)
+            if cached is None:
+                location = parse_source(source)
+                cached = locations[source] = (location, source if level == "source" else location.key(level))
+            keys[cached[1]] = cached[0]
+        return keys
+
+    for rw_count, w_count, r_count, address, source_locations in rows:
+        tokens = source_locations.split()
+        write_keys = keys_of(tokens, "W:")
+        read_keys = keys_of(tokens, "R:")
+
+        for keys, count, column in ((write_keys, w_count, 1), (read_keys, r_count, 2)):
+            if not keys:
+                continue
+            share = count / len(keys)
+            for key, location in keys.items():
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = [0.0, 0.0, 0.0, 0, location]
+                group[0] += share
+                group[column] += share
+
+        for key in write_keys.keys() | read_keys.keys():
+            groups[key][3] += 1
+
+    return groups
+
+
+def print_footer(total_rw, total_w, total_r):
+    # Print a summary footer with the totals
+    if total_rw > 0:
+        print("-" * 120)
+        print("Total Operations Summary:")
+        print(f"  - Reads + Writes: {total_rw:,}")
+        print(f"  - Writes:         {total_w:,}")
+        print(f"  - Reads:          {total_r:,}")
+
+
+def print_rollup(groups, level, parse_locations, top, totals):
+    total_rw, total_w, total_r = totals
+    items = groups.items()
+    if top is not None:
+        ranked = heapq.nlargest(top, items, key=lambda item: item[1][0])
+    else:
+        ranked = sorted(items, key=lambda item: item[1][0], reverse=True)
+
+    if parse_locations:
+        location_header = f"{'Line':>7} {'Col':>5}   File (function)"
+    else:
+        location_header = level.capitalize()
+    print(
+        f"{'% R/W':>10} "
+        f"{'% Writes':>11} "
+        f"{'% Reads':>10} "
+        f"{'R/W':>14} "
+        f"{'Addresses':>10}   "
+        f"{location_header}"
+    )
+    print("-" * 120)
+
+    for key, (rw_count, w_count, r_count, addresses, location) in ranked:
+        percent_rw = (rw_count / total_rw * 100) if total_rw > 0 else 0
+        percent_w = (w_count / total_w * 100) if total_w > 0 else 0
+        percent_r = (r_count / total_r * 100) if total_r > 0 else 0
+
+        if parse_locations:
+            # Parts the rollup level drops are not shown
+            line = location.line if location.line is not None and level in ("source", "line") else "-"
+            column = location.column if location.column is not None and level == "source" else "-"
+            function = location.function if level in ("source", "function") else None
+            file = location.file if level != "function" else "-"
+            key = f"{line:>7} {column:>5}   {file}" + (f" ({function})" if function else "")
+
+        print(
+            f"{percent_rw:>9.2f}% "
+            f"{percent_w:>10.2f}% "
+            f"{percent_r:>9.2f}% "
+            f"{round(rw_count):>14} "
+            f"{addresses:>10}   "
+            f"{key}"
+        )
+
+    print_footer(total_rw, total_w, total_r)
+    print(f"  - {level.capitalize() + 's:':<16}{len(groups):,}")
+
 
 def main():
     """
@@ -13,45 +210,75 @@ def main():
     )
     parser.add_argument(
         "input_file",
-        help="The path to the log file to be analyzed."
+        help="The path to the log file to be analyzed, or a columnar trace directory from trace-to-columns.py."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--top",
+        type=int,
+        metavar="K",
+        help="Only print the K addresses with most reads and writes, keeping just those in memory (the totals still cover every address)."
+    )
+    mode.add_argument(
+        "--external",
+        action="store_true",
+        help="Sort in runs spilled to temporary files and merge them, so that memory stays bounded by --run-rows."
+    )
+    parser.add_argument(
+        "--rollup",
+        choices=ROLLUP_LEVELS,
+        help="Aggregate by source location, source line, file or function instead of listing addresses "
+        "(an address's reads and writes are split evenly between the locations it lists); "
+        "--top then limits the number of groups."
+    )
+    parser.add_argument(
+        "--parse-locations",
+        action="store_true",
+        help="With --rollup, print locations split into line, column, file and function (from function@file:line:col)."
+    )
+    parser.add_argument(
+        "--run-rows",
+        type=int,
+        default=DEFAULT_RUN_ROWS,
+        metavar="N",
+        help=f"Rows per sorted run with --external (default: {DEFAULT_RUN_ROWS})."
+    )
+    parser.add_argument(
+        "--temp-dir",
+        metavar="DIR",
+        help="Directory for the runs of --external (default: the system temporary directory)."
     )
     args = parser.parse_args()
 
-    try:
-        with open(args.input_file, 'r') as f:
-            lines = f.readlines()
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be a positive integer")
+    if args.run_rows < 1:
+        parser.error("--run-rows must be a positive integer")
+    if args.rollup is not None and args.external:
+        parser.error("--rollup keeps one entry per location in memory, --external does not apply")
+    if args.parse_locations and args.rollup is None:
+        parser.error("--parse-locations needs --rollup")
 
+    try:
         # --- Pass 1: Validate lines and calculate totals ---
-        valid_data = []
-        total_rw, total_w, total_r = 0, 0, 0
-
-        for line_num, line in enumerate(lines, 1):
-            if not line.strip():
-                continue
-
-            parts = line.split()
-            # A valid line must have at least 6 columns
-            if len(parts) < 6:
-                continue
-
-            try:
-                rw_count = int(parts[1])
-                w_count = int(parts[2])
-                r_count = int(parts[3])
-                int(parts[4])  # Validate SWMR flag is numeric
+        totals = [0, 0, 0]
+        rows = valid_rows(read_rows(args.input_file), totals)
 
-                total_rw += rw_count
-                total_w += w_count
-                total_r += r_count
-
-                # Store the entire list of parts for the second pass
-                valid_data.append(parts)
-            except (ValueError, IndexError):
-                # Silently ignore lines that don't match the expected numeric format
-                continue
+        if args.rollup is not None:
+            groups = rollup(rows, args.rollup)
+            print_rollup(groups, args.rollup, args.parse_locations, args.top, totals)
+            return
 
         # --- Sort the valid data by the total R/W column (index 1) ---
-        sorted_data = sorted(valid_data, key=lambda p: int(p[1]), reverse=True)
+        # All three consume every row before the first one is printed, so the totals are complete
+        if args.top is not None:
+            sorted_data = heapq.nlargest(args.top, rows, key=rw_count_of)
+        elif args.external:
+            sorted_data = external_sort(rows, args.run_rows, args.temp_dir)
+        else:
+            sorted_data = sorted(rows, key=rw_count_of, reverse=True)
+
+        total_rw, total_w, total_r = totals
 
         # --- Pass 2: Calculate percentages and print the formatted output ---
 
@@ -66,15 +293,7 @@ def main():
         print(header)
         print("-" * 120) # A wide separator for readability
 
-        for parts in sorted_data:
-            address = parts[0]
-            rw_count = int(parts[1])
-            w_count = int(parts[2])
-            r_count = int(parts[3])
-
-            # Re-join the source location parts (from the 6th element onwards)
-            source_locations = ' '.join(parts[5:])
-
+        for rw_count, w_count, r_count, address, source_locations in sorted_data:
             # Calculate percentages, handling potential division by zero
             percent_rw = (rw_count / total_rw * 100) if total_rw > 0 else 0
             percent_w = (w_count / total_w * 100) if total_w > 0 else 0
@@ -89,17 +308,14 @@ def main():
                 f"{source_locations}"
             )
 
-        # Print a summary footer with the totals
-        if total_rw > 0:
-            print("-" * 120)
-            print("Total Operations Summary:")
-            print(f"  - Reads + Writes: {total_rw:,}")
-            print(f"  - Writes:         {total_w:,}")
-            print(f"  - Reads:          {total_r:,}")
+        print_footer(total_rw, total_w, total_r)
 
     except FileNotFoundError:
         print(f"Error: The file '{args.input_file}' was not found.", file=sys.stderr)
         sys.exit(1)
+    except RuntimeError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
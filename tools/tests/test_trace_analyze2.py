@@ -0,0 +1,101 @@
+"""Tests for trace-analyze2.py."""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOLS_DIR)
+
+
+def load_analyzer():
+    spec = importlib.util.spec_from_file_location("trace_analyze2", os.path.join(TOOLS_DIR, "trace-analyze2.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+analyzer = load_analyzer()
+
+TRACE = (
+    "==1== starting\n"
+    " > write 0x7b0400000810 4 1 src/a.c:1:1\n"
+    " > read 0x7b0400000810 4 2 src/a.c:2:1\n"
+    " > read 0x7b0400000818 8 2 src/a.c:3:1\n"
+)
+
+
+def write_trace(tmp_path, text):
+    path = tmp_path / "trace.txt"
+    path.write_text(text)
+    return str(path)
+
+
+def test_file_smaller_than_job_count(tmp_path):
+    path = write_trace(tmp_path, " > write 0x10 4 1 src/a.c:1:1\n")
+
+    stats = analyzer.analyze_parallel(path, False, 64)
+
+    assert stats.access_total == 1
+    assert stats.lines.total_lines == 1
+
+
+def test_chunk_ranges_cover_every_line_once(tmp_path):
+    path = write_trace(tmp_path, TRACE)
+    size = os.path.getsize(path)
+
+    for jobs in (1, 2, 3, 5, 64, size + 10):
+        ranges = analyzer.chunk_ranges(path, jobs)
+        assert ranges[0][0] == 0 and ranges[-1][1] == size
+        assert all(start < end for start, end in ranges)
+        assert all(previous[1] == following[0] for previous, following in zip(ranges, ranges[1:]))
+
+        lines = [line for start, end in ranges for line in analyzer.iter_chunk_lines(path, start, end)]
+        assert "".join(lines) == TRACE
+
+
+def test_parallel_matches_sequential(tmp_path):
+    path = write_trace(tmp_path, TRACE * 50)
+    sequential = analyzer.analyze_sequential(path, False)
+
+    for jobs in (2, 7, 1000):
+        parallel = analyzer.analyze_parallel(path, False, jobs)
+        assert parallel.access_total == sequential.access_total
+        assert parallel.access_multi == sequential.access_multi
+        assert parallel.pointers_multi == sequential.pointers_multi
+
+
+def test_empty_file(tmp_path):
+    path = write_trace(tmp_path, "")
+
+    assert analyzer.chunk_ranges(path, 8) == []
+    assert analyzer.analyze_parallel(path, False, 8).access_total == 0
+
+
+def test_approx_mixes_blocks_with_and_without_sources(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    # 5-field lines (no source) only in the first block
+    path = write_trace(tmp_path, " > 0x10 4 write 1\n" * 4 + " > read 0x18 4 2 src/a.c:1:1\n" * 40)
+    monkeypatch.setattr(analyzer, "NUMPY_BLOCK_SIZE", 64)
+
+    stats = analyzer.analyze_approx(path, 8)
+
+    assert stats.access_total == 44
+    assert set(stats.source_names.values()) == {"", "src/a.c:1:1"}
+
+
+def test_numpy_skips_values_wider_than_64_bits(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    lines = [" > read 0x18 4 2 src/a.c:1:1\n"] * 6
+    lines[4] = " > read 0x1ffffffffffffffff 4 2 src/a.c:1:1\n"
+    path = write_trace(tmp_path, "".join(lines))
+    monkeypatch.setattr(analyzer, "NUMPY_BLOCK_SIZE", 64)
+
+    stats = analyzer.analyze_numpy(path)
+
+    assert stats.access_total == 5
+    assert stats.lines.malformed_reasons == {"value wider than 64 bits": 1}
+    assert stats.lines.malformed_examples[0][0] == 5
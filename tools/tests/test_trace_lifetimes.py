@@ -0,0 +1,64 @@
+"""Tests for the single-threaded phases of trace_lifetimes.py."""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trace_lifetimes import ThreadLifetimes
+
+
+def single_threaded_accesses(threads):
+    """Accesses of runs that no thread seen before the run outlives, straight from the definition."""
+    first = {}
+    last = {}
+    for index, thread in enumerate(threads):
+        first.setdefault(thread, index)
+        last[thread] = index
+
+    single = 0
+    start = 0
+    for end in range(1, len(threads) + 1):
+        if end < len(threads) and threads[end] == threads[start]:
+            continue
+        thread = threads[start]
+        if not any(other != thread and first[other] < start and last[other] >= end for other in first):
+            single += end - start
+        start = end
+    return single
+
+
+def lifetimes_of(threads):
+    lifetimes = ThreadLifetimes()
+    for thread in threads:
+        lifetimes.update(thread, f"src/a.c:{thread}:1")
+    lifetimes.finish()
+    return lifetimes
+
+
+def test_matches_definition_on_random_schedules():
+    generator = random.Random(1)
+    for _ in range(300):
+        thread_count = generator.randint(1, 5)
+        threads = [generator.randint(1, thread_count) for _ in range(generator.randint(1, 40))]
+
+        lifetimes = lifetimes_of(threads)
+
+        assert lifetimes.summary()["single_threaded_accesses"] == single_threaded_accesses(threads)
+        assert sum(lifetimes.source_accesses) == len(threads)
+
+
+def test_main_thread_between_workers_that_never_return():
+    # Main thread 1 alternates with workers that access memory once each: only its accesses are single-threaded
+    lifetimes = ThreadLifetimes()
+    lifetimes.update(1, "src/main.c:1:1")
+    for worker in range(2, 2002):
+        lifetimes.update(worker, "src/worker.c:1:1")
+        lifetimes.update(1, "src/main.c:1:1")
+        # The runs of the main thread wait in one group instead of being rescanned on every return
+        assert len(lifetimes._pending) <= 2
+
+    lifetimes.finish()
+
+    assert lifetimes.summary()["single_threaded_accesses"] == 2001
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 
+from trace_access_counts import AccessCounts, format_row
+from trace_columns import ColumnarTrace, is_columnar_trace
+from trace_progress import ProgressReporter
+
 
 def main() -> None:
 
@@ -13,6 +18,13 @@ def main() -> None:
 
     print("Analyzing " + log_file)
 
+    # Columnar traces (see trace-to-columns.py) are aggregated with NumPy, addresses are printed as 0x-hex
+    if is_columnar_trace(log_file):
+        with ColumnarTrace(log_file) as trace:
+            for row in trace.address_table():
+                print(format_row(row))
+        return
+
     operations      = set()
     pointers        = {}        # Key is a set of threads
     pointers_byte   = {}        # Same as pointers, but every byte of access is tracked
@@ -26,15 +38,15 @@ def main() -> None:
     access_multi_byte = 0   # Same as access_multi, but taking every byte of range to account
     access_total_byte = 0   # Same as access_total, but taking every byte of range to account
 
-    read = {}
-    write = {}
-    write_pattern = {}
-    sources_read = {}
-    sources_write = {}
-    sources = {}
+    counts = AccessCounts()
+
+    progress = ProgressReporter("trace-analyze-get-stats", log_file)
+    progress.sizes = lambda: {"addresses": len(counts), "sources": len(counts.source_names)}
 
     with open(log_file) as log:
 
+        progress.start_input(log.buffer.raw.tell, os.path.getsize(log_file))
+
         line = log.readline()
 
         while line:
@@ -44,80 +56,17 @@ def main() -> None:
                 # Parse string
                 signature, operation, pointer, size, thread, source = line.split()
 
-                # pointer = source
-
-                if pointer not in read:
-                    read[pointer] = 0
-
-                if pointer not in write:
-                    write[pointer] = 0
-                    write_pattern[pointer] = 0
-
-                if pointer not in sources_read:
-                    sources_read[pointer] = set()
-
-                if pointer not in sources_write:
-                    sources_write[pointer] = set()
-
-                if pointer not in sources:
-                    sources[pointer] = 0
-
-                if "read" in operation:
-                    read[pointer] += 1
-                    sources_read[pointer].add(source)
-
-                if "write" in operation:
-                    write[pointer] += 1
-                    sources_write[pointer].add(source)
-                    if read[pointer] > 0:
-                        write_pattern[pointer] = -1
-                    else:
-                        write_pattern[pointer] += 1
-
-                # # Push operation to found operations
-                # operations.add(operation)
-                #
-                # # Add pointer and associated thread
-                # if pointer not in pointers:
-                #     pointers[pointer] = set()
-                #
-                # if thread not in pointers[pointer] and len(pointers[pointer]) == 1:
-                #     access_multi += 1   # Accounting first access
-                #
-                # pointers[pointer].add(thread)
-                #
-                # # Increase count of multithreaded accesses
-                # if len(pointers[pointer]) > 1:
-                #     access_multi += 1
-                #
-                # access_total += 1
-                #
-                # # Add pointer and associated thread for every byte of access region
-                # for pointer in range(int(pointer[2:], 16), int(pointer[2:], 16) + int(size)):
-                #
-                #     pointer = hex(pointer)
-                #
-                #     # Add pointer and associated thread
-                #     if pointer not in pointers_byte:
-                #         pointers_byte[pointer] = set()
-                #
-                #     if thread not in pointers_byte[pointer] and len(pointers_byte[pointer]) == 1:
-                #         access_multi_byte += 1   # Accounting first access
-                #
-                #     pointers_byte[pointer].add(thread)
-                #
-                #     # Increase count of multithreaded accesses
-                #     if len(pointers_byte[pointer]) > 1:
-                #         access_multi_byte += 1
-                #
-                #     access_total_byte += 1
-                #
-                # threads.add(thread)
+                counts.update(operation, int(pointer, 16), source)
 
             line = log.readline()
+            progress.advance()
+
+        progress.end_input()
+
+    for row in counts.rows():
+        print(format_row(row))
 
-    for pointer in write:
-        print(pointer, write[pointer] + read[pointer], write[pointer], read[pointer], 1 if write_pattern[pointer] != -1 else 0, "W:" + " W:".join(list(sources_write[pointer])), "R:" + " R:".join(list(sources_read[pointer])))
+    progress.finish()
 
     # print()
     # print("Operations:                " + " ".join(sorted(operations)))
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 
+from trace_progress import ProgressReporter
+
 
 def main() -> None:
 
@@ -24,8 +27,13 @@ def main() -> None:
     access_multi_byte = 0   # Same as access_multi, but taking every byte of range to account
     access_total_byte = 0   # Same as access_total, but taking every byte of range to account
 
+    progress = ProgressReporter("trace-analyze", log_file)
+    progress.sizes = lambda: {"addresses": len(pointers), "addresses (byte)": len(pointers_byte)}
+
     with open(log_file) as log:
 
+        progress.start_input(log.buffer.raw.tell, os.path.getsize(log_file))
+
         line = log.readline()
 
         while line:
@@ -76,6 +84,9 @@ def main() -> None:
                 threads.add(thread)
 
             line = log.readline()
+            progress.advance()
+
+        progress.end_input()
 
     print()
     print("Operations:                " + " ".join(sorted(operations)))
@@ -113,6 +124,8 @@ def main() -> None:
     print(f"Addresses with multi-threaded access (byte):   {str(pointers_multi_byte).ljust(10)} ({pointers_multi_byte_ratio}% of total)")
     print(f"Multi-threaded accesses (byte):                {str(access_multi_byte).ljust(10)} ({access_multi_byte_ratio}% of total)")
 
+    progress.finish()
+
 
 if __name__ == "__main__":
     main()
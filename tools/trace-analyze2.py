@@ -1,76 +1,804 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
 from collections import Counter
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+import argparse
+import hashlib
+import io
+import json
+import os
 import sys
+import time
+
+from trace_access_counts import AccessCounts
+from trace_addresses import AddressStateTable
+from trace_checkpoint import Checkpoint
+from trace_columns import ColumnarTrace, is_columnar_trace
+from trace_granularity import DEFAULT_GRANULARITIES, GranularityStats, parse_granularities
+from trace_lifetimes import ThreadLifetimes
+from trace_input import TraceReader, is_stream_input, is_zstd_file
+from trace_intervals import IntervalMap
+from trace_progress import ProgressReporter
+from trace_parse import NUMPY_BLOCK_SIZE, LineStats, TraceBlock, iter_trace_accesses, parse_trace_block
+from trace_sketches import HEAVY_HITTERS, AddressSample, HeavyHitters, HyperLogLog, hash64
+from trace_sources import SourceStats
+from trace_swmr import SwmrDetector
+from trace_thread_local import ThreadLocalStats
+from trace_thread_pairs import ThreadPairs, write_matrices
+from trace_windows import WindowProfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 MULTI_THREAD = -1
-BYTE_STATS_FLAG = "--byte-stats"
-SKIP_BYTE_STATS_FLAG = "--skip-byte-stats"
-MALFORMED_LINE_EXAMPLES_LIMIT = 5
+RESULT_FORMAT = "trace-analyze2"
+RESULT_VERSION = 1
+CHUNK_READ_BLOCK_SIZE = 16 << 20
+
+
+@dataclass
+class TraceStats:
+    access_types: set[str] = field(default_factory=set)
+    thread_ids: dict[int, int] = field(default_factory=dict)
+    pointer_states: dict[int, int] | AddressStateTable = field(default_factory=dict)
+    byte_pointer_states: IntervalMap | None = None
+
+    access_multi: int = 0
+    access_total: int = 0
+    pointers_multi: int = 0
+
+    access_multi_byte: int = 0
+    access_total_byte: int = 0
+    pointers_multi_byte: int = 0
+
+    lines: LineStats = field(default_factory=LineStats)
+    compressed_bytes: int | None = None
+    input_bytes: int = 0
+
+    source_stats: SourceStats | None = None
+    address_table: AccessCounts | None = None
+    window_profile: WindowProfile | None = None
+    thread_pairs: ThreadPairs | None = None
+    granularities: list[GranularityStats] | None = None
+    swmr: SwmrDetector | None = None
+    lifetimes: ThreadLifetimes | None = None
+    thread_local: ThreadLocalStats | None = None
+
+
+@dataclass
+class ApproxStats:
+    """Fixed-memory sketches of a trace; only the counters are exact."""
+
+    hot_count: int = HEAVY_HITTERS
+    access_types: set[str] = field(default_factory=set)
+    threads: set[int] = field(default_factory=set)
+    access_total: int = 0
+    addresses: HyperLogLog | None = None
+    address_sample: AddressSample | None = None
+    hot_addresses: HeavyHitters | None = None
+    hot_sources: HeavyHitters | None = None
+    source_names: dict[int, str] = field(default_factory=dict)
+
+    lines: LineStats = field(default_factory=LineStats)
+    compressed_bytes: int | None = None
+    input_bytes: int = 0
+
+
+@dataclass
+class ChunkStats:
+    """Summary of one byte range of the trace, analyzed without knowledge of earlier ranges.
+
+    Address states are `[first thread, accesses before another thread shows up, accesses]`,
+    which is enough to replay the chunk on top of the state left by the previous chunks.
+    Byte ranges carry the same information as tuples.
+    """
+
+    access_types: set[str] = field(default_factory=set)
+    threads: dict[int, None] = field(default_factory=dict)
+    pointer_states: dict[int, list[int]] = field(default_factory=dict)
+    byte_pointer_states: IntervalMap | None = None
+    access_total: int = 0
+    access_total_byte: int = 0
+    lines: LineStats = field(default_factory=LineStats)
 
 
-def parse_non_negative_int(value: str, base: int = 10) -> int | None:
-    try:
-        parsed = int(value, base)
-    except ValueError:
-        return None
+def ratio(part: int, total: int) -> float:
+    return round(100 * part / total, 2) if total else 0.0
 
-    if parsed < 0:
-        return None
 
-    return parsed
+def update_thread_state(states: dict[int, int], pointer: int, thread_id: int) -> tuple[bool, int]:
+    state = states.get(pointer)
 
+    if state is None:
+        states[pointer] = thread_id
+        return False, 0
 
-def parse_trace_line(line: str) -> tuple[tuple[str, int, int, int] | None, str | None]:
-    parts = line.split()
+    if state == MULTI_THREAD:
+        return False, 1
 
-    if not parts:
-        return None, "empty trace line"
+    if state == thread_id:
+        return False, 0
 
-    if parts[0] != ">":
-        return None, "missing trace marker"
+    states[pointer] = MULTI_THREAD
+    return True, 2
 
-    if len(parts) == 5:
-        _, pointer_text, size_text, access_type, thread_text = parts
-    elif len(parts) == 6:
-        _, access_type, pointer_text, size_text, thread_text, _ = parts
-    else:
-        return None, f"unexpected field count ({len(parts)})"
 
-    pointer = parse_non_negative_int(pointer_text, 16)
-    if pointer is None:
-        return None, "invalid pointer"
+def update_chunk_state(states: dict[int, list[int]], pointer: int, thread: int) -> None:
+    state = states.get(pointer)
+
+    if state is None:
+        states[pointer] = [thread, 1, 1]
+        return
 
-    size = parse_non_negative_int(size_text)
-    if size is None:
-        return None, "invalid size"
+    if state[1] == state[2] and state[0] == thread:
+        state[1] += 1
+    state[2] += 1
 
-    thread = parse_non_negative_int(thread_text)
-    if thread is None:
-        return None, "invalid thread"
 
-    return (access_type, pointer, size, thread), None
+def replay_chunk_state(state: int | None, thread_id: int, first_run: int, total: int) -> tuple[int, bool, int]:
+    """Applies a chunk address state to the global one, returns (new state, became multi, multi accesses)."""
+    if state == MULTI_THREAD:
+        return MULTI_THREAD, False, total
 
+    if state is None or state == thread_id:
+        if first_run == total:
+            return thread_id, False, 0
 
-def ratio(part: int, total: int) -> float:
-    return round(100 * part / total, 2) if total else 0.0
+        # Same accounting as update_thread_state: the switching access counts twice.
+        return MULTI_THREAD, True, total - first_run + 1
 
+    return MULTI_THREAD, True, total + 1
 
-def update_thread_state(states: dict[int, int], pointer: int, thread_id: int) -> tuple[bool, int]:
-    state = states.get(pointer)
 
+def merge_chunk_states(
+    states: dict[int, int],
+    chunk_states: dict[int, list[int]],
+    thread_ids: dict[int, int],
+) -> tuple[int, int]:
+    """Replays chunk address states on top of `states`, returns (new multi addresses, multi accesses)."""
+    pointers_multi = 0
+    access_multi = 0
+
+    for pointer, (thread, first_run, total) in chunk_states.items():
+        state, became_multi, multi_increment = replay_chunk_state(states.get(pointer), thread_ids[thread], first_run, total)
+        states[pointer] = state
+        pointers_multi += became_multi
+        access_multi += multi_increment
+
+    return pointers_multi, access_multi
+
+
+def update_chunk_byte_state(state: tuple[int, int, int] | None, length: int, thread: int) -> tuple[int, int, int]:
+    """IntervalMap transition with the semantics of update_chunk_state."""
     if state is None:
-        states[pointer] = thread_id
-        return False, 0
+        return thread, 1, 1
+
+    first_thread, first_run, total = state
+    if first_run == total and first_thread == thread:
+        first_run += 1
+    return first_thread, first_run, total + 1
+
+
+class ByteSharingCounter:
+    """IntervalMap transitions that count bytes the way update_thread_state counts addresses."""
+
+    def __init__(self) -> None:
+        self.pointers_multi = 0
+        self.access_multi = 0
+
+    def update(self, state: int | None, length: int, thread_id: int) -> int:
+        if state is None:
+            return thread_id
+
+        if state == MULTI_THREAD:
+            self.access_multi += length
+            return state
+
+        if state == thread_id:
+            return state
+
+        self.pointers_multi += length
+        self.access_multi += 2 * length
+        return MULTI_THREAD
+
+    def merge(self, state: int | None, length: int, chunk_state: tuple[int, int, int]) -> int:
+        new_state, became_multi, multi_increment = replay_chunk_state(state, *chunk_state)
+        if became_multi:
+            self.pointers_multi += length
+        self.access_multi += multi_increment * length
+        return new_state
+
+
+def block_lines(block: bytes) -> io.StringIO:
+    """Lines of a block that ends at a line boundary, split like the text mode of TraceReader."""
+    return io.StringIO(block.decode("utf-8", errors="replace"), newline=None)
+
+
+def chunk_ranges(log_file: str, jobs: int) -> list[tuple[int, int]]:
+    """Splits a file into at most `jobs` non-empty [start, end) byte ranges that begin at line starts."""
+    log_size = os.path.getsize(log_file)
+    jobs = max(1, min(jobs, log_size))
+    bytes_per_job = log_size // jobs
+
+    boundaries = [0]
+    with open(log_file, "rb") as log:
+        for job in range(1, jobs):
+            # The first line starting at or after the nominal boundary
+            log.seek(bytes_per_job * job - 1)
+            boundary = log.tell() + len(log.readline())
+            # Long lines can pull several boundaries onto the same newline
+            if boundaries[-1] < boundary < log_size:
+                boundaries.append(boundary)
+    boundaries.append(log_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def iter_chunk_lines(log_file: str, start: int, end: int) -> Iterator[str]:
+    """Yields the lines starting in [start, end), which are line boundaries from chunk_ranges."""
+    with open(log_file, "rb") as log:
+        log.seek(start)
+        position = start
+
+        while position < end:
+            block = log.read(min(CHUNK_READ_BLOCK_SIZE, end - position))
+            if not block:
+                break
+
+            if not block.endswith(b"\n"):
+                block += log.readline()
+            position += len(block)
+
+            yield from block_lines(block)
+
+
+class TraceSegments:
+    """Splits a trace into segments, after each of which the analysis state can be saved.
+
+    With `checkpoint_every`, the trace is read from the decompressed offset `offset` on in
+    blocks that end at line boundaries, and a segment ends once `checkpoint_every` more bytes
+    have been read: `offset` is then exact and `at_checkpoint` is set. With `snapshot_every`,
+    a segment also ends after that many seconds; without checkpoints the lines are read one
+    by one, so that a pipe with a slow writer is still snapshotted on time.
+    """
+
+    def __init__(
+        self,
+        log: TraceReader,
+        offset: int = 0,
+        checkpoint_every: int | None = None,
+        snapshot_every: float | None = None,
+    ) -> None:
+        self.offset = offset
+        self.checkpoint_every = checkpoint_every
+        self.snapshot_every = snapshot_every
+        self.done = False
+        self.at_checkpoint = False
+
+        if checkpoint_every is not None:
+            self._blocks = log.iter_blocks(CHUNK_READ_BLOCK_SIZE)
+            self._next_checkpoint = offset + checkpoint_every
+        else:
+            self._lines = iter(log)
+
+    def iter_accesses(self, progress: ProgressReporter | None = None) -> Iterator[tuple[Iterator[tuple], LineStats]]:
+        """(accesses, line accounting) per segment; the accounting is complete once the accesses are."""
+        while not self.done:
+            self.at_checkpoint = False
+            deadline = time.monotonic() + self.snapshot_every if self.snapshot_every else None
+            lines = self._block_lines(deadline) if self.checkpoint_every is not None else self._timed_lines(deadline)
+            if progress is not None:
+                lines = progress.wrap(lines)
+            segment_lines = LineStats()
+            yield iter_trace_accesses(lines, segment_lines), segment_lines
+
+    def _block_lines(self, deadline: float | None) -> Iterator[str]:
+        while self.offset < self._next_checkpoint:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            block = next(self._blocks, None)
+            if block is None:
+                self.done = True
+                return
+            self.offset += len(block)
+            yield from block_lines(block)
+
+        self.at_checkpoint = True
+        self._next_checkpoint = self.offset + self.checkpoint_every
+
+    def _timed_lines(self, deadline: float) -> Iterator[str]:
+        monotonic = time.monotonic
+        for line in self._lines:
+            yield line
+            if monotonic() >= deadline:
+                return
+        self.done = True
+
+
+def analyze_chunk(log_file: str, start: int, end: int, byte_stats_enabled: bool) -> ChunkStats:
+    chunk = ChunkStats()
+    chunk.byte_pointer_states = IntervalMap() if byte_stats_enabled else None
+
+    access_types = chunk.access_types
+    threads = chunk.threads
+    pointer_states = chunk.pointer_states
+    byte_pointer_states = chunk.byte_pointer_states
+    access_total = 0
+    access_total_byte = 0
 
-    if state == MULTI_THREAD:
-        return False, 1
+    for access_type, pointer, size, thread, _ in iter_trace_accesses(iter_chunk_lines(log_file, start, end), chunk.lines):
+        access_types.add(access_type)
+        threads[thread] = None
+
+        update_chunk_state(pointer_states, pointer, thread)
+        access_total += 1
+
+        if byte_pointer_states is not None:
+            access_total_byte += size
+            byte_pointer_states.update(pointer, pointer + size, update_chunk_byte_state, thread)
+
+    chunk.access_total = access_total
+    chunk.access_total_byte = access_total_byte
+    return chunk
+
+
+def _analyze_chunk_star(args: tuple[str, int, int, bool]) -> ChunkStats:
+    return analyze_chunk(*args)
+
+
+def analyze_parallel(
+    log_file: str,
+    byte_stats_enabled: bool,
+    jobs: int,
+    pointer_states: AddressStateTable | None = None,
+    progress: ProgressReporter | None = None,
+) -> TraceStats:
+    log_size = os.path.getsize(log_file)
+    chunk_args = [(log_file, start, end, byte_stats_enabled) for start, end in chunk_ranges(log_file, jobs)]
+    jobs = max(1, len(chunk_args))
+
+    stats = TraceStats(input_bytes=log_size)
+    if pointer_states is not None:
+        stats.pointer_states = pointer_states
+    stats.byte_pointer_states = IntervalMap() if byte_stats_enabled else None
+    byte_counter = ByteSharingCounter()
+
+    if progress is not None:
+        progress.start_input(None, log_size)
+        progress.sizes = lambda: {"addresses": len(stats.pointer_states)}
+
+    with Pool(jobs) as pool:
+        # imap keeps chunk order, which the merge of address states relies on.
+        for (_, _, chunk_end, _), chunk in zip(chunk_args, pool.imap(_analyze_chunk_star, chunk_args)):
+            stats.access_types.update(chunk.access_types)
+            for thread in chunk.threads:
+                if thread not in stats.thread_ids:
+                    stats.thread_ids[thread] = len(stats.thread_ids) + 1
+
+            pointers_multi, access_multi = merge_chunk_states(stats.pointer_states, chunk.pointer_states, stats.thread_ids)
+            stats.pointers_multi += pointers_multi
+            stats.access_multi += access_multi
+            stats.access_total += chunk.access_total
+
+            if stats.byte_pointer_states is not None and chunk.byte_pointer_states is not None:
+                for start, end, (thread, first_run, total) in chunk.byte_pointer_states.iter_ranges():
+                    stats.byte_pointer_states.update(start, end, byte_counter.merge, (stats.thread_ids[thread], first_run, total))
+                stats.access_total_byte += chunk.access_total_byte
+
+            stats.lines.merge(chunk.lines)
+
+            if progress is not None:
+                progress.advance(chunk.lines.total_lines, chunk_end)
+
+    stats.pointers_multi_byte = byte_counter.pointers_multi
+    stats.access_multi_byte = byte_counter.access_multi
+
+    return stats
+
+
+def analyze_sequential(
+    log_file: str,
+    byte_stats_enabled: bool,
+    source_stats_enabled: bool = False,
+    address_table_enabled: bool = False,
+    pointer_states: AddressStateTable | None = None,
+    progress: ProgressReporter | None = None,
+    checkpoint: Checkpoint | None = None,
+    checkpoint_every: int = 0,
+    resume: bool = False,
+    snapshot: Callable[[TraceStats], None] | None = None,
+    snapshot_every: float = 0,
+    window_size: int | None = None,
+    thread_pairs_enabled: bool = False,
+    granularities: list[int] | None = None,
+    swmr_enabled: bool = False,
+    lifetimes_enabled: bool = False,
+    thread_local_enabled: bool = False,
+) -> TraceStats:
+    offset = 0
+    if resume:
+        offset, (stats, byte_counter) = checkpoint.load()
+        if pointer_states is not None:
+            # Limits given now apply from here on.
+            stats.pointer_states.memory_limit = pointer_states.memory_limit
+            stats.pointer_states.spill_dir = pointer_states.spill_dir
+    else:
+        stats = TraceStats()
+        # The per-address tables of the optional analyses are as compact, and held to the same limits, as the address states
+        new_address_table = dict
+        if pointer_states is not None:
+            stats.pointer_states = pointer_states
+            new_address_table = lambda: AddressStateTable(pointer_states.memory_limit, pointer_states.spill_dir)
+        stats.byte_pointer_states = IntervalMap() if byte_stats_enabled else None
+        stats.source_stats = SourceStats(new_address_table()) if source_stats_enabled else None
+        stats.address_table = AccessCounts(new_address_table()) if address_table_enabled else None
+        stats.window_profile = WindowProfile(window_size) if window_size else None
+        stats.thread_pairs = ThreadPairs(new_address_table()) if thread_pairs_enabled else None
+        stats.granularities = [GranularityStats(unit_size, new_address_table()) for unit_size in granularities] if granularities else None
+        stats.swmr = SwmrDetector(new_address_table()) if swmr_enabled else None
+        stats.lifetimes = ThreadLifetimes() if lifetimes_enabled else None
+        stats.thread_local = ThreadLocalStats(new_address_table()) if thread_local_enabled else None
+        byte_counter = ByteSharingCounter()
+
+    access_types = stats.access_types
+    pointer_states = stats.pointer_states
+    byte_pointer_states = stats.byte_pointer_states
+    source_stats = stats.source_stats
+    address_table = stats.address_table
+    window_profile = stats.window_profile
+    thread_pairs = stats.thread_pairs
+    granularity_stats = stats.granularities
+    swmr = stats.swmr
+    lifetimes = stats.lifetimes
+    thread_local = stats.thread_local
+    thread_ids = stats.thread_ids
+    first_thread = None
+
+    access_multi = stats.access_multi
+    access_total = stats.access_total
+    pointers_multi = stats.pointers_multi
+
+    access_total_byte = stats.access_total_byte
+
+    segments = None
+    if is_columnar_trace(log_file):
+        log = ColumnarTrace(log_file)
+        stats.lines = log.lines
+        accesses = log.iter_accesses()
+        if progress is not None:
+            # Columnar traces have no lines, rows are counted instead.
+            progress.start_input(None, total_lines=log.rows)
+            accesses = progress.wrap(accesses)
+        segment_iterators = [(accesses, None)]
+    else:
+        log = TraceReader(log_file)
+        if offset:
+            log.skip(offset)
+        if progress is not None:
+            progress.start_input(lambda: log.compressed_bytes, input_file_size(log))
+
+        if checkpoint is not None or snapshot is not None:
+            segments = TraceSegments(
+                log,
+                offset,
+                checkpoint_every if checkpoint is not None else None,
+                snapshot_every if snapshot is not None else None,
+            )
+            segment_iterators = segments.iter_accesses(progress)
+        else:
+            lines = log if progress is None else progress.wrap(log)
+            segment_lines = LineStats()
+            segment_iterators = [(iter_trace_accesses(lines, segment_lines), segment_lines)]
+
+    if progress is not None:
+        progress.sizes = lambda: {"addresses": len(pointer_states), "threads": len(thread_ids)}
+
+    with log:
+        for accesses, segment_lines in segment_iterators:
+            for access_type, pointer, size, thread, source in accesses:
+                access_types.add(access_type)
+
+                thread_id = thread_ids.get(thread)
+                if thread_id is None:
+                    thread_id = len(thread_ids) + 1
+                    thread_ids[thread] = thread_id
+
+                if thread_pairs is not None:
+                    first_thread = pointer_states.get(pointer)
+
+                became_multi, multi_increment = update_thread_state(pointer_states, pointer, thread_id)
+                if became_multi:
+                    pointers_multi += 1
+                access_multi += multi_increment
+                access_total += 1
+
+                if thread_pairs is not None and multi_increment:
+                    thread_pairs.update(pointer, thread_id, first_thread)
+
+                if source_stats is not None:
+                    source_stats.update(source, pointer, multi_increment > 0)
+
+                if address_table is not None:
+                    address_table.update(access_type, pointer, source)
+
+                if window_profile is not None:
+                    window_profile.update(pointer, thread_id, became_multi, multi_increment > 0)
+
+                if granularity_stats is not None:
+                    for granularity in granularity_stats:
+                        granularity.update(pointer, size, thread_id)
+
+                if swmr is not None:
+                    swmr.update(access_type, pointer, thread_id, source)
+
+                if lifetimes is not None:
+                    lifetimes.update(thread_id, source)
+
+                if thread_local is not None:
+                    thread_local.update(access_type, pointer, size, source, multi_increment > 0)
+
+                if byte_pointer_states is not None:
+                    access_total_byte += size
+                    byte_pointer_states.update(pointer, pointer + size, byte_counter.update, thread_id)
+
+            if segment_lines is not None:
+                stats.lines.merge(segment_lines)
+
+            stats.access_multi = access_multi
+            stats.access_total = access_total
+            stats.pointers_multi = pointers_multi
+            stats.access_multi_byte = byte_counter.access_multi
+            stats.access_total_byte = access_total_byte
+            stats.pointers_multi_byte = byte_counter.pointers_multi
+
+            if segments is not None and not segments.done:
+                if segments.at_checkpoint:
+                    checkpoint.save(segments.offset, (stats, byte_counter))
+                if snapshot is not None:
+                    stats.compressed_bytes, stats.input_bytes = input_size(log)
+                    snapshot(stats)
+
+    if window_profile is not None:
+        window_profile.flush()
+    if lifetimes is not None:
+        lifetimes.finish()
+    if thread_local is not None:
+        thread_local.resolve()
+    stats.compressed_bytes, stats.input_bytes = input_size(log)
 
-    if state == thread_id:
-        return False, 0
+    return stats
 
-    states[pointer] = MULTI_THREAD
-    return True, 2
+
+class SortedAddressStates:
+    """Address states of the NumPy backend, kept as a few sorted (address, state) array levels.
+
+    Every address lives in exactly one level. New addresses form a new level, and the
+    smallest levels are merged while they are comparable in size, so each address is
+    copied O(log n) times overall. A state of 0 means "not seen yet" during lookups.
+    """
+
+    def __init__(self) -> None:
+        self._levels: list[tuple[np.ndarray, np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return sum(len(addresses) for addresses, _ in self._levels)
+
+    def replay(self, addresses: np.ndarray, first_threads: np.ndarray, first_runs: np.ndarray, totals: np.ndarray) -> tuple[int, int]:
+        """Vectorized merge_chunk_states for sorted unique `addresses`."""
+        states = np.zeros(len(addresses), dtype=np.int64)
+        seen = np.zeros(len(addresses), dtype=bool)
+        locations = []
+
+        for level_addresses, level_states in self._levels:
+            indexes = np.minimum(np.searchsorted(level_addresses, addresses), len(level_addresses) - 1)
+            found = level_addresses[indexes] == addresses
+            states[found] = level_states[indexes[found]]
+            seen |= found
+            locations.append((found, indexes))
+
+        first_threads = first_threads.astype(np.int64)
+        already_multi = states == MULTI_THREAD
+        same_thread = (states == 0) | (states == first_threads)
+        switches = first_runs < totals
+
+        becomes_multi = ~already_multi & (~same_thread | switches)
+        access_multi = (
+            int(totals[already_multi].sum())
+            + int((totals - first_runs + 1)[~already_multi & same_thread & switches].sum())
+            + int((totals + 1)[~already_multi & ~same_thread].sum())
+        )
+
+        new_states = np.where(already_multi | becomes_multi, MULTI_THREAD, first_threads)
+
+        for (found, indexes), (_, level_states) in zip(locations, self._levels):
+            level_states[indexes[found]] = new_states[found]
+
+        if not seen.all():
+            self._levels.append((addresses[~seen], new_states[~seen]))
+            self._compact()
+
+        return int(becomes_multi.sum()), access_multi
+
+    def _compact(self) -> None:
+        while len(self._levels) > 1 and 2 * len(self._levels[-1][0]) >= len(self._levels[-2][0]):
+            newer_addresses, newer_states = self._levels.pop()
+            older_addresses, older_states = self._levels.pop()
+
+            addresses = np.concatenate((older_addresses, newer_addresses))
+            order = np.argsort(addresses, kind="stable")
+            self._levels.append((addresses[order], np.concatenate((older_states, newer_states))[order]))
+
+
+def remap_threads(threads: np.ndarray, thread_ids: dict[int, int]) -> np.ndarray:
+    """Maps raw thread ids to sequential ids in order of first appearance, like the dict loop."""
+    unique_threads, first_indexes, inverse = np.unique(threads, return_index=True, return_inverse=True)
+
+    for position in np.argsort(first_indexes, kind="stable").tolist():
+        thread = int(unique_threads[position])
+        if thread not in thread_ids:
+            thread_ids[thread] = len(thread_ids) + 1
+
+    ids = np.array([thread_ids[thread] for thread in unique_threads.tolist()], dtype=np.uint32)
+    return ids[inverse.reshape(-1)]
+
+
+def summarize_block(pointers: np.ndarray, thread_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Computes the ChunkStats address states of a block with a stable sort and group reductions."""
+    order = np.argsort(pointers, kind="stable")
+    sorted_pointers = pointers[order]
+    sorted_threads = thread_ids[order]
+
+    group_starts = np.flatnonzero(np.concatenate(([True], sorted_pointers[1:] != sorted_pointers[:-1])))
+    totals = np.diff(np.append(group_starts, len(sorted_pointers)))
+    first_threads = sorted_threads[group_starts]
+
+    positions = np.arange(len(sorted_pointers)) - np.repeat(group_starts, totals)
+    switches = np.where(sorted_threads != np.repeat(first_threads, totals), positions, len(sorted_pointers))
+    first_runs = np.minimum(np.minimum.reduceat(switches, group_starts), totals)
+
+    return sorted_pointers[group_starts], first_threads, first_runs, totals
+
+
+def input_size(log: TraceReader | ColumnarTrace) -> tuple[int | None, int]:
+    """(compressed bytes or None, decompressed bytes) of the text trace behind `log`."""
+    if isinstance(log, ColumnarTrace):
+        return log.compressed_bytes, log.input_bytes
+
+    return (log.compressed_bytes if log.compressed else None), log.decompressed_bytes
+
+
+def input_file_size(log: TraceReader) -> int | None:
+    """Size of the trace file for progress ETAs, None for pipes."""
+    return None if log.is_stream else os.path.getsize(log.path)
+
+
+def analyze_numpy_columns(log_file: str, progress: ProgressReporter | None = None) -> TraceStats:
+    stats = TraceStats(pointer_states=SortedAddressStates())
+
+    with ColumnarTrace(log_file) as trace:
+        stats.lines = trace.lines
+        if progress is not None:
+            progress.start_input(None, total_lines=trace.rows)
+            progress.sizes = lambda: {"addresses": len(stats.pointer_states), "threads": len(stats.thread_ids)}
+        stats.access_types.update(trace.access_type_names[access_type] for access_type in np.unique(trace.access_type).tolist())
+
+        for rows in trace.iter_row_blocks():
+            pointers = trace.address[rows].astype(np.uint64)
+            thread_ids = remap_threads(trace.thread[rows].astype(np.uint64), stats.thread_ids)
+            pointers_multi, access_multi = stats.pointer_states.replay(*summarize_block(pointers, thread_ids))
+            stats.pointers_multi += pointers_multi
+            stats.access_multi += access_multi
+            stats.access_total += len(pointers)
+
+            if progress is not None:
+                progress.advance(len(pointers))
+
+        stats.compressed_bytes, stats.input_bytes = input_size(trace)
+
+    return stats
+
+
+def analyze_numpy(log_file: str, progress: ProgressReporter | None = None) -> TraceStats:
+    if is_columnar_trace(log_file):
+        return analyze_numpy_columns(log_file, progress)
+
+    stats = TraceStats(pointer_states=SortedAddressStates())
+
+    with TraceReader(log_file) as log:
+        if progress is not None:
+            progress.start_input(lambda: log.compressed_bytes, input_file_size(log))
+            progress.sizes = lambda: {"addresses": len(stats.pointer_states), "threads": len(stats.thread_ids)}
+
+        for block in log.iter_blocks(NUMPY_BLOCK_SIZE):
+            trace_block = parse_trace_block(block)
+
+            stats.lines.merge(trace_block.lines)
+            stats.access_types.update(trace_block.access_type_names)
+            if progress is not None:
+                progress.advance(trace_block.lines.total_lines)
+
+            if not len(trace_block.pointers):
+                continue
+
+            thread_ids = remap_threads(trace_block.threads, stats.thread_ids)
+            pointers_multi, access_multi = stats.pointer_states.replay(*summarize_block(trace_block.pointers, thread_ids))
+            stats.pointers_multi += pointers_multi
+            stats.access_multi += access_multi
+            stats.access_total += len(trace_block.pointers)
+
+    stats.compressed_bytes, stats.input_bytes = input_size(log)
+
+    return stats
+
+
+def source_hash(source: str) -> int:
+    return int.from_bytes(hashlib.blake2b(source.encode("utf-8", "surrogateescape"), digest_size=8).digest(), "little")
+
+
+def approx_block(stats: ApproxStats, block: TraceBlock) -> None:
+    stats.access_types.update(block.access_type_names[access_type] for access_type in np.unique(block.access_types).tolist())
+    stats.threads.update(np.unique(block.threads).tolist())
+    stats.access_total += len(block.pointers)
+
+    hashes = hash64(block.pointers)
+    stats.addresses.add(hashes)
+    stats.address_sample.add(block.pointers, hashes, block.threads)
+    stats.hot_addresses.add(block.pointers)
+
+    source_hashes = np.array([source_hash(name) for name in block.source_names], dtype=np.uint64)
+    stats.hot_sources.add(source_hashes[block.sources] if len(block.sources) else source_hashes[:0])
+
+    # Only the names of the current candidates are kept.
+    names = dict(zip(source_hashes.tolist(), block.source_names))
+    stats.source_names = {key: stats.source_names[key] if key in stats.source_names else names[key] for key in stats.hot_sources.keys.tolist()}
+
+
+def analyze_approx(log_file: str, hot_count: int, progress: ProgressReporter | None = None) -> ApproxStats:
+    stats = ApproxStats(
+        hot_count=hot_count,
+        addresses=HyperLogLog(),
+        address_sample=AddressSample(),
+        hot_addresses=HeavyHitters(hot_count),
+        hot_sources=HeavyHitters(hot_count),
+    )
+
+    if progress is not None:
+        progress.sizes = lambda: {"sampled addresses": len(stats.address_sample.states)}
+
+    if is_columnar_trace(log_file):
+        with ColumnarTrace(log_file) as trace:
+            stats.lines = trace.lines
+            if progress is not None:
+                progress.start_input(None, total_lines=trace.rows)
+
+            for block in trace.iter_trace_blocks():
+                approx_block(stats, block)
+                if progress is not None:
+                    progress.advance(len(block.pointers))
+
+            stats.compressed_bytes, stats.input_bytes = input_size(trace)
+        return stats
+
+    with TraceReader(log_file) as log:
+        if progress is not None:
+            progress.start_input(lambda: log.compressed_bytes, input_file_size(log))
+
+        for block in log.iter_blocks(NUMPY_BLOCK_SIZE):
+            trace_block = parse_trace_block(block, with_sources=True)
+            stats.lines.merge(trace_block.lines)
+            approx_block(stats, trace_block)
+            if progress is not None:
+                progress.advance(trace_block.lines.total_lines)
+
+    stats.compressed_bytes, stats.input_bytes = input_size(log)
+
+    return stats
 
 
 def print_byte_stats_skipped() -> None:
@@ -82,6 +810,15 @@ def print_byte_stats_skipped() -> None:
     print("Multi-threaded accesses (byte):                skipped")
 
 
+def print_input_size(compressed_bytes: int | None, input_bytes: int) -> None:
+    print()
+    if compressed_bytes is not None:
+        print("Compressed bytes:          " + str(compressed_bytes))
+        print("Decompressed bytes:        " + str(input_bytes))
+    else:
+        print("Input bytes:               " + str(input_bytes))
+
+
 def print_trace_accounting(access_total: int, trace_lines: int, malformed_trace_lines: int) -> None:
     valid_trace_lines = trace_lines - malformed_trace_lines
     access_delta = access_total - valid_trace_lines
@@ -134,120 +871,718 @@ def print_malformed_line_stats(
         print(f"  - line {line_number} ({reason}): {example}")
 
 
-def main() -> None:
+def print_source_stats(source_stats: SourceStats, top: int) -> None:
+    print()
+    print("Sources:                   " + str(len(source_stats)))
+    print()
+    print(f"Top {top} sources by multi-threaded accesses (counted once the address is shared):")
+    print(f"  {'Multi-threaded':>14} {'Accesses':>12} {'Addresses':>10}   Source")
 
-    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] not in (BYTE_STATS_FLAG, SKIP_BYTE_STATS_FLAG)):
-        print(f"Usage: trace-analyze2.py <file> [{BYTE_STATS_FLAG}|{SKIP_BYTE_STATS_FLAG}]")
-        exit(1)
+    for source_id in source_stats.top(top):
+        multi_accesses = source_stats.multi_accesses[source_id]
+        accesses = source_stats.accesses[source_id]
+        multi_ratio = ratio(multi_accesses, accesses)
+        source = source_stats.names[source_id] or "<no source>"
+        print(f"  {multi_accesses:>14} {accesses:>12} {source_stats.addresses[source_id]:>10}   {source} ({multi_ratio}% shared)")
 
-    log_file = sys.argv[1]
-    byte_stats_enabled = len(sys.argv) == 3 and sys.argv[2] == BYTE_STATS_FLAG
 
-    print("Analyzing " + log_file)
+def print_lifetimes(lifetimes: ThreadLifetimes, top: int) -> None:
+    summary = lifetimes.summary()
+    accesses = summary["accesses"]
 
-    access_types = set()
-    pointer_states: dict[int, int] = {}
-    byte_pointer_states: dict[int, int] | None = {} if byte_stats_enabled else None
-    thread_ids: dict[int, int] = {}
+    print()
+    print(f"Threads live at once:                          at most {summary['max_live_threads']} of {summary['threads']}")
+    print(f"Accesses while one thread is live (tsan-stmt): {str(summary['single_threaded_accesses']).ljust(10)} ({ratio(summary['single_threaded_accesses'], accesses)}% of total)")
+    print(f"Accesses before a second thread (tsan-st):     {str(summary['before_second_thread_accesses']).ljust(10)} ({ratio(summary['before_second_thread_accesses'], accesses)}% of total)")
 
-    access_multi = 0
-    access_total = 0
-    pointers_multi = 0
+    if not top:
+        return
 
-    access_multi_byte = 0
-    access_total_byte = 0
-    pointers_multi_byte = 0
+    print()
+    print(f"Top {top} sources by accesses while one thread is live:")
+    print(f"  {'One live':>12} {'Before 2nd':>12} {'Accesses':>12}   Source")
+    for source_id in lifetimes.top_sources(top):
+        print(
+            f"  {lifetimes.single_accesses[source_id]:>12} {lifetimes.prefix_accesses[source_id]:>12} "
+            f"{lifetimes.source_accesses[source_id]:>12}   {lifetimes.source_names[source_id] or '<no source>'}"
+        )
 
-    total_lines = 0
-    trace_lines = 0
-    non_trace_lines = 0
-    malformed_trace_lines = 0
-    malformed_reasons: Counter[str] = Counter()
-    malformed_examples: list[tuple[int, str, str]] = []
 
-    with open(log_file, encoding="utf-8", errors="replace") as log:
-        for line_number, line in enumerate(log, start=1):
-            total_lines += 1
+def print_thread_local(thread_local: ThreadLocalStats, top: int) -> None:
+    summary = thread_local.summary()
+    accesses = summary["accesses"]
 
-            if not line.startswith(" > "):
-                non_trace_lines += 1
-                continue
+    print()
+    print(f"Accesses to thread-local addresses (tsan-ea):  {str(summary['thread_local_accesses']).ljust(10)} ({ratio(summary['thread_local_accesses'], accesses)}% of total)")
+    print(f"  {'Thread-local':>12} {'Accesses':>12}   Kind")
+    for kind in summary["kinds"]:
+        print(f"  {kind['thread_local_accesses']:>12} {kind['accesses']:>12}   {kind['tsan_function']}")
+
+    if not top:
+        return
 
-            trace_lines += 1
+    print()
+    print(f"Top {top} sources by accesses to thread-local addresses:")
+    print(f"  {'Thread-local':>12} {'Accesses':>12}   Source")
+    for source, source_accesses, local_accesses in thread_local.sources()[:top]:
+        print(f"  {local_accesses:>12} {source_accesses:>12}   {source or '<no source>'} ({ratio(local_accesses, source_accesses)}% thread-local)")
 
-            parsed, error = parse_trace_line(line)
-            if parsed is None:
-                malformed_trace_lines += 1
-                malformed_reasons[error or "unknown parse error"] += 1
 
-                if len(malformed_examples) < MALFORMED_LINE_EXAMPLES_LIMIT:
-                    malformed_examples.append((line_number, error or "unknown parse error", line.rstrip()))
+def print_swmr(swmr: SwmrDetector, pointers_multi: int, top: int) -> None:
+    summary = swmr.summary()
+    reads_total = summary["reads_total"]
 
-                continue
+    print()
+    print(f"SWMR addresses (1 writer, other readers):      {str(summary['addresses']).ljust(10)} ({ratio(summary['addresses'], pointers_multi)}% of multi-threaded addresses)")
+    print(f"Reads of SWMR addresses:                       {str(summary['reads']).ljust(10)} ({ratio(summary['reads'], reads_total)}% of all reads)")
+    print(f"  by the writer thread (skippable):            {str(summary['writer_reads']).ljust(10)} ({ratio(summary['writer_reads'], reads_total)}% of all reads)")
+    print(f"Writes to SWMR addresses:                      {str(summary['writes']).ljust(10)} ({ratio(summary['writes'], summary['writes_total'])}% of all writes)")
+    print(f"Read-only shared addresses:                    {str(summary['read_only_shared_addresses']).ljust(10)} ({summary['read_only_shared_reads']} reads)")
 
-            access_type, pointer, size, thread = parsed
+    if not top:
+        return
+
+    print()
+    print(f"Top {top} sources by accesses to SWMR addresses:")
+    print(f"  {'Addresses':>10} {'Reads':>12} {'Writes':>12}   Source")
+    for source, addresses, reads, writes in swmr.sources()[:top]:
+        print(f"  {addresses:>10} {reads:>12} {writes:>12}   {source or '<no source>'}")
 
-            access_types.add(access_type)
 
-            thread_id = thread_ids.get(thread)
-            if thread_id is None:
-                thread_id = len(thread_ids) + 1
-                thread_ids[thread] = thread_id
+def print_granularities(granularities: list[GranularityStats]) -> None:
+    for granularity in granularities:
+        units_multi_ratio = ratio(granularity.units_multi, len(granularity))
+        access_multi_ratio = ratio(granularity.access_multi, granularity.access_total)
+        false_shared_ratio = ratio(granularity.units_false_shared, granularity.units_multi)
 
-            became_multi, multi_increment = update_thread_state(pointer_states, pointer, thread_id)
-            if became_multi:
-                pointers_multi += 1
-            access_multi += multi_increment
-            access_total += 1
+        print()
+        print(f"Granularity {granularity.name}:")
+        print(f"  Unique units:                                {len(granularity)}")
+        print(f"  Units with multi-threaded access:            {str(granularity.units_multi).ljust(10)} ({units_multi_ratio}% of total)")
+        print(f"  Multi-threaded accesses:                     {str(granularity.access_multi).ljust(10)} ({access_multi_ratio}% of total)")
+        print(f"  False sharing units (disjoint bytes):        {str(granularity.units_false_shared).ljust(10)} ({false_shared_ratio}% of multi-threaded units)")
 
-            if byte_pointer_states is not None:
-                access_total_byte += size
 
-                for byte_pointer in range(pointer, pointer + size):
-                    became_multi_byte, multi_increment_byte = update_thread_state(byte_pointer_states, byte_pointer, thread_id)
-                    if became_multi_byte:
-                        pointers_multi_byte += 1
-                    access_multi_byte += multi_increment_byte
+def print_window_profile(profile: WindowProfile) -> None:
+    windows = profile.windows
+    single_threaded = sum(1 for window in windows if window[3] == 1)
+    phases = profile.single_threaded_phases()
 
     print()
-    print("Access types:              " + " ".join(sorted(access_types)))
-    print("Threads:                   " + str(len(thread_ids)))
+    print(f"Windows:                   {str(len(windows)).ljust(10)} ({profile.size} accesses each)")
+    print(f"Single-threaded windows:   {str(single_threaded).ljust(10)} ({ratio(single_threaded, len(windows))}% of windows)")
+    print(f"Single-threaded phases:    {len(phases)}")
+
+    if phases:
+        first, count = max(phases, key=lambda phase: phase[1])
+        last = windows[first + count - 1]
+        print(f"Longest single-threaded phase: windows {first}-{first + count - 1}, accesses {windows[first][1]}-{last[1] + last[2] - 1}")
+
+
+def print_thread_pairs(thread_pairs: ThreadPairs, top: int = 10) -> None:
+    addresses, accesses = thread_pairs.thread_sets()
+
     print()
-    print("Unique addresses:          " + str(len(pointer_states)))
-    print("Accesses:                  " + str(access_total))
-    print_trace_accounting(access_total, trace_lines, malformed_trace_lines)
+    print("Thread sets sharing addresses: " + str(len(addresses)))
+    print(f"Top {top} thread sets by shared addresses (sequential thread ids):")
+    print(f"  {'Addresses':>10} {'Accesses':>12}   Threads")
+
+    for key, count in addresses.most_common(top):
+        print(f"  {count:>10} {sum(accesses[key].values()):>12}   {' '.join(map(str, key))}")
+
 
-    if byte_pointer_states is not None:
+def print_report(
+    stats: TraceStats,
+    top_sources: int | None = None,
+    swmr_sources: int = 0,
+    lifetime_sources: int = 0,
+    thread_local_sources: int = 0,
+) -> None:
+    print_input_size(stats.compressed_bytes, stats.input_bytes)
+    print()
+    print("Access types:              " + " ".join(sorted(stats.access_types)))
+    print("Threads:                   " + str(len(stats.thread_ids)))
+    print()
+    print("Unique addresses:          " + str(len(stats.pointer_states)))
+    print("Accesses:                  " + str(stats.access_total))
+    print_trace_accounting(stats.access_total, stats.lines.trace_lines, stats.lines.malformed_trace_lines)
+
+    if stats.byte_pointer_states is not None:
         print()
-        print("Unique addresses (byte):   " + str(len(byte_pointer_states)))
-        print("Accesses (byte):           " + str(access_total_byte))
+        print("Unique addresses (byte):   " + str(len(stats.byte_pointer_states)))
+        print("Accesses (byte):           " + str(stats.access_total_byte))
 
-    pointers_multi_ratio = ratio(pointers_multi, len(pointer_states))
-    access_multi_ratio = ratio(access_multi, access_total)
+    pointers_multi_ratio = ratio(stats.pointers_multi, len(stats.pointer_states))
+    access_multi_ratio = ratio(stats.access_multi, stats.access_total)
 
     print()
-    print(f"Addresses with multi-threaded access:          {str(pointers_multi).ljust(10)} ({pointers_multi_ratio}% of total)")
-    print(f"Multi-threaded accesses:                       {str(access_multi).ljust(10)} ({access_multi_ratio}% of total)")
+    print(f"Addresses with multi-threaded access:          {str(stats.pointers_multi).ljust(10)} ({pointers_multi_ratio}% of total)")
+    print(f"Multi-threaded accesses:                       {str(stats.access_multi).ljust(10)} ({access_multi_ratio}% of total)")
 
     print_malformed_line_stats(
-        total_lines,
-        trace_lines,
-        non_trace_lines,
-        malformed_trace_lines,
-        malformed_reasons,
-        malformed_examples,
+        stats.lines.total_lines,
+        stats.lines.trace_lines,
+        stats.lines.non_trace_lines,
+        stats.lines.malformed_trace_lines,
+        stats.lines.malformed_reasons,
+        stats.lines.malformed_examples,
     )
 
-    if byte_pointer_states is None:
+    if stats.byte_pointer_states is None:
         print_byte_stats_skipped()
-        return
+    else:
+        pointers_multi_byte_ratio = ratio(stats.pointers_multi_byte, len(stats.byte_pointer_states))
+        access_multi_byte_ratio = ratio(stats.access_multi_byte, stats.access_total_byte)
+
+        print()
+        print(f"Addresses with multi-threaded access (byte):   {str(stats.pointers_multi_byte).ljust(10)} ({pointers_multi_byte_ratio}% of total)")
+        print(f"Multi-threaded accesses (byte):                {str(stats.access_multi_byte).ljust(10)} ({access_multi_byte_ratio}% of total)")
+
+    if stats.granularities is not None:
+        print_granularities(stats.granularities)
+
+    if stats.source_stats is not None and top_sources:
+        print_source_stats(stats.source_stats, top_sources)
+
+    if stats.swmr is not None:
+        print_swmr(stats.swmr, stats.pointers_multi, swmr_sources)
+
+    if stats.lifetimes is not None:
+        print_lifetimes(stats.lifetimes, lifetime_sources)
 
-    pointers_multi_byte_ratio = ratio(pointers_multi_byte, len(byte_pointer_states))
-    access_multi_byte_ratio = ratio(access_multi_byte, access_total_byte)
+    if stats.thread_local is not None:
+        print_thread_local(stats.thread_local, thread_local_sources)
 
+    if stats.window_profile is not None:
+        print_window_profile(stats.window_profile)
+
+    if stats.thread_pairs is not None:
+        print_thread_pairs(stats.thread_pairs)
+
+
+def print_approx_report(stats: ApproxStats) -> None:
+    unique_addresses = stats.addresses.estimate()
+    pointers_multi, pointers_multi_error = stats.address_sample.shared_addresses()
+    access_multi, access_multi_error = stats.address_sample.multi_accesses_estimate()
+
+    print_input_size(stats.compressed_bytes, stats.input_bytes)
     print()
-    print(f"Addresses with multi-threaded access (byte):   {str(pointers_multi_byte).ljust(10)} ({pointers_multi_byte_ratio}% of total)")
-    print(f"Multi-threaded accesses (byte):                {str(access_multi_byte).ljust(10)} ({access_multi_byte_ratio}% of total)")
+    print("Approximate mode: ~ marks estimates, errors are one standard error unless noted")
+    print()
+    print("Access types:              " + " ".join(sorted(stats.access_types)))
+    print("Threads:                   " + str(len(stats.threads)))
+    print()
+    print(f"Unique addresses:          ~{round(unique_addresses)} (± {ratio(round(stats.addresses.relative_error * unique_addresses), round(unique_addresses))}%, HyperLogLog)")
+    print("Accesses:                  " + str(stats.access_total))
+    print_trace_accounting(stats.access_total, stats.lines.trace_lines, stats.lines.malformed_trace_lines)
+
+    sample = stats.address_sample
+    pointers_multi_ratio = ratio(len(sample.multi_accesses), len(sample.states))
+    access_multi_ratio = ratio(round(access_multi), stats.access_total)
+
+    print()
+    print(f"Addresses sampled for sharing:                 {ratio(sample.threshold, 1 << 64)}% of addresses, by address hash")
+    print(f"Addresses with multi-threaded access:          ~{str(round(pointers_multi)).ljust(9)} (± {round(pointers_multi_error)}, ~{pointers_multi_ratio}% of total)")
+    print(f"Multi-threaded accesses:                       ~{str(round(access_multi)).ljust(9)} (± {round(access_multi_error)}, ~{access_multi_ratio}% of total)")
+
+    print_malformed_line_stats(
+        stats.lines.total_lines,
+        stats.lines.trace_lines,
+        stats.lines.non_trace_lines,
+        stats.lines.malformed_trace_lines,
+        stats.lines.malformed_reasons,
+        stats.lines.malformed_examples,
+    )
+
+    for title, hitters, format_key in (
+        ("addresses", stats.hot_addresses, lambda key: f"{key:#x}"),
+        ("sources", stats.hot_sources, lambda key: stats.source_names.get(key) or "<no source>"),
+    ):
+        sketch = hitters.sketch
+        print()
+        print(f"Top {stats.hot_count} {title} by accesses (Count-Min, overcount at most {sketch.error_bound} with {round(100 * sketch.confidence, 2)}% probability):")
+        for key, count in hitters.top():
+            print(f"  ~{str(count).ljust(12)} {format_key(key)}")
+
+
+def result_record(stats: TraceStats, mode: str, top_sources: int | None = None) -> dict:
+    """The report as a JSON-serializable record (see trace-summarize-results.py)."""
+    record = {
+        "format": RESULT_FORMAT,
+        "version": RESULT_VERSION,
+        "mode": mode,
+        "approximate": False,
+        "compressed_bytes": stats.compressed_bytes,
+        "input_bytes": stats.input_bytes,
+        "access_types": sorted(stats.access_types),
+        "threads": len(stats.thread_ids),
+        "unique_addresses": len(stats.pointer_states),
+        "accesses": stats.access_total,
+        "pointers_multi": stats.pointers_multi,
+        "access_multi": stats.access_multi,
+        "byte": None,
+        "lines": stats.lines.to_dict(),
+    }
+
+    if stats.byte_pointer_states is not None:
+        record["byte"] = {
+            "unique_addresses": len(stats.byte_pointer_states),
+            "accesses": stats.access_total_byte,
+            "pointers_multi": stats.pointers_multi_byte,
+            "access_multi": stats.access_multi_byte,
+        }
+
+    if stats.granularities is not None:
+        record["granularities"] = [granularity.to_dict() for granularity in stats.granularities]
+
+    if stats.swmr is not None:
+        record["swmr"] = stats.swmr.summary()
+
+    if stats.lifetimes is not None:
+        record["lifetimes"] = stats.lifetimes.summary()
+
+    if stats.thread_local is not None:
+        record["thread_local"] = stats.thread_local.summary()
+
+    if stats.source_stats is not None and top_sources:
+        source_stats = stats.source_stats
+        record["top_sources"] = [
+            {
+                "source": source_stats.names[source_id],
+                "accesses": source_stats.accesses[source_id],
+                "multi_accesses": source_stats.multi_accesses[source_id],
+                "addresses": source_stats.addresses[source_id],
+            }
+            for source_id in source_stats.top(top_sources)
+        ]
+
+    return record
+
+
+def approx_result_record(stats: ApproxStats) -> dict:
+    """Like result_record; estimated fields have their standard error under "errors"."""
+    unique_addresses = stats.addresses.estimate()
+    pointers_multi, pointers_multi_error = stats.address_sample.shared_addresses()
+    access_multi, access_multi_error = stats.address_sample.multi_accesses_estimate()
+
+    return {
+        "format": RESULT_FORMAT,
+        "version": RESULT_VERSION,
+        "mode": "approx",
+        "approximate": True,
+        "compressed_bytes": stats.compressed_bytes,
+        "input_bytes": stats.input_bytes,
+        "access_types": sorted(stats.access_types),
+        "threads": len(stats.threads),
+        "unique_addresses": round(unique_addresses),
+        "accesses": stats.access_total,
+        "pointers_multi": round(pointers_multi),
+        "access_multi": round(access_multi),
+        "byte": None,
+        "lines": stats.lines.to_dict(),
+        "errors": {
+            "unique_addresses": round(stats.addresses.relative_error * unique_addresses),
+            "pointers_multi": round(pointers_multi_error),
+            "access_multi": round(access_multi_error),
+        },
+        "sample_rate": stats.address_sample.rate,
+        "hot_addresses": [{"address": f"{key:#x}", "accesses": count} for key, count in stats.hot_addresses.top()],
+        "hot_sources": [
+            {"source": stats.source_names.get(key, ""), "accesses": count} for key, count in stats.hot_sources.top()
+        ],
+        "count_min_error": {
+            "addresses": stats.hot_addresses.sketch.error_bound,
+            "sources": stats.hot_sources.sketch.error_bound,
+            "confidence": stats.hot_addresses.sketch.confidence,
+        },
+    }
+
+
+def write_result_record(record: dict, trace: str, path: str, replace: bool = False) -> None:
+    """Writes the record to `path` ('-': stdout); `replace` renames it into place, so readers never see half a record."""
+    record = {"trace": trace, **record}
+
+    if path == "-":
+        json.dump(record, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    output_path = path + ".tmp" if replace else path
+    with open(output_path, "w", encoding="utf-8") as output:
+        json.dump(record, output, indent=2)
+        output.write("\n")
+    if replace:
+        os.replace(output_path, path)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Counts addresses and accesses shared between threads in a TSan access trace.")
+    parser.add_argument(
+        "file",
+        help="trace file (plain text or .zst), '-' for stdin or a FIFO, or a columnar trace directory from trace-to-columns.py",
+    )
+
+    byte_stats = parser.add_mutually_exclusive_group()
+    byte_stats.add_argument("--byte-stats", action="store_true", help="also track every accessed byte (slow)")
+    byte_stats.add_argument("--skip-byte-stats", action="store_true", help="do not track bytes (default)")
+
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="split an uncompressed trace into N byte ranges analyzed in parallel")
+    parser.add_argument("--numpy", action="store_true", help="parse and analyze the trace in large blocks with NumPy")
+    parser.add_argument(
+        "--approx",
+        action="store_true",
+        help="estimate the statistics in fixed memory with sketches (HyperLogLog, Count-Min, address sampling); needs NumPy",
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        metavar="SECONDS",
+        help="print progress to stderr every SECONDS seconds, 0 disables it (default: $TRACE_PROGRESS, or 10 on a terminal)",
+    )
+    parser.add_argument(
+        "--json",
+        metavar="FILE",
+        help="also write the results as a JSON record to FILE ('-': print only the JSON record to stdout)",
+    )
+    parser.add_argument("--timing-json", metavar="FILE", help="write a JSON timing summary to FILE ('-' for stderr; default: $TRACE_TIMING_JSON)")
+    parser.add_argument("--compact-states", action="store_true", help="keep address states in a flat hash table (~20 bytes per address instead of ~75)")
+    parser.add_argument("--memory-limit", type=int, metavar="MIB", help="cap the compact address table at MIB mebibytes (implies --compact-states)")
+    parser.add_argument("--spill-dir", metavar="DIR", help="move the compact address table to a memory-mapped file in DIR once it exceeds --memory-limit")
+    parser.add_argument("--checkpoint", metavar="FILE", help="periodically save the analysis state to FILE, so that --resume can continue it")
+    parser.add_argument(
+        "--checkpoint-every",
+        type=float,
+        default=1.0,
+        metavar="GIB",
+        help="save a checkpoint after every GIB gibibytes of (decompressed) input (default: 1)",
+    )
+    parser.add_argument("--resume", action="store_true", help="continue from the --checkpoint FILE, if it exists, instead of starting over")
+    parser.add_argument(
+        "--snapshot",
+        metavar="FILE",
+        help="while analyzing, keep rewriting FILE with the JSON record of the statistics so far (marked \"partial\"), "
+        "and write the final record to it at the end",
+    )
+    parser.add_argument(
+        "--snapshot-every",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="seconds between two snapshots (default: 60)",
+    )
+    parser.add_argument(
+        "--windows",
+        type=int,
+        metavar="N",
+        help="profile sharing over time in windows of N accesses (active threads, addresses, newly shared addresses, "
+        "multi-threaded access ratio) and summarize the single-threaded phases",
+    )
+    parser.add_argument(
+        "--windows-output",
+        metavar="FILE",
+        help="write the per-window rows to FILE, as JSON if it ends with .json, as CSV otherwise ('-': CSV to stdout)",
+    )
+    parser.add_argument(
+        "--granularities",
+        nargs="?",
+        const=",".join(map(str, DEFAULT_GRANULARITIES)),
+        metavar="SIZES",
+        help="also count shared units of memory of the given power-of-two SIZES in bytes, with false sharing "
+        "(threads touching disjoint bytes of a unit); default: "
+        + ",".join(map(str, DEFAULT_GRANULARITIES))
+        + " (TSan granule, cache line, page)",
+    )
+    parser.add_argument(
+        "--swmr",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+        help="find single-writer/multi-reader addresses, estimate the reads a perfect SWMR optimization could skip "
+        "and print the N sources with most accesses to them (default: 10)",
+    )
+    parser.add_argument("--swmr-sources", metavar="FILE", help="write all sources accessing SWMR addresses to FILE as CSV")
+    parser.add_argument(
+        "--lifetimes",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+        help="estimate thread lifetimes and count the accesses made while one thread is live (tsan-stmt bound) "
+        "or before a second thread starts (tsan-st bound); print the N sources with most such accesses (default: 10)",
+    )
+    parser.add_argument(
+        "--lifetimes-output",
+        metavar="FILE",
+        help="write thread lifetimes, live thread counts and per-source counts to FILE as JSON",
+    )
+    parser.add_argument(
+        "--thread-local",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+        help="count accesses to addresses only ever accessed by one thread (the bound for escape analysis, tsan-ea) "
+        "by access type and size, and print the N sources with most of them (default: 10)",
+    )
+    parser.add_argument(
+        "--thread-local-output",
+        metavar="FILE",
+        help="write accesses and thread-local accesses per source, access type and size to FILE as CSV",
+    )
+    parser.add_argument(
+        "--thread-pairs",
+        metavar="FILE",
+        help="credit every shared address to the threads that access it and write the thread x thread matrices of shared "
+        "addresses and accesses to FILE (NumPy archive if it ends with .npz, CSV otherwise)",
+    )
+    parser.add_argument(
+        "--address-table",
+        metavar="FILE",
+        help="in the same pass, write the per-address R/W/SWMR table of trace-analyze-get-stats.py to FILE (input for sort-stats.py)",
+    )
+    parser.add_argument(
+        "--top-sources",
+        type=int,
+        metavar="N",
+        help="count accesses per source location and print the N sources with most multi-threaded accesses "
+        "(with --approx: the number of hottest addresses and sources to print)",
+    )
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error("--jobs must be a positive integer")
+
+    if args.file != "-" and not os.path.exists(args.file):
+        parser.error(f"'{args.file}' does not exist")
+
+    if is_columnar_trace(args.file):
+        if np is None:
+            parser.error("columnar traces need the numpy module")
+        if args.jobs > 1:
+            parser.error("--jobs needs a text trace, use --numpy for columnar traces")
+    elif is_stream_input(args.file):
+        if args.jobs > 1:
+            parser.error("--jobs needs a trace file, a pipe can only be read sequentially")
+        if args.checkpoint is not None:
+            parser.error("--checkpoint needs a trace file, a pipe cannot be read again on --resume")
+    elif args.jobs > 1 and is_zstd_file(args.file):
+        parser.error("--jobs needs an uncompressed trace, compressed input can only be read sequentially")
+
+    if args.top_sources is not None:
+        if args.top_sources < 1:
+            parser.error("--top-sources must be a positive integer")
+        if args.numpy or args.jobs > 1:
+            parser.error("--top-sources cannot be combined with --numpy or --jobs")
+
+    if args.approx:
+        if np is None:
+            parser.error("--approx needs the numpy module")
+        if args.numpy or args.jobs > 1 or args.byte_stats or args.compact_states or args.address_table is not None:
+            parser.error("--approx cannot be combined with --numpy, --jobs, --byte-stats, --compact-states or --address-table")
+
+    if args.windows is not None:
+        if args.windows < 1:
+            parser.error("--windows must be a positive integer")
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--windows cannot be combined with --numpy, --jobs or --approx")
+    elif args.windows_output is not None:
+        parser.error("--windows-output needs --windows")
+
+    if args.granularities is not None:
+        try:
+            args.granularities = parse_granularities(args.granularities)
+        except ValueError as error:
+            parser.error(f"--granularities: {error}")
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--granularities cannot be combined with --numpy, --jobs or --approx")
+
+    if args.swmr is not None:
+        if args.swmr < 0:
+            parser.error("--swmr must not be negative")
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--swmr cannot be combined with --numpy, --jobs or --approx")
+    elif args.swmr_sources is not None:
+        parser.error("--swmr-sources needs --swmr")
+
+    if args.lifetimes is not None:
+        if args.lifetimes < 0:
+            parser.error("--lifetimes must not be negative")
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--lifetimes cannot be combined with --numpy, --jobs or --approx")
+    elif args.lifetimes_output is not None:
+        parser.error("--lifetimes-output needs --lifetimes")
+
+    if args.thread_local is not None:
+        if args.thread_local < 0:
+            parser.error("--thread-local must not be negative")
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--thread-local cannot be combined with --numpy, --jobs or --approx")
+    elif args.thread_local_output is not None:
+        parser.error("--thread-local-output needs --thread-local")
+
+    if args.thread_pairs is not None:
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--thread-pairs cannot be combined with --numpy, --jobs or --approx")
+        if args.thread_pairs.endswith(".npz") and np is None:
+            parser.error("--thread-pairs FILE.npz needs the numpy module, use a .csv file")
+
+    if args.address_table is not None and (args.numpy or args.jobs > 1):
+        parser.error("--address-table cannot be combined with --numpy or --jobs")
+
+    if args.progress is not None and args.progress < 0:
+        parser.error("--progress must not be negative")
+
+    if args.memory_limit is not None:
+        if args.memory_limit < 1:
+            parser.error("--memory-limit must be a positive integer")
+        args.compact_states = True
+
+    if args.spill_dir is not None:
+        if args.memory_limit is None:
+            parser.error("--spill-dir needs --memory-limit")
+        if not os.path.isdir(args.spill_dir):
+            parser.error(f"--spill-dir '{args.spill_dir}' is not a directory")
+
+    if args.checkpoint is not None:
+        if args.numpy or args.jobs > 1 or args.approx or is_columnar_trace(args.file):
+            parser.error("--checkpoint needs a sequential analysis of a text trace, not --numpy, --jobs, --approx or columnar input")
+        if args.checkpoint_every <= 0:
+            parser.error("--checkpoint-every must be positive")
+    elif args.resume:
+        parser.error("--resume needs --checkpoint")
+
+    if args.snapshot is not None:
+        if args.numpy or args.jobs > 1 or args.approx:
+            parser.error("--snapshot cannot be combined with --numpy, --jobs or --approx")
+        if args.snapshot_every <= 0:
+            parser.error("--snapshot-every must be positive")
+
+    if args.numpy:
+        if np is None:
+            parser.error("--numpy needs the numpy module")
+        if args.byte_stats or args.jobs > 1:
+            parser.error("--numpy cannot be combined with --byte-stats or --jobs")
+        if args.compact_states:
+            parser.error("--numpy always keeps address states in sorted arrays, --compact-states does not apply")
+
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+
+    json_only = args.json == "-"
+    if not json_only:
+        print("Analyzing " + args.file)
+
+    progress = ProgressReporter("trace-analyze2", args.file, args.progress, args.timing_json)
+
+    if args.approx:
+        approx_stats = analyze_approx(args.file, args.top_sources or HEAVY_HITTERS, progress)
+        if not json_only:
+            print_approx_report(approx_stats)
+        if args.json is not None:
+            write_result_record(approx_result_record(approx_stats), args.file, args.json)
+        progress.finish()
+        return
+
+    pointer_states = None
+    if args.compact_states:
+        memory_limit = args.memory_limit << 20 if args.memory_limit is not None else None
+        pointer_states = AddressStateTable(memory_limit, args.spill_dir)
+
+    checkpoint = None
+    resume = False
+    if args.checkpoint is not None:
+        options = {
+            "byte_stats": args.byte_stats,
+            "source_stats": args.top_sources is not None,
+            "address_table": args.address_table is not None,
+            "compact_states": args.compact_states,
+            "windows": args.windows,
+            "thread_pairs": args.thread_pairs is not None,
+            "granularities": args.granularities,
+            "swmr": args.swmr is not None,
+            "lifetimes": args.lifetimes is not None,
+            "thread_local": args.thread_local is not None,
+        }
+        checkpoint = Checkpoint(args.checkpoint, args.file, options)
+        resume = args.resume and checkpoint.exists()
+        if args.resume and not resume:
+            print(f"No checkpoint '{args.checkpoint}' yet, starting from the beginning", file=sys.stderr)
+
+    snapshot = None
+    if args.snapshot is not None:
+        def snapshot(stats: TraceStats, partial: bool = True) -> None:
+            record = result_record(stats, "sequential", args.top_sources)
+            write_result_record({**record, "partial": partial}, args.file, args.snapshot, replace=True)
+
+    try:
+        if args.numpy:
+            stats = analyze_numpy(args.file, progress)
+        elif args.jobs > 1:
+            stats = analyze_parallel(args.file, args.byte_stats, args.jobs, pointer_states, progress)
+        else:
+            stats = analyze_sequential(
+                args.file,
+                args.byte_stats,
+                args.top_sources is not None,
+                args.address_table is not None,
+                pointer_states,
+                progress,
+                checkpoint,
+                int(args.checkpoint_every * (1 << 30)),
+                resume,
+                snapshot,
+                args.snapshot_every,
+                args.windows,
+                args.thread_pairs is not None,
+                args.granularities,
+                args.swmr is not None,
+                args.lifetimes is not None,
+                args.thread_local is not None,
+            )
+    except MemoryError as error:
+        sys.exit(f"Error: {error}; raise --memory-limit or pass --spill-dir")
+    except RuntimeError as error:
+        sys.exit(f"Error: {error}")
+
+    if not json_only:
+        print_report(stats, args.top_sources, args.swmr or 0, args.lifetimes or 0, args.thread_local or 0)
+
+    if args.json is not None:
+        mode = "numpy" if args.numpy else "jobs" if args.jobs > 1 else "sequential"
+        write_result_record(result_record(stats, mode, args.top_sources), args.file, args.json)
+
+    if snapshot is not None:
+        snapshot(stats, partial=False)
+
+    if stats.address_table is not None:
+        with open(args.address_table, "w", encoding="utf-8") as output:
+            stats.address_table.write(output)
+
+    if args.windows_output is not None:
+        stats.window_profile.write(args.windows_output)
+
+    if args.swmr_sources is not None:
+        stats.swmr.write_sources(args.swmr_sources)
+
+    if args.lifetimes_output is not None:
+        stats.lifetimes.write(args.lifetimes_output, stats.thread_ids)
+
+    if args.thread_local_output is not None:
+        stats.thread_local.write(args.thread_local_output)
+
+    if stats.thread_pairs is not None:
+        shared_addresses, shared_accesses = stats.thread_pairs.matrices(len(stats.thread_ids))
+        write_matrices(args.thread_pairs, shared_addresses, shared_accesses, stats.thread_ids)
+
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    progress.finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Per-source difference of instrumented accesses between two TSan configs.
+
+Takes two traces of the same workload, e.g. under `tsan` and under an
+optimized config such as `tsan-dom` or `tsan-ea`, and reports per source
+location how the number of dynamic accesses changed: sites the optimization
+removed fully, sites it removed partially, and sites that unexpectedly grew
+or only show up in the optimized run.
+
+Both inputs are streamed into one table of interned source ids, each with its
+own `array('Q')` of counts, so the join is a lookup per access and memory
+grows with the number of sources, not with the traces. Instead of a trace, an
+input can be a per-source CSV summary with `source` and `accesses` columns
+(e.g. from trace-analyze2.py --thread-local-output; rows of the same source
+are added up). Sources given as raw PCs differ between builds: run both traces
+through trace-symbolize.py first.
+
+    trace-diff.py tsan/trace.zst tsan-ea/trace.zst --top 20 --output diff.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+from array import array
+
+from trace_input import TraceReader
+from trace_locations import parse_source
+from trace_parse import LineStats, iter_trace_accesses
+from trace_progress import ProgressReporter
+
+STATUSES = (
+    ("removed", "Sources fully removed"),
+    ("partial", "Sources partially removed"),
+    ("unchanged", "Sources unchanged"),
+    ("grown", "Sources grown"),
+    ("new", "Sources only in the optimized run"),
+)
+
+
+class SourceJoin:
+    """Access counts of both inputs per interned source (or group of sources at a coarser `level`)."""
+
+    def __init__(self, level: str) -> None:
+        self.level = level
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        # source string -> id of its group, so that every distinct source is parsed once
+        self._source_ids: dict[str, int] = {}
+        self.counts = (array("Q"), array("Q"))
+
+    def source_id(self, source: str) -> int:
+        source_id = self._source_ids.get(source)
+        if source_id is not None:
+            return source_id
+
+        name = source if self.level == "source" else parse_source(source).key(self.level)
+        source_id = self.ids.get(name)
+        if source_id is None:
+            source_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            for counts in self.counts:
+                counts.append(0)
+
+        self._source_ids[source] = source_id
+        return source_id
+
+    def add_trace(self, side: int, path: str, progress: ProgressReporter) -> LineStats:
+        counts = self.counts[side]
+        source_ids = self._source_ids
+        line_stats = LineStats()
+
+        with TraceReader(path) as trace:
+            progress.start_input(lambda: trace.compressed_bytes, None if trace.is_stream else os.path.getsize(path))
+            for _, _, _, _, source in iter_trace_accesses(progress.wrap(trace), line_stats):
+                source_id = source_ids.get(source)
+                if source_id is None:
+                    source_id = self.source_id(source)
+                counts[source_id] += 1
+            progress.end_input()
+
+        return line_stats
+
+    def add_summary(self, side: int, path: str) -> None:
+        counts = self.counts[side]
+
+        with open(path, newline="", encoding="utf-8") as summary:
+            reader = csv.DictReader(summary)
+            if reader.fieldnames is None or "source" not in reader.fieldnames or "accesses" not in reader.fieldnames:
+                raise RuntimeError(f"'{path}' is not a per-source summary: it needs 'source' and 'accesses' columns")
+            for row in reader:
+                counts[self.source_id(row["source"])] += int(row["accesses"])
+
+    def rows(self) -> list[tuple[str, int, int, int, str]]:
+        """(source, baseline, optimized, change, status) of every source, by change."""
+        baseline_counts, optimized_counts = self.counts
+        rows = []
+
+        for source_id, name in enumerate(self.names):
+            baseline = baseline_counts[source_id]
+            optimized = optimized_counts[source_id]
+
+            if not baseline:
+                status = "new"
+            elif not optimized:
+                status = "removed"
+            elif optimized < baseline:
+                status = "partial"
+            elif optimized == baseline:
+                status = "unchanged"
+            else:
+                status = "grown"
+
+            rows.append((name, baseline, optimized, optimized - baseline, status))
+
+        rows.sort(key=lambda row: (row[3], -row[1], row[0]))
+        return rows
+
+
+def ratio(part: int, total: int) -> float:
+    return round(100 * part / total, 2) if total else 0.0
+
+
+def read_input(join: SourceJoin, side: int, path: str, progress_interval: float | None) -> None:
+    if path.endswith(".csv"):
+        join.add_summary(side, path)
+        return
+
+    progress = ProgressReporter("trace-diff", path, progress_interval)
+    line_stats = join.add_trace(side, path, progress)
+    progress.finish()
+    if line_stats.malformed_trace_lines:
+        print(f"Warning: {line_stats.malformed_trace_lines} malformed trace lines skipped in {path}", file=sys.stderr)
+
+
+def print_report(join: SourceJoin, rows: list, baseline: str, optimized: str, top: int) -> None:
+    baseline_total = sum(join.counts[0])
+    optimized_total = sum(join.counts[1])
+    change = optimized_total - baseline_total
+
+    print(f"Baseline:                  {baseline} ({baseline_total} accesses)")
+    print(f"Optimized:                 {optimized} ({optimized_total} accesses)")
+    print(f"Change:                    {change:+} ({ratio(change, baseline_total):+}% of baseline)")
+    print()
+
+    by_status = {status: [row for row in rows if row[4] == status] for status, _ in STATUSES}
+    for status, title in STATUSES:
+        status_rows = by_status[status]
+        status_change = sum(row[3] for row in status_rows)
+        print(f"{(title + ':').ljust(35)}{str(len(status_rows)).ljust(10)} ({status_change:+} accesses, {ratio(status_change, baseline_total):+}% of baseline)")
+
+    if not top:
+        return
+
+    # Most accesses removed first, most accesses added first for the unexpected ones
+    for status, title in STATUSES:
+        if status == "unchanged" or not by_status[status]:
+            continue
+        status_rows = by_status[status] if status in ("removed", "partial") else sorted(by_status[status], key=lambda row: (-row[3], row[0]))
+
+        print()
+        print(f"{title}, top {top}:")
+        print(f"  {'Baseline':>12} {'Optimized':>12} {'Change':>12}   Source")
+        for source, baseline_count, optimized_count, source_change, _ in status_rows[:top]:
+            print(f"  {baseline_count:>12} {optimized_count:>12} {source_change:>+12}   {source or '<no source>'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare instrumented accesses per source between traces of two TSan configs")
+    parser.add_argument("baseline", help="trace (plain text or .zst) or per-source CSV summary of the baseline config, e.g. tsan")
+    parser.add_argument("optimized", help="trace or per-source CSV summary of the optimized config, e.g. tsan-ea")
+    parser.add_argument("--top", type=int, default=10, metavar="N", help="sources to list per category (default: 10, 0: none)")
+    parser.add_argument(
+        "--level",
+        choices=("source", "line", "file", "function"),
+        default="source",
+        help="compare per source location (the default), source line, file or function (from function@file:line:col)",
+    )
+    parser.add_argument("--output", metavar="FILE", help="write every source with both counts, the change and its category to FILE as CSV")
+    parser.add_argument(
+        "--progress",
+        type=float,
+        metavar="SECONDS",
+        help="print progress to stderr every SECONDS seconds, 0 disables it (default: $TRACE_PROGRESS, or 10 on a terminal)",
+    )
+    args = parser.parse_args()
+
+    if args.top < 0:
+        parser.error("--top must not be negative")
+    if args.baseline == "-" and args.optimized == "-":
+        parser.error("only one input can be read from stdin")
+
+    join = SourceJoin(args.level)
+    try:
+        read_input(join, 0, args.baseline, args.progress)
+        read_input(join, 1, args.optimized, args.progress)
+    except (OSError, RuntimeError, ValueError) as error:
+        sys.exit(f"Error: {error}")
+
+    rows = join.rows()
+    print_report(join, rows, args.baseline, args.optimized, args.top)
+
+    if args.output is not None:
+        with open(args.output, "w", newline="", encoding="utf-8") as output:
+            writer = csv.writer(output)
+            writer.writerow(("source", "baseline", "optimized", "change", "status"))
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
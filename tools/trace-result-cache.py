@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Result cache for the trace directory drivers.
+
+A cache entry holds the output files of one analysis and is named by a key
+derived from:
+
+- the trace identity: size, mtime and SHA-256 of the first and the last MiB of
+  the file (for `.zst` traces, the head and tail frames);
+- the analyzer version: SHA-256 of the analyzer script and of the `trace_*.py`
+  modules next to it, so editing any of them invalidates its results;
+- the analyzer arguments.
+
+Usage from a driver script:
+
+    key=$(trace-result-cache.py key TRACE ANALYZER [ARGS...])
+    trace-result-cache.py get CACHE_DIR "$key" TRACE OUTPUT... || {
+        analyze ... && trace-result-cache.py put CACHE_DIR "$key" OUTPUT...
+    }
+
+Outputs are stored by their extension (`result.log`, `result.json`), so an
+entry can be reused for a renamed or copied trace; the trace path in a restored
+JSON record is updated accordingly. `clear CACHE_DIR` drops all entries.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+CACHE_KEY_VERSION = 1
+EDGE_BYTES = 1 << 20
+ENTRY_NAME = "result"
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for block in iter(lambda: stream.read(EDGE_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def trace_identity(path: str) -> dict:
+    status = os.stat(path)
+
+    with open(path, "rb") as trace:
+        head = trace.read(EDGE_BYTES)
+        trace.seek(max(status.st_size - EDGE_BYTES, 0))
+        tail = trace.read(EDGE_BYTES)
+
+    return {
+        "size": status.st_size,
+        "mtime_ns": status.st_mtime_ns,
+        "head": hashlib.sha256(head).hexdigest(),
+        "tail": hashlib.sha256(tail).hexdigest(),
+    }
+
+
+def analyzer_version(analyzer: str) -> dict:
+    """Digests of the analyzer script and the helper modules it can import."""
+    modules = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(analyzer)), "trace_*.py")))
+    return {os.path.basename(path): file_digest(path) for path in [analyzer] + modules}
+
+
+def cache_key(trace: str, analyzer: str, analyzer_args: list[str]) -> str:
+    description = {
+        "version": CACHE_KEY_VERSION,
+        "trace": trace_identity(trace),
+        "analyzer": analyzer_version(analyzer),
+        "args": analyzer_args,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def entry_file(entry: str, output: str) -> str:
+    return os.path.join(entry, ENTRY_NAME + os.path.splitext(output)[1])
+
+
+def get(cache_dir: str, key: str, trace: str, outputs: list[str]) -> bool:
+    """Restores `outputs` from the entry `key`; False if any of them is missing."""
+    entry = os.path.join(cache_dir, key)
+    if not all(os.path.isfile(entry_file(entry, output)) for output in outputs):
+        return False
+
+    for output in outputs:
+        if output.endswith(".json"):
+            with open(entry_file(entry, output), encoding="utf-8") as cached:
+                record = json.load(cached)
+            record["trace"] = trace
+            with open(output, "w", encoding="utf-8") as result:
+                json.dump(record, result, indent=2)
+                result.write("\n")
+        else:
+            shutil.copyfile(entry_file(entry, output), output)
+
+    return True
+
+
+def put(cache_dir: str, key: str, outputs: list[str]) -> None:
+    """Stores `outputs` as the entry `key`, replacing an older one."""
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Filled next to the entry and renamed, so concurrent drivers never see half an entry.
+    staging = tempfile.mkdtemp(dir=cache_dir, prefix=".staging-")
+    for output in outputs:
+        shutil.copyfile(output, entry_file(staging, output))
+
+    entry = os.path.join(cache_dir, key)
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.rename(staging, entry)
+    except OSError:
+        # Another driver stored the same entry meanwhile.
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def clear(cache_dir: str) -> None:
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Caches trace analysis results by trace identity, analyzer version and arguments.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    key_parser = commands.add_parser("key", help="print the cache key of an analysis")
+    key_parser.add_argument("trace")
+    key_parser.add_argument("analyzer")
+    key_parser.add_argument("analyzer_args", nargs=argparse.REMAINDER)
+
+    get_parser = commands.add_parser("get", help="restore cached outputs; exit code 1 on a cache miss")
+    get_parser.add_argument("cache_dir")
+    get_parser.add_argument("key")
+    get_parser.add_argument("trace")
+    get_parser.add_argument("outputs", nargs="+")
+
+    put_parser = commands.add_parser("put", help="store outputs in the cache")
+    put_parser.add_argument("cache_dir")
+    put_parser.add_argument("key")
+    put_parser.add_argument("outputs", nargs="+")
+
+    clear_parser = commands.add_parser("clear", help="remove all cached results")
+    clear_parser.add_argument("cache_dir")
+
+    args = parser.parse_args()
+
+    if args.command == "key":
+        print(cache_key(args.trace, args.analyzer, args.analyzer_args))
+    elif args.command == "get":
+        sys.exit(0 if get(args.cache_dir, args.key, args.trace, args.outputs) else 1)
+    elif args.command == "put":
+        put(args.cache_dir, args.key, args.outputs)
+    else:
+        clear(args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
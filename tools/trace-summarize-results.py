@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+RESULT_FORMAT = "trace-analyze2"
+
+COLUMNS = [
+    ("trace", "Trace"),
+    ("mode", "Mode"),
+    ("threads", "Threads"),
+    ("accesses", "Accesses"),
+    ("unique_addresses", "Addresses"),
+    ("pointers_multi", "Shared addr."),
+    ("pointers_multi_ratio", "% shared addr."),
+    ("access_multi", "Shared acc."),
+    ("access_multi_ratio", "% shared acc."),
+    ("malformed_trace_lines", "Rejected lines"),
+]
+NUMERIC_COLUMNS = {key for key, _ in COLUMNS} - {"trace", "mode"}
+ESTIMATED_COLUMNS = {"unique_addresses", "pointers_multi", "pointers_multi_ratio", "access_multi", "access_multi_ratio"}
+
+
+def ratio(part: int, total: int) -> float:
+    return round(100 * part / total, 2) if total else 0.0
+
+
+def load_records(results_dir: str) -> list[dict]:
+    records = []
+
+    for path in sorted(glob.glob(os.path.join(results_dir, "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as record_file:
+                record = json.load(record_file)
+        except (OSError, ValueError) as error:
+            print(f"Warning: skipping '{path}': {error}", file=sys.stderr)
+            continue
+
+        if not isinstance(record, dict) or record.get("format") != RESULT_FORMAT:
+            continue
+
+        record["result_file"] = path
+        records.append(record)
+
+    return records
+
+
+def table_row(record: dict) -> dict:
+    trace = os.path.basename(record.get("trace") or record["result_file"])
+    for suffix in (".zst", ".json"):
+        trace = trace.removesuffix(suffix)
+
+    return {
+        "trace": trace,
+        "mode": record["mode"],
+        "approximate": record["approximate"],
+        "threads": record["threads"],
+        "accesses": record["accesses"],
+        "unique_addresses": record["unique_addresses"],
+        "pointers_multi": record["pointers_multi"],
+        "pointers_multi_ratio": ratio(record["pointers_multi"], record["unique_addresses"]),
+        "access_multi": record["access_multi"],
+        "access_multi_ratio": ratio(record["access_multi"], record["accesses"]),
+        "malformed_trace_lines": record["lines"]["malformed_trace_lines"],
+    }
+
+
+def format_cell(row: dict, key: str) -> str:
+    value = row[key]
+    text = f"{value:.2f}" if isinstance(value, float) else str(value)
+    return "~" + text if row["approximate"] and key in ESTIMATED_COLUMNS else text
+
+
+def print_table(rows: list[dict]) -> None:
+    cells = [[title for _, title in COLUMNS]] + [[format_cell(row, key) for key, _ in COLUMNS] for row in rows]
+    widths = [max(len(line[column]) for line in cells) for column in range(len(COLUMNS))]
+
+    for index, line in enumerate(cells):
+        print("  ".join(
+            cell.rjust(width) if key in NUMERIC_COLUMNS else cell.ljust(width)
+            for cell, width, (key, _) in zip(line, widths, COLUMNS)
+        ).rstrip())
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+def write_csv(rows: list[dict], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=[key for key, _ in COLUMNS] + ["approximate"])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Loads the JSON records written by 'trace-analyze2.py --json' and prints one comparison table.",
+        epilog="Example: python3 trace-summarize-results.py results --sort access_multi_ratio --csv summary.csv",
+    )
+    parser.add_argument("results_dir", nargs="?", default="results", help="directory with the *.json result records (default: results)")
+    parser.add_argument("--sort", choices=[key for key, _ in COLUMNS], default="trace", help="column to sort by (default: trace)")
+    parser.add_argument("--csv", metavar="FILE", help="also export the table as CSV to FILE")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.results_dir):
+        print(f"Error: The directory '{args.results_dir}' was not found.", file=sys.stderr)
+        sys.exit(1)
+
+    rows = [table_row(record) for record in load_records(args.results_dir)]
+    if not rows:
+        print(f"No trace-analyze2.py JSON records found in '{args.results_dir}'.", file=sys.stderr)
+        sys.exit(1)
+
+    rows.sort(key=lambda row: row[args.sort], reverse=args.sort in NUMERIC_COLUMNS)
+
+    print_table(rows)
+
+    if args.csv is not None:
+        write_csv(rows, args.csv)
+
+
+if __name__ == "__main__":
+    main()
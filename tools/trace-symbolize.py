@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Replaces the raw PCs in trace sources by function@file:line:col.
+
+Works on traces and on the text output of any analyzer (trace-analyze2.py
+reports, trace-analyze-get-stats.py tables, sort-stats.py): a PC is a hex
+token other than the first one on a line, optionally after `W:` or `R:`; in
+trace lines (` > ...`) only the source field counts, not the address. The
+input is read twice, once to gather the unique PCs, which are then resolved
+in one batch (see trace_symbols.py), and once to rewrite it.
+
+    trace-symbolize.py ./redis-server result.log > result-symbolized.log
+    trace-analyze2.py trace.txt --top-sources 50 | trace-symbolize.py ./app --base 0x555555554000 -
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from trace_symbols import symbolize
+
+PC_TOKEN = re.compile(r"(?<!\S)([WR]:)?(0x[0-9a-fA-F]+)(?!\S)")
+
+
+def default_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "trace-symbolize")
+
+
+def pc_matches(line: str):
+    """The PC tokens of a line (not its first token; for a trace line, its last one only)."""
+    matches = [match for match in PC_TOKEN.finditer(line) if line[:match.start()].strip()]
+    if line.startswith(" > "):
+        end = len(line.rstrip())
+        return [match for match in matches if match.end() == end]
+    return matches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Symbolize the raw PCs in TSan traces and analyzer reports")
+    parser.add_argument("binary", help="the instrumented binary the PCs belong to")
+    parser.add_argument("input", nargs="?", default="-", help="trace or report to rewrite ('-': stdin, the default)")
+    parser.add_argument("-o", "--output", default="-", help="where to write the rewritten input (default: stdout)")
+    parser.add_argument(
+        "--symbolizer",
+        default="llvm-symbolizer",
+        metavar="TOOL",
+        help="llvm-symbolizer (the default) or addr2line, by name or path",
+    )
+    parser.add_argument(
+        "--base",
+        type=lambda text: int(text, 16),
+        default=0,
+        metavar="HEX",
+        help="load address to subtract from the PCs (PIE binaries run with ASLR), default: 0",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        metavar="DIR",
+        help="symbol cache, one file per binary build-id (default: %(default)s)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor update the symbol cache")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.binary):
+        parser.error(f"binary '{args.binary}' does not exist")
+
+    try:
+        if args.input == "-":
+            # Both passes need the input: keep stdin in a temporary file (in memory while small)
+            source = tempfile.SpooledTemporaryFile(16 << 20, mode="w+", encoding="utf-8")
+            shutil.copyfileobj(sys.stdin, source)
+            source.seek(0)
+        else:
+            source = open(args.input, encoding="utf-8", errors="surrogateescape")
+
+        with source:
+            pcs = set()
+            for line in source:
+                for match in pc_matches(line):
+                    pcs.add(int(match.group(2), 16))
+
+            offsets = {pc: pc - args.base for pc in pcs if pc >= args.base}
+            locations, resolved = symbolize(set(offsets.values()), args.binary, args.symbolizer, None if args.no_cache else args.cache_dir)
+            print(
+                f"Symbolized {len(offsets)} PCs: {resolved} resolved, {len(offsets) - resolved} from the cache, "
+                f"{sum(location is None for location in locations.values())} unknown",
+                file=sys.stderr,
+            )
+
+            def replace(match: re.Match) -> str:
+                pc = int(match.group(2), 16)
+                location = locations.get(offsets.get(pc))
+                return match.group(0) if location is None else (match.group(1) or "") + location
+
+            output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", errors="surrogateescape")
+            try:
+                source.seek(0)
+                for line in source:
+                    matches = pc_matches(line)
+                    if not matches:
+                        output.write(line)
+                        continue
+
+                    pieces = []
+                    position = 0
+                    for match in matches:
+                        pieces.append(line[position:match.start()])
+                        pieces.append(replace(match))
+                        position = match.end()
+                    pieces.append(line[position:])
+                    output.write("".join(pieces))
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+
+    except (OSError, RuntimeError) as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+
+from trace_columns import ColumnarTraceWriter
+from trace_input import TraceReader
+from trace_parse import NUMPY_BLOCK_SIZE, np, parse_trace_block
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Converts a text TSan access trace into the columnar format read by the trace analyzers.",
+        epilog="Example: python3 trace-to-columns.py trace.zst trace.cols && python3 trace-analyze2.py trace.cols --numpy",
+    )
+    parser.add_argument("trace", help="trace file, plain text or .zst")
+    parser.add_argument("output", help="directory for the columnar trace (created if missing)")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("Error: trace-to-columns.py needs the numpy module")
+
+    print(f"Converting {args.trace} to {args.output}")
+
+    writer = ColumnarTraceWriter(args.output)
+
+    with TraceReader(args.trace) as trace:
+        for block in trace.iter_blocks(NUMPY_BLOCK_SIZE):
+            writer.append(parse_trace_block(block, with_sources=True))
+
+    writer.close(os.path.abspath(args.trace), trace.decompressed_bytes, trace.compressed_bytes if trace.compressed else None)
+
+    print(f"Rows:                      {writer.rows}")
+    print(f"Access types:              {' '.join(writer.access_types)}")
+    print(f"Sources:                   {len(writer.sources)}")
+    print(f"Rejected trace lines:      {writer.lines.malformed_trace_lines}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Per-address read/write counts and source sets of a TSan access trace.
+
+The table of trace-analyze-get-stats.py and trace-analyze2.py --address-table.
+Keeping a handful of dicts keyed by the hex pointer string, with sets of
+source strings as values, costs well over a kilobyte per address; here every
+address gets a record number from an `AddressIndex` (the order addresses are
+first seen) and the counts live in flat arrays indexed by it:
+
+- reads, writes: `array('Q')`;
+- read_before_write: whether a write came after a read of the address;
+- read_sources, write_sources: `SourceSets` of interned source ids, the only
+  source inline or a sorted `array('I')` (most addresses are accessed from a
+  single source).
+
+About 55 bytes per address, plus the source arrays of addresses accessed from
+more than one source. Sources are listed in order of their ids, i.e. of first
+use in the trace.
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator
+
+from trace_addresses import AddressIndex, AddressStateTable
+from trace_sources import SourceSets
+
+AccessRow = tuple[int, int, int, int, bool, list[str], list[str]]
+
+
+def row_fields(row: AccessRow) -> list[str]:
+    """Fields of a table line: `address R+W W R SWMR W:source... R:source...`, with a bare `W:`/`R:` if there are none."""
+    pointer, accesses, writes, reads, no_write_after_read, write_sources, read_sources = row
+    fields = [f"{pointer:#x}", str(accesses), str(writes), str(reads), "1" if no_write_after_read else "0"]
+    fields.extend(["W:" + source for source in write_sources] or ["W:"])
+    fields.extend(["R:" + source for source in read_sources] or ["R:"])
+    return fields
+
+
+def format_row(row: AccessRow) -> str:
+    """A table line, the input format of sort-stats.py."""
+    return " ".join(row_fields(row))
+
+
+class AccessCounts:
+    def __init__(self, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        self.index = AddressIndex(address_table)
+        self.addresses = array("Q")
+        self.reads = array("Q")
+        self.writes = array("Q")
+        self.read_before_write = bytearray()
+        self.read_sources = SourceSets()
+        self.write_sources = SourceSets()
+
+        self.source_ids: dict[str, int] = {}
+        self.source_names: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def update(self, operation: str, pointer: int, source: str) -> None:
+        record = self.index.get(pointer)
+        if record is None:
+            record = self.index.add(pointer)
+            self.addresses.append(pointer)
+            self.reads.append(0)
+            self.writes.append(0)
+            self.read_before_write.append(0)
+            self.read_sources.append()
+            self.write_sources.append()
+
+        source_id = self.source_ids.get(source)
+        if source_id is None:
+            source_id = self.source_ids[source] = len(self.source_names)
+            self.source_names.append(source)
+
+        if "read" in operation:
+            self.reads[record] += 1
+            self.read_sources.add(record, source_id)
+
+        if "write" in operation:
+            self.writes[record] += 1
+            self.write_sources.add(record, source_id)
+            if self.reads[record]:
+                self.read_before_write[record] = 1
+
+    def rows(self) -> Iterator[AccessRow]:
+        """(address, accesses, writes, reads, no write after a read, write sources, read sources), by first access."""
+        names = self.source_names
+        for record, pointer in enumerate(self.addresses):
+            reads = self.reads[record]
+            writes = self.writes[record]
+            yield (
+                pointer,
+                reads + writes,
+                writes,
+                reads,
+                not self.read_before_write[record],
+                [names[source_id] for source_id in self.write_sources.ids(record)],
+                [names[source_id] for source_id in self.read_sources.ids(record)],
+            )
+
+    def write(self, output) -> None:
+        """Writes the table, one `format_row` line per address."""
+        for row in self.rows():
+            output.write(format_row(row) + "\n")
@@ -0,0 +1,211 @@
+"""Compact hash table from 64-bit addresses to small integer states.
+
+A `dict[int, int]` costs about 75 bytes per address in CPython (an int object
+for the key plus the entry and index slots), which is what runs out of memory
+on traces with hundreds of millions of unique addresses. `AddressStateTable`
+stores the same mapping in two flat arrays, 64-bit keys and signed 32-bit
+states, with linear-probing open addressing: about 12 bytes per slot, or 17-23
+bytes per address at the table's load factor.
+
+The arrays live in a `bytearray`, or, once the table would grow past the memory
+limit, in a memory-mapped temporary file (when a spill directory is given) so
+that the kernel can page it out instead of the process being killed.
+"""
+
+import mmap
+import tempfile
+from collections.abc import Iterator
+
+INITIAL_CAPACITY = 1 << 16
+MAX_LOAD = 0.7
+KEY_MASK = (1 << 64) - 1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+KEY_BYTES = 8
+STATE_BYTES = 4
+
+
+class AddressStateTable:
+    """Drop-in replacement for the `dict[int, int]` of address states (get, [], len, items).
+
+    Address 0 marks empty slots, so it is kept aside, as are keys that do not fit into
+    64 bits; states must fit into a signed 32-bit integer.
+    """
+
+    def __init__(self, memory_limit: int | None = None, spill_dir: str | None = None) -> None:
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.spilled = False
+        self._count = 0
+        self._zero_state: int | None = None
+        self._overflow: dict[int, int] = {}
+        self._last_key = 0
+        self._last_slot = 0
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int) -> None:
+        size = capacity * (KEY_BYTES + STATE_BYTES)
+
+        if self.memory_limit is not None and size > self.memory_limit:
+            if self.spill_dir is None:
+                raise MemoryError(
+                    f"the address table needs {size / (1 << 20):.1f} MiB for {capacity} slots, over the limit of {self.memory_limit / (1 << 20):.1f} MiB"
+                )
+
+            with tempfile.TemporaryFile(dir=self.spill_dir, prefix="address-table-") as spill_file:
+                spill_file.truncate(size)
+                storage = mmap.mmap(spill_file.fileno(), size)
+            self.spilled = True
+        else:
+            storage = bytearray(size)
+
+        buffer = memoryview(storage)
+        self._keys = buffer[:capacity * KEY_BYTES].cast("Q")
+        self._states = buffer[capacity * KEY_BYTES:].cast("i")
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._max_count = int(capacity * MAX_LOAD)
+        self._last_key = 0
+
+    @property
+    def allocated_bytes(self) -> int:
+        return self._capacity * (KEY_BYTES + STATE_BYTES)
+
+    def _slot(self, key: int) -> int:
+        """Slot holding `key`, or the empty slot where it would go."""
+        keys = self._keys
+        mask = self._mask
+        slot = ((key * HASH_MULTIPLIER) & KEY_MASK) >> self._shift
+
+        while True:
+            stored = keys[slot]
+            if stored == key or stored == 0:
+                self._last_key = key
+                self._last_slot = slot
+                return slot
+            slot = (slot + 1) & mask
+
+    def get(self, key: int, default: int | None = None) -> int | None:
+        if key == 0 or key > KEY_MASK:
+            state = self._zero_state if key == 0 else self._overflow.get(key)
+            return default if state is None else state
+
+        slot = self._slot(key)
+        if self._keys[slot] == 0:
+            return default
+        return self._states[slot]
+
+    def __getitem__(self, key: int) -> int:
+        state = self.get(key)
+        if state is None:
+            raise KeyError(key)
+        return state
+
+    def __contains__(self, key: int) -> bool:
+        return self.get(key) is not None
+
+    def __setitem__(self, key: int, state: int) -> None:
+        if key == 0:
+            self._zero_state = state
+            return
+        if key > KEY_MASK:
+            self._overflow[key] = state
+            return
+
+        # update_thread_state looks an address up right before storing it
+        slot = self._last_slot if key == self._last_key else self._slot(key)
+
+        if self._keys[slot] == 0:
+            if self._count >= self._max_count:
+                self._grow()
+                slot = self._slot(key)
+
+            self._keys[slot] = key
+            self._count += 1
+
+        self._states[slot] = state
+
+    def _grow(self) -> None:
+        keys = self._keys
+        states = self._states
+        self._allocate(self._capacity * 2)
+
+        new_keys = self._keys
+        new_states = self._states
+        mask = self._mask
+        shift = self._shift
+
+        for key, state in zip(keys, states):
+            if not key:
+                continue
+
+            slot = ((key * HASH_MULTIPLIER) & KEY_MASK) >> shift
+            while new_keys[slot]:
+                slot = (slot + 1) & mask
+            new_keys[slot] = key
+            new_states[slot] = state
+
+        keys.release()
+        states.release()
+
+    def __getstate__(self) -> dict:
+        return {
+            "memory_limit": self.memory_limit,
+            "spill_dir": self.spill_dir,
+            "capacity": self._capacity,
+            "count": self._count,
+            "zero_state": self._zero_state,
+            "overflow": self._overflow,
+            "keys": self._keys.tobytes(),
+            "states": self._states.tobytes(),
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.memory_limit = state["memory_limit"]
+        self.spill_dir = state["spill_dir"]
+        self.spilled = False
+        self._allocate(state["capacity"])
+        self._keys.cast("B")[:] = state["keys"]
+        self._states.cast("B")[:] = state["states"]
+        self._count = state["count"]
+        self._zero_state = state["zero_state"]
+        self._overflow = state["overflow"]
+        self._last_slot = 0
+
+    def __len__(self) -> int:
+        return self._count + (self._zero_state is not None) + len(self._overflow)
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        if self._zero_state is not None:
+            yield 0, self._zero_state
+
+        for key, state in zip(self._keys, self._states):
+            if key:
+                yield key, state
+
+        yield from self._overflow.items()
+
+
+class AddressIndex:
+    """Dense record numbers for addresses, in order of first access, so that per-address data can live in
+    flat arrays indexed by the record number.
+
+    The numbers are kept in `table`: a dict by default (fastest), or an `AddressStateTable` where the
+    address states are compact too.
+    """
+
+    def __init__(self, table: "dict[int, int] | AddressStateTable | None" = None) -> None:
+        self.table = {} if table is None else table
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, address: int) -> int | None:
+        return self.table.get(address)
+
+    def add(self, address: int) -> int:
+        """Record number of a new address; call only after `get` returned None."""
+        record = self.table[address] = self.count
+        self.count += 1
+        return record
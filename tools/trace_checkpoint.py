@@ -0,0 +1,69 @@
+"""Checkpoints of long-running trace analyses.
+
+A checkpoint is a pickle of the analyzer state together with the input offset
+it belongs to (in decompressed bytes, always at a line boundary), the size and
+modification time of the trace and the options that shape the state. It is
+written to a temporary file next to the checkpoint and renamed over it, so a
+crash while writing leaves the previous checkpoint intact.
+"""
+
+import os
+import pickle
+from typing import Any
+
+CHECKPOINT_FORMAT = "trace-checkpoint"
+CHECKPOINT_VERSION = 1
+
+
+def trace_identity(path: str) -> dict:
+    status = os.stat(path)
+    return {"path": os.path.abspath(path), "size": status.st_size, "mtime_ns": status.st_mtime_ns}
+
+
+class Checkpoint:
+    """Saves and loads the state of one analysis of `trace_path` with the given `options`."""
+
+    def __init__(self, path: str, trace_path: str, options: dict) -> None:
+        self.path = path
+        self.trace_path = trace_path
+        self.options = options
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> tuple[int, Any]:
+        """(input offset, state) of the checkpoint; RuntimeError if it belongs to another analysis."""
+        with open(self.path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+
+        if not isinstance(checkpoint, dict) or checkpoint.get("format") != CHECKPOINT_FORMAT:
+            raise RuntimeError(f"'{self.path}' is not a checkpoint")
+        if checkpoint["version"] != CHECKPOINT_VERSION:
+            raise RuntimeError(f"'{self.path}' has checkpoint version {checkpoint['version']}, expected {CHECKPOINT_VERSION}")
+        if checkpoint["trace"] != trace_identity(self.trace_path):
+            raise RuntimeError(f"'{self.path}' was written for another trace, or the trace has changed since: {checkpoint['trace']}")
+        if checkpoint["options"] != self.options:
+            raise RuntimeError(f"'{self.path}' was written with other options: {checkpoint['options']}")
+
+        return checkpoint["offset"], checkpoint["state"]
+
+    def save(self, offset: int, state: Any) -> None:
+        checkpoint = {
+            "format": CHECKPOINT_FORMAT,
+            "version": CHECKPOINT_VERSION,
+            "trace": trace_identity(self.trace_path),
+            "options": self.options,
+            "offset": offset,
+            "state": state,
+        }
+
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as checkpoint_file:
+            pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.path)
+
+    def remove(self) -> None:
+        if self.exists():
+            os.remove(self.path)
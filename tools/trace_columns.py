@@ -0,0 +1,241 @@
+"""Columnar on-disk form of a TSan access trace, read back through `numpy.memmap`.
+
+A converted trace is a directory holding one raw little-endian file per column
+(`address`, `size`, `thread`, `access_type`, `source`), the interned source
+strings in `sources.txt` (one per line, the line number is the id) and
+`meta.json` with the row count, column types, access type names and the line
+accounting of the original text trace. Use `trace-to-columns.py` to create it.
+
+Analyses of a converted trace skip tokenizing entirely: the columns are mapped
+into memory and processed in blocks of rows.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from trace_parse import LineStats, TraceBlock
+
+COLUMNS_FORMAT = "tsan-trace-columns"
+COLUMNS_VERSION = 1
+COLUMN_TYPES = {
+    "address": "<u8",
+    "size": "<u4",
+    "thread": "<u4",
+    "access_type": "<u1",
+    "source": "<u4",
+}
+META_FILE = "meta.json"
+SOURCES_FILE = "sources.txt"
+COLUMN_BLOCK_ROWS = 1 << 22
+
+
+def is_columnar_trace(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def _column_path(path: str, column: str) -> str:
+    return os.path.join(path, column + ".bin")
+
+
+class ColumnarTraceWriter:
+    """Appends parsed trace blocks to the column files of a new columnar trace."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self.lines = LineStats()
+        self.access_types: dict[str, int] = {}
+        self.sources: dict[str, int] = {}
+        self._files = {column: open(_column_path(path, column), "wb") for column in COLUMN_TYPES}
+
+    def append(self, block: TraceBlock) -> None:
+        if block.sources is None:
+            raise ValueError("columnar traces need blocks parsed with sources")
+
+        access_type_ids = np.array([self.access_types.setdefault(name, len(self.access_types)) for name in block.access_type_names], dtype=np.int64)
+        source_ids = np.array([self.sources.setdefault(name, len(self.sources)) for name in block.source_names], dtype=np.int64)
+
+        columns = {
+            "address": block.pointers,
+            "size": block.sizes,
+            "thread": block.threads,
+            "access_type": access_type_ids[block.access_types] if len(block.access_types) else block.access_types,
+            "source": source_ids[block.sources] if len(block.sources) else block.sources,
+        }
+
+        for column, values in columns.items():
+            dtype = np.dtype(COLUMN_TYPES[column])
+            if len(values) and int(values.max()) > np.iinfo(dtype).max:
+                raise ValueError(f"{column} value {int(values.max())} does not fit into the {dtype} column")
+
+            values.astype(dtype).tofile(self._files[column])
+
+        self.rows += len(block.pointers)
+        self.lines.merge(block.lines)
+
+    def close(self, trace_path: str, input_bytes: int, compressed_bytes: int | None) -> None:
+        for column_file in self._files.values():
+            column_file.close()
+
+        with open(os.path.join(self.path, SOURCES_FILE), "w", encoding="utf-8") as sources_file:
+            for source in self.sources:
+                sources_file.write(source + "\n")
+
+        meta = {
+            "format": COLUMNS_FORMAT,
+            "version": COLUMNS_VERSION,
+            "trace": trace_path,
+            "rows": self.rows,
+            "columns": COLUMN_TYPES,
+            "access_types": list(self.access_types),
+            "input_bytes": input_bytes,
+            "compressed_bytes": compressed_bytes,
+            "lines": self.lines.to_dict(),
+        }
+
+        # meta.json marks the directory as complete, so it is written last.
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+
+class ColumnarTrace:
+    """Read-only view of a columnar trace; the columns are `numpy.memmap` arrays."""
+
+    def __init__(self, path: str) -> None:
+        if np is None:
+            raise RuntimeError(f"reading the columnar trace '{path}' needs the numpy module")
+
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+
+        if meta.get("format") != COLUMNS_FORMAT or meta.get("version") != COLUMNS_VERSION:
+            raise ValueError(f"'{path}' is not a version {COLUMNS_VERSION} columnar trace")
+
+        self.path = path
+        self.trace_path: str = meta["trace"]
+        self.rows: int = meta["rows"]
+        self.access_type_names: list[str] = meta["access_types"]
+        self.input_bytes: int = meta["input_bytes"]
+        self.compressed_bytes: int | None = meta["compressed_bytes"]
+
+        self.lines = LineStats.from_dict(meta["lines"])
+
+        self.address = self._map(meta, "address")
+        self.size = self._map(meta, "size")
+        self.thread = self._map(meta, "thread")
+        self.access_type = self._map(meta, "access_type")
+        self.source = self._map(meta, "source")
+        self._source_names: list[str] | None = None
+
+    def _map(self, meta: dict, column: str) -> np.ndarray:
+        dtype = np.dtype(meta["columns"][column])
+        if not self.rows:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(_column_path(self.path, column), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def __enter__(self) -> "ColumnarTrace":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # Dropping the maps unmaps the column files once no slices refer to them.
+        self.address = self.size = self.thread = self.access_type = self.source = None
+
+    @property
+    def source_names(self) -> list[str]:
+        if self._source_names is None:
+            with open(os.path.join(self.path, SOURCES_FILE), encoding="utf-8") as sources_file:
+                self._source_names = sources_file.read().splitlines()
+        return self._source_names
+
+    def iter_row_blocks(self, block_rows: int = COLUMN_BLOCK_ROWS) -> Iterator[slice]:
+        for start in range(0, self.rows, block_rows):
+            yield slice(start, min(start + block_rows, self.rows))
+
+    def iter_trace_blocks(self, block_rows: int = COLUMN_BLOCK_ROWS) -> Iterator[TraceBlock]:
+        """Yields row blocks as parse_trace_block does; line accounting stays in `lines`."""
+        for rows in self.iter_row_blocks(block_rows):
+            yield TraceBlock(
+                pointers=self.address[rows].astype(np.uint64),
+                sizes=self.size[rows].astype(np.uint64),
+                threads=self.thread[rows].astype(np.uint64),
+                access_types=self.access_type[rows].astype(np.int32),
+                access_type_names=self.access_type_names,
+                sources=self.source[rows].astype(np.int32),
+                source_names=self.source_names,
+                lines=LineStats(),
+            )
+
+    def iter_accesses(self) -> Iterator[tuple[str, int, int, int, str]]:
+        """Yields accesses as iter_trace_accesses does for the text trace."""
+        access_type_names = self.access_type_names
+        source_names = self.source_names
+
+        for rows in self.iter_row_blocks():
+            yield from zip(
+                [access_type_names[access_type] for access_type in self.access_type[rows].tolist()],
+                self.address[rows].tolist(),
+                self.size[rows].tolist(),
+                self.thread[rows].tolist(),
+                [source_names[source] for source in self.source[rows].tolist()],
+            )
+
+    def address_table(self) -> Iterator[tuple[int, int, int, int, bool, list[str], list[str]]]:
+        """Yields the per-address rows of `AccessCounts.rows()`, aggregated with NumPy.
+
+        Rows are (address, R+W, W, R, no write after the first read, write sources, read sources),
+        in order of first access, with sources in id order; format them with trace_access_counts.
+        """
+        is_read = np.array(["read" in name for name in self.access_type_names], dtype=bool)[self.access_type]
+        is_write = np.array(["write" in name for name in self.access_type_names], dtype=bool)[self.access_type]
+
+        addresses, first_access, inverse = np.unique(self.address, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        reads = np.bincount(inverse, weights=is_read, minlength=len(addresses)).astype(np.int64)
+        writes = np.bincount(inverse, weights=is_write, minlength=len(addresses)).astype(np.int64)
+
+        positions = np.arange(self.rows)
+        first_read = np.full(len(addresses), self.rows, dtype=np.int64)
+        np.minimum.at(first_read, inverse[is_read], positions[is_read])
+        last_write = np.full(len(addresses), -1, dtype=np.int64)
+        np.maximum.at(last_write, inverse[is_write], positions[is_write])
+        swmr = last_write < first_read
+
+        source_names = self.source_names
+        write_sources = _group_sources(inverse[is_write], self.source[is_write], len(addresses))
+        read_sources = _group_sources(inverse[is_read], self.source[is_read], len(addresses))
+
+        for index in np.argsort(first_access).tolist():
+            yield (
+                int(addresses[index]),
+                int(writes[index] + reads[index]),
+                int(writes[index]),
+                int(reads[index]),
+                bool(swmr[index]),
+                [source_names[source] for source in write_sources[index]],
+                [source_names[source] for source in read_sources[index]],
+            )
+
+
+def _group_sources(groups: np.ndarray, sources: np.ndarray, group_count: int) -> list[list[int]]:
+    """Distinct source ids per group, as Python lists indexed by group."""
+    grouped: list[list[int]] = [[] for _ in range(group_count)]
+    if not len(groups):
+        return grouped
+
+    pairs = np.unique(groups.astype(np.int64) << 32 | sources.astype(np.int64))
+    for group, source in zip((pairs >> 32).tolist(), (pairs & 0xFFFFFFFF).tolist()):
+        grouped[group].append(source)
+
+    return grouped
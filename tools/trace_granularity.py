@@ -0,0 +1,134 @@
+"""Sharing statistics of a TSan access trace at coarser granularities.
+
+Next to exact addresses, an access can be attributed to the unit of memory it
+falls into: the 8-byte granule TSan keeps shadow state for, the 64-byte cache
+line or the 4 KiB page. Units are keyed by `address >> log2(unit size)` and
+get the same first-thread / multi-threaded state as addresses. Like the other
+per-address analyses, each unit gets a record number from an `AddressIndex`
+(compact under --compact-states and held to its memory limit) and its state
+and byte mask live in array columns indexed by it.
+
+For each multi-threaded unit the bytes every thread touched are tracked as a
+bit mask until two threads touch the same byte. Units where that never happens
+are false sharing: the threads only share the unit, not the data.
+"""
+
+from __future__ import annotations
+
+from array import array
+
+from trace_addresses import AddressIndex, AddressStateTable
+
+MULTI_THREAD = -1
+MASK_BITS = 64
+DEFAULT_GRANULARITIES = (8, 64, 4096)
+GRANULARITY_NAMES = {8: "granule", 64: "cache line", 4096: "page"}
+
+
+class GranularityStats:
+    def __init__(self, unit_size: int, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        if unit_size < 1 or unit_size & (unit_size - 1):
+            raise ValueError(f"unit size {unit_size} is not a power of two")
+
+        self.unit_size = unit_size
+        self.shift = unit_size.bit_length() - 1
+        self.index = AddressIndex(address_table)
+        # Per unit record: the first thread or MULTI_THREAD
+        self.states = array("i")
+        # Per unit record: bytes touched so far while only one thread accessed it, 0 afterwards;
+        # masks of units wider than 64 bytes do not fit an array('Q') and are Python ints
+        self.masks: array | list[int] = array("Q") if unit_size <= MASK_BITS else []
+        # multi-threaded unit without a byte touched by two threads -> {thread id: bytes, MULTI_THREAD: all bytes}
+        self.disjoint_masks: dict[int, dict[int, int]] = {}
+        self.access_total = 0
+        self.access_multi = 0
+        self.units_multi = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def name(self) -> str:
+        name = GRANULARITY_NAMES.get(self.unit_size)
+        return f"{self.unit_size} B" + (f" ({name})" if name else "")
+
+    @property
+    def units_false_shared(self) -> int:
+        return len(self.disjoint_masks)
+
+    def update(self, pointer: int, size: int, thread_id: int) -> None:
+        shift = self.shift
+        unit = pointer >> shift
+        offset = pointer & (self.unit_size - 1)
+        size = max(size, 1)
+
+        # An access crossing a unit boundary counts for every unit it touches.
+        while True:
+            length = min(size, self.unit_size - offset)
+            self._update_unit(unit, ((1 << length) - 1) << offset, thread_id)
+            size -= length
+            if not size:
+                return
+            unit += 1
+            offset = 0
+
+    def _update_unit(self, unit: int, mask: int, thread_id: int) -> None:
+        self.access_total += 1
+        record = self.index.get(unit)
+
+        if record is None:
+            self.index.add(unit)
+            self.states.append(thread_id)
+            self.masks.append(mask)
+            return
+
+        state = self.states[record]
+        if state == thread_id:
+            self.masks[record] |= mask
+            return
+
+        if state != MULTI_THREAD:
+            # Same accounting as update_thread_state in trace-analyze2.py.
+            self.states[record] = MULTI_THREAD
+            self.units_multi += 1
+            self.access_multi += 2
+
+            first_mask = self.masks[record]
+            self.masks[record] = 0
+            if not first_mask & mask:
+                self.disjoint_masks[unit] = {state: first_mask, thread_id: mask, MULTI_THREAD: first_mask | mask}
+            return
+
+        self.access_multi += 1
+
+        masks = self.disjoint_masks.get(unit)
+        if masks is None:
+            return
+
+        own = masks.get(thread_id, 0)
+        # Until a byte is shared the per-thread masks are disjoint, so this is what the other threads touched.
+        if mask & (masks[MULTI_THREAD] ^ own):
+            del self.disjoint_masks[unit]
+            return
+
+        masks[thread_id] = own | mask
+        masks[MULTI_THREAD] |= mask
+
+    def to_dict(self) -> dict:
+        return {
+            "unit_size": self.unit_size,
+            "unique_units": len(self),
+            "accesses": self.access_total,
+            "units_multi": self.units_multi,
+            "access_multi": self.access_multi,
+            "units_false_shared": self.units_false_shared,
+        }
+
+
+def parse_granularities(text: str) -> list[int]:
+    """Unit sizes from a comma-separated list such as "8,64,4096"."""
+    sizes = [int(size) for size in text.split(",") if size.strip()]
+    for size in sizes:
+        if size < 1 or size & (size - 1):
+            raise ValueError(f"granularity {size} is not a power of two")
+    return sizes
@@ -0,0 +1,232 @@
+"""Line readers for TSan access traces, plain or zstd-compressed.
+
+Traces are usually stored as `trace.zst` (see `howto_compress_tracing.txt`).
+`TraceReader` decompresses such files as a stream, so the analyzers never need
+a decompressed copy on disk. Multi-frame files (e.g. produced by `zstd -T0` or
+by concatenating several `.zst` files) are read across all frames.
+
+The `zstandard` module is used when it is installed; otherwise the `zstd`
+command-line tool is spawned as a decompression filter.
+
+The input may also be a pipe: `-` for stdin, a FIFO or a `<(...)` process
+substitution. Its format is sniffed from the first bytes read; compressed pipes
+need the `zstandard` module.
+"""
+
+import io
+import os
+import shutil
+import stat
+import subprocess
+import sys
+from collections.abc import Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+READ_BUFFER_SIZE = 1 << 20
+
+
+def is_zstd_file(path: str) -> bool:
+    with open(path, "rb") as stream:
+        return stream.read(len(ZSTD_MAGIC)) == ZSTD_MAGIC
+
+
+def is_stream_input(path: str) -> bool:
+    """True for stdin (`-`), FIFOs, character devices (/dev/stdin) and sockets, which can only be read once."""
+    if path == "-":
+        return True
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISCHR(mode) or stat.S_ISSOCK(mode)
+
+
+class _CountingReader(io.RawIOBase):
+    """Raw stream wrapper that counts the bytes handed on, starting with `prefix` (bytes already read from `stream`)."""
+
+    def __init__(self, stream, prefix: bytes = b"") -> None:
+        super().__init__()
+        self._stream = stream
+        self._prefix = prefix
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            count = min(len(buffer), len(self._prefix))
+            buffer[:count] = self._prefix[:count]
+            self._prefix = self._prefix[count:]
+        else:
+            count = self._stream.readinto(buffer)
+        if count:
+            self.bytes_read += count
+        return count
+
+
+class TraceReader:
+    """Iterates over the text lines of a trace, decompressing `.zst` on the fly."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.is_stream = is_stream_input(path)
+        self._process: subprocess.Popen | None = None
+        self._source: _CountingReader | None = None
+        self._closed_compressed_bytes: int | None = None
+
+        if self.is_stream:
+            stream = self._open_stream()
+        else:
+            self.compressed = is_zstd_file(path)
+            stream = self._open_file()
+
+        self._counter = _CountingReader(stream)
+        self._lines = io.TextIOWrapper(
+            io.BufferedReader(self._counter, READ_BUFFER_SIZE),
+            encoding="utf-8",
+            errors="replace",
+        )
+
+    def _open_stream(self):
+        """Pipes cannot be read twice, so the magic number is read once and handed on."""
+        if self.path == "-":
+            self._raw = open(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+        else:
+            self._raw = open(self.path, "rb", buffering=0)
+
+        head = b""
+        while len(head) < len(ZSTD_MAGIC):
+            chunk = self._raw.read(len(ZSTD_MAGIC) - len(head))
+            if not chunk:
+                break
+            head += chunk
+
+        self.compressed = head == ZSTD_MAGIC
+        self._source = _CountingReader(self._raw, head)
+        if not self.compressed:
+            return self._source
+
+        if zstandard is None:
+            raise RuntimeError(f"cannot decompress '{self.path}': compressed pipes need the zstandard module, pipe the trace through zstdcat instead")
+
+        return zstandard.ZstdDecompressor().stream_reader(
+            io.BufferedReader(self._source, READ_BUFFER_SIZE),
+            read_size=READ_BUFFER_SIZE,
+            read_across_frames=True,
+            closefd=False,
+        )
+
+    def _open_file(self):
+        path = self.path
+
+        if not self.compressed:
+            self._raw = open(path, "rb", buffering=0)
+            stream = self._raw
+        elif zstandard is not None:
+            self._raw = open(path, "rb")
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                self._raw,
+                read_size=READ_BUFFER_SIZE,
+                read_across_frames=True,
+                closefd=False,
+            )
+        else:
+            zstd = shutil.which("zstd")
+            if zstd is None:
+                raise RuntimeError(f"cannot decompress '{path}': neither the zstandard module nor the zstd tool is available")
+
+            # The child shares our file description, so its offset tells how much was consumed.
+            self._raw = open(path, "rb", buffering=0)
+            self._process = subprocess.Popen([zstd, "-d", "-c", "-q"], stdin=self._raw, stdout=subprocess.PIPE)
+            stream = self._process.stdout
+
+        return stream
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def skip(self, byte_count: int) -> None:
+        """Moves to the decompressed offset `byte_count` of a file; call before reading anything.
+
+        Plain files are seeked, compressed ones are decompressed up to the offset.
+        """
+        if not self.compressed:
+            self._raw.seek(byte_count)
+            self._counter.bytes_read = byte_count
+            return
+
+        stream = self._lines.buffer
+        remaining = byte_count
+        while remaining:
+            skipped = len(stream.read(min(remaining, READ_BUFFER_SIZE)))
+            if not skipped:
+                raise RuntimeError(f"'{self.path}' ends before offset {byte_count}")
+            remaining -= skipped
+
+    def iter_blocks(self, block_size: int) -> Iterator[bytes]:
+        """Yields raw blocks of about `block_size` bytes, each ending at a line boundary.
+
+        Only the last block may lack a trailing newline. Do not mix with line iteration.
+        """
+        stream = self._lines.buffer
+
+        while True:
+            block = stream.read(block_size)
+            if not block:
+                return
+
+            if not block.endswith(b"\n"):
+                block += stream.readline()
+
+            yield block
+
+    def __enter__(self) -> "TraceReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(check=exc_type is None)
+
+    @property
+    def compressed_bytes(self) -> int:
+        """Compressed input consumed so far (equals `decompressed_bytes` for plain files)."""
+        if self._closed_compressed_bytes is not None:
+            return self._closed_compressed_bytes
+
+        if not self.compressed:
+            return self._counter.bytes_read
+
+        if self._source is not None:
+            return self._source.bytes_read
+
+        if self._process is not None:
+            return os.lseek(self._raw.fileno(), 0, os.SEEK_CUR)
+
+        return self._raw.tell()
+
+    @property
+    def decompressed_bytes(self) -> int:
+        return self._counter.bytes_read
+
+    def close(self, check: bool = True) -> None:
+        if self._closed_compressed_bytes is not None:
+            return
+
+        self._closed_compressed_bytes = self.compressed_bytes
+        self._lines.close()
+        self._raw.close()
+
+        if self._process is None:
+            return
+
+        if not check:
+            self._process.kill()
+
+        returncode = self._process.wait()
+        if check and returncode != 0:
+            raise RuntimeError(f"zstd failed to decompress '{self.path}' (exit code {returncode})")
@@ -0,0 +1,182 @@
+"""Sorted map of disjoint byte ranges, used for byte-granular trace statistics.
+
+Tracking every accessed byte in a dict costs one entry (and one Python call) per
+byte. `IntervalMap` instead keeps half-open ranges `[start, end)` with a state
+each: an access splits the ranges it partially covers, and neighbouring ranges
+that end up in the same state are coalesced again, so memory grows with the
+number of distinct ranges rather than with the number of bytes.
+
+Ranges live in blocks of a few hundred entries (similar to a B-tree leaf level),
+so inserting a range costs O(log n + block size) instead of shifting one huge list.
+"""
+
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Iterator
+from typing import Any
+
+BLOCK_LOAD = 256
+
+# transition(state or None for untracked bytes, range length, value) -> new state
+Transition = Callable[[Any, int, Any], Any]
+
+
+class IntervalMap:
+    def __init__(self) -> None:
+        self._block_starts: list[int] = []
+        self._starts: list[array] = []
+        self._ends: list[array] = []
+        self._states: list[list[Any]] = []
+        self.byte_count = 0
+
+    def __len__(self) -> int:
+        """Number of distinct bytes covered by the map."""
+        return self.byte_count
+
+    @property
+    def range_count(self) -> int:
+        return sum(len(starts) for starts in self._starts)
+
+    def iter_ranges(self) -> Iterator[tuple[int, int, Any]]:
+        for starts, ends, states in zip(self._starts, self._ends, self._states):
+            yield from zip(starts, ends, states)
+
+    def update(self, start: int, end: int, transition: Transition, value: Any) -> None:
+        """Applies `transition` to every byte of [start, end), piece by piece."""
+        if start >= end:
+            return
+
+        if not self._block_starts:
+            self._block_starts.append(start)
+            self._starts.append(array("Q", [start]))
+            self._ends.append(array("Q", [end]))
+            self._states.append([transition(None, end - start, value)])
+            self.byte_count += end - start
+            return
+
+        block = max(bisect_right(self._block_starts, start) - 1, 0)
+        starts = self._starts[block]
+        ends = self._ends[block]
+        states = self._states[block]
+
+        first = bisect_right(starts, start) - 1
+
+        # Fast path: the access lies inside one range and does not change its state.
+        if first >= 0 and ends[first] >= end:
+            state = states[first]
+            new_state = transition(state, end - start, value)
+            if new_state == state:
+                return
+
+            self._replace(block, first, first + 1, self._split_range(starts[first], ends[first], state, start, end, new_state))
+            return
+
+        # Keep every range that overlaps [start, end] within one block.
+        while block + 1 < len(self._block_starts) and self._block_starts[block + 1] <= end:
+            self._merge_next_block(block)
+        starts = self._starts[block]
+        ends = self._ends[block]
+        states = self._states[block]
+
+        if first < 0 or ends[first] <= start:
+            first += 1
+
+        last = first
+        pieces: list[tuple[int, int, Any]] = []
+        position = start
+
+        while last < len(starts) and starts[last] < end:
+            range_start = starts[last]
+            range_end = ends[last]
+            state = states[last]
+
+            if range_start < start:
+                pieces.append((range_start, start, state))
+            elif range_start > position:
+                pieces.append((position, range_start, transition(None, range_start - position, value)))
+                self.byte_count += range_start - position
+
+            covered_start = max(range_start, start)
+            covered_end = min(range_end, end)
+            pieces.append((covered_start, covered_end, transition(state, covered_end - covered_start, value)))
+
+            if range_end > end:
+                pieces.append((end, range_end, state))
+
+            position = covered_end
+            last += 1
+
+        if position < end:
+            pieces.append((position, end, transition(None, end - position, value)))
+            self.byte_count += end - position
+
+        self._replace(block, first, last, pieces)
+
+    @staticmethod
+    def _split_range(range_start: int, range_end: int, state: Any, start: int, end: int, new_state: Any) -> list[tuple[int, int, Any]]:
+        pieces = []
+        if range_start < start:
+            pieces.append((range_start, start, state))
+        pieces.append((start, end, new_state))
+        if end < range_end:
+            pieces.append((end, range_end, state))
+        return pieces
+
+    def _replace(self, block: int, first: int, last: int, pieces: list[tuple[int, int, Any]]) -> None:
+        """Replaces ranges [first, last) of a block with `pieces`, coalescing equal neighbours."""
+        starts = self._starts[block]
+        ends = self._ends[block]
+        states = self._states[block]
+
+        if first > 0 and ends[first - 1] == pieces[0][0] and states[first - 1] == pieces[0][2]:
+            first -= 1
+            pieces[0] = (starts[first], pieces[0][1], pieces[0][2])
+
+        if last < len(starts) and starts[last] == pieces[-1][1] and states[last] == pieces[-1][2]:
+            pieces[-1] = (pieces[-1][0], ends[last], pieces[-1][2])
+            last += 1
+
+        new_starts = []
+        new_ends = []
+        new_states = []
+
+        for piece_start, piece_end, state in pieces:
+            if new_states and new_ends[-1] == piece_start and new_states[-1] == state:
+                new_ends[-1] = piece_end
+                continue
+
+            new_starts.append(piece_start)
+            new_ends.append(piece_end)
+            new_states.append(state)
+
+        starts[first:last] = array("Q", new_starts)
+        ends[first:last] = array("Q", new_ends)
+        states[first:last] = new_states
+        self._block_starts[block] = starts[0]
+
+        if len(starts) > 2 * BLOCK_LOAD:
+            self._split_block(block)
+
+    def _merge_next_block(self, block: int) -> None:
+        self._starts[block].extend(self._starts.pop(block + 1))
+        self._ends[block].extend(self._ends.pop(block + 1))
+        self._states[block].extend(self._states.pop(block + 1))
+        del self._block_starts[block + 1]
+
+    def _split_block(self, block: int) -> None:
+        starts = self._starts[block]
+        ends = self._ends[block]
+        states = self._states[block]
+
+        for offset in range(0, len(starts), BLOCK_LOAD):
+            if offset == 0:
+                continue
+
+            self._block_starts.insert(block + offset // BLOCK_LOAD, starts[offset])
+            self._starts.insert(block + offset // BLOCK_LOAD, starts[offset:offset + BLOCK_LOAD])
+            self._ends.insert(block + offset // BLOCK_LOAD, ends[offset:offset + BLOCK_LOAD])
+            self._states.insert(block + offset // BLOCK_LOAD, states[offset:offset + BLOCK_LOAD])
+
+        del starts[BLOCK_LOAD:]
+        del ends[BLOCK_LOAD:]
+        del states[BLOCK_LOAD:]
@@ -0,0 +1,216 @@
+"""Thread lifetimes and single-threaded phases of a TSan access trace.
+
+A thread is taken to be live from its first to its last access in the trace.
+Accesses made while only one thread is live are what the `tsan-stmt` config
+(`-tsan-use-active-thread-count`) could skip at best; those made before a
+second thread appears are the bound for `tsan-st`.
+
+Which accesses are single-threaded depends on later accesses (a thread seen
+before may come back), yet it is decided in one pass: a maximal run of
+accesses by one thread is either single-threaded as a whole or not at all,
+since no other thread accesses memory inside the run. A run is single-threaded
+unless a thread seen before it accesses memory after it. Runs wait, with their
+per-source counts, until such a thread shows up or the trace ends.
+
+Pending runs are kept by start, in groups of consecutive runs of one thread. A
+thread coming back credits the runs of other threads that started after its
+first access, a suffix found by bisection, and its own runs there become one
+group, so every run is looked at a bounded number of times even when a long
+lived thread keeps coming back between threads that never do.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+import json
+
+
+class ThreadRun:
+    __slots__ = ("thread_id", "start", "counts")
+
+    def __init__(self, thread_id: int, start: int) -> None:
+        self.thread_id = thread_id
+        self.start = start
+        self.counts: dict[int, int] = {}
+
+
+class ThreadLifetimes:
+    def __init__(self) -> None:
+        self.first: dict[int, int] = {}
+        self.last: dict[int, int] = {}
+        self.accesses: dict[int, int] = {}
+        self.index = 0
+
+        self.source_ids: dict[str, int] = {}
+        self.source_names: list[str] = []
+        self.source_accesses = array("Q")
+        self.single_accesses = array("Q")
+        self.prefix_accesses = array("Q")
+
+        self._run: ThreadRun | None = None
+        # Groups of consecutive pending runs of one thread, by start, and the start of every group
+        self._pending: list[list[ThreadRun]] = []
+        self._pending_starts: list[int] = []
+        self._prefix_done = False
+
+    def update(self, thread_id: int, source: str) -> None:
+        run = self._run
+        if run is None or run.thread_id != thread_id:
+            run = self._start_run(thread_id)
+
+        source_id = self.source_ids.get(source)
+        if source_id is None:
+            source_id = self._intern(source)
+
+        counts = run.counts
+        counts[source_id] = counts.get(source_id, 0) + 1
+        self.last[thread_id] = self.index
+        self.index += 1
+
+    def _intern(self, source: str) -> int:
+        source_id = self.source_ids[source] = len(self.source_names)
+        self.source_names.append(source)
+        self.source_accesses.append(0)
+        self.single_accesses.append(0)
+        self.prefix_accesses.append(0)
+        return source_id
+
+    def _start_run(self, thread_id: int) -> ThreadRun:
+        if self._run is not None:
+            self._end_run(self._run)
+
+        first = self.first.get(thread_id)
+        if first is None:
+            self.first[thread_id] = self.index
+        else:
+            self._resolve_pending(thread_id, first)
+
+        self._run = ThreadRun(thread_id, self.index)
+        return self._run
+
+    def _end_run(self, run: ThreadRun) -> None:
+        self.accesses[run.thread_id] = self.accesses.get(run.thread_id, 0) + sum(run.counts.values())
+
+        if not self._prefix_done:
+            # The first run ends where the second thread starts.
+            self._prefix_done = True
+            for source_id, count in run.counts.items():
+                self.prefix_accesses[source_id] += count
+
+        if self._pending and self._pending[-1][0].thread_id == run.thread_id:
+            self._pending[-1].append(run)
+        else:
+            self._pending.append([run])
+            self._pending_starts.append(run.start)
+
+    def _resolve_pending(self, thread_id: int, first: int) -> None:
+        """The thread is back: the pending runs of other threads since its first access were not alone."""
+        position = bisect_right(self._pending_starts, first)
+
+        # The group started before the thread's first access, its later runs did not
+        previous = self._pending[position - 1] if position else None
+        if previous is not None and previous[0].thread_id != thread_id:
+            while previous[-1].start > first:
+                self._credit(previous.pop(), False)
+
+        own: list[ThreadRun] | None = None
+        for group in self._pending[position:]:
+            if group[0].thread_id != thread_id:
+                for run in group:
+                    self._credit(run, False)
+            elif own is None:
+                own = group
+            else:
+                own.extend(group)
+
+        del self._pending[position:]
+        del self._pending_starts[position:]
+        if own is not None:
+            if previous is not None and previous[0].thread_id == thread_id:
+                previous.extend(own)
+            else:
+                self._pending.append(own)
+                self._pending_starts.append(own[0].start)
+
+    def _credit(self, run: ThreadRun, single: bool) -> None:
+        for source_id, count in run.counts.items():
+            self.source_accesses[source_id] += count
+            if single:
+                self.single_accesses[source_id] += count
+
+    def finish(self) -> None:
+        """Resolves the runs still pending at the end of the trace: nobody came back after them."""
+        if self._run is not None:
+            self._end_run(self._run)
+            self._run = None
+
+        for group in self._pending:
+            for run in group:
+                self._credit(run, True)
+        self._pending = []
+        self._pending_starts = []
+
+    def live_threads(self) -> list[tuple[int, int]]:
+        """(access index, live threads from there on) at every change of the live thread count."""
+        events: dict[int, int] = {}
+        for thread_id, first in self.first.items():
+            events[first] = events.get(first, 0) + 1
+            events[self.last[thread_id] + 1] = events.get(self.last[thread_id] + 1, 0) - 1
+
+        steps = []
+        live = 0
+        for index in sorted(events):
+            if events[index]:
+                live += events[index]
+                steps.append((index, live))
+        return steps
+
+    def summary(self) -> dict:
+        steps = self.live_threads()
+        return {
+            "threads": len(self.first),
+            "accesses": self.index,
+            "max_live_threads": max((live for _, live in steps), default=0),
+            "single_threaded_accesses": sum(self.single_accesses),
+            "before_second_thread_accesses": sum(self.prefix_accesses),
+        }
+
+    def top_sources(self, count: int) -> list[int]:
+        """Ids of the `count` sources with most accesses while one thread is live."""
+        return sorted(
+            range(len(self.source_names)),
+            key=lambda source_id: (-self.single_accesses[source_id], -self.source_accesses[source_id], self.source_names[source_id]),
+        )[:count]
+
+    def write(self, path: str, thread_ids: dict[int, int]) -> None:
+        """Writes threads, live thread steps and per-source counts to `path` as JSON."""
+        raw_threads = {thread_id: thread for thread, thread_id in thread_ids.items()}
+
+        record = {
+            **self.summary(),
+            "thread_lifetimes": [
+                {
+                    "thread": thread_id,
+                    "trace_thread": raw_threads.get(thread_id),
+                    "first_access": first,
+                    "last_access": self.last[thread_id],
+                    "accesses": self.accesses[thread_id],
+                }
+                for thread_id, first in self.first.items()
+            ],
+            "live_threads": self.live_threads(),
+            "sources": [
+                {
+                    "source": self.source_names[source_id],
+                    "accesses": self.source_accesses[source_id],
+                    "single_threaded_accesses": self.single_accesses[source_id],
+                    "before_second_thread_accesses": self.prefix_accesses[source_id],
+                }
+                for source_id in self.top_sources(len(self.source_names))
+            ],
+        }
+
+        with open(path, "w", encoding="utf-8") as output:
+            json.dump(record, output, indent=1)
+            output.write("\n")
@@ -0,0 +1,58 @@
+"""Source locations of TSan access traces.
+
+The source field of a trace line is `file:line:col` (or `file:line`), a raw
+PC, or `function@file:line:col` once such PCs are symbolized by
+trace-symbolize.py. `parse_source` splits any of these; parts that are missing
+are None (a raw PC is kept as the file).
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+
+class SourceLocation(NamedTuple):
+    function: str | None
+    file: str
+    line: int | None
+    column: int | None
+
+    def key(self, level: str) -> str:
+        """Group key of the location for a rollup `level`: source, line, file or function."""
+        if level == "function":
+            return self.function or "<unknown function>"
+        if level == "file":
+            return self.file
+        if level == "line":
+            return self.file if self.line is None else f"{self.file}:{self.line}"
+        return str(self)
+
+    def __str__(self) -> str:
+        text = self.file
+        if self.line is not None:
+            text += f":{self.line}"
+            if self.column is not None:
+                text += f":{self.column}"
+        return text if self.function is None else f"{self.function}@{text}"
+
+
+def parse_source(source: str) -> SourceLocation:
+    function = None
+    function_end = source.find("@")
+    # An '@' in a path (node_modules/@scope/...) does not end a function name
+    if function_end > 0 and "/" not in source[:function_end]:
+        function, source = source[:function_end], source[function_end + 1:]
+
+    numbers: list[int] = []
+    file = source
+    # Trailing :<number> parts are line and column; anything else is part of the file name
+    while len(numbers) < 2:
+        head, separator, tail = file.rpartition(":")
+        if not separator or not head or not tail.isdigit():
+            break
+        numbers.insert(0, int(tail))
+        file = head
+
+    line = numbers[0] if numbers else None
+    column = numbers[1] if len(numbers) > 1 else None
+    return SourceLocation(function, file, line, column)
@@ -0,0 +1,386 @@
+"""Parsing of TSan access trace lines, one at a time or in large NumPy blocks.
+
+A trace line is ` > access_type pointer size thread source` (or the older
+` > pointer size access_type thread`). Every other line is ignored, and trace
+lines that do not parse are counted by reason in `LineStats`.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import io
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+MALFORMED_LINE_EXAMPLES_LIMIT = 5
+NUMPY_BLOCK_SIZE = 32 << 20
+NUMPY_MAX_HEX_DIGITS = 16
+NUMPY_MAX_DECIMAL_DIGITS = 18
+NUMPY_MAX_VALUE = (1 << 64) - 1
+NUMPY_BLOCK_PADDING = 64
+NUMPY_MAX_TOKEN_WIDTH = 256
+
+
+@dataclass
+class LineStats:
+    total_lines: int = 0
+    trace_lines: int = 0
+    non_trace_lines: int = 0
+    malformed_trace_lines: int = 0
+    malformed_reasons: Counter[str] = field(default_factory=Counter)
+    malformed_examples: list[tuple[int, str, str]] = field(default_factory=list)
+
+    def merge(self, other: "LineStats") -> None:
+        """Append the accounting of the next chunk; its line numbers are chunk-relative."""
+        for line_number, reason, example in other.malformed_examples:
+            if len(self.malformed_examples) >= MALFORMED_LINE_EXAMPLES_LIMIT:
+                break
+            self.malformed_examples.append((self.total_lines + line_number, reason, example))
+
+        self.total_lines += other.total_lines
+        self.trace_lines += other.trace_lines
+        self.non_trace_lines += other.non_trace_lines
+        self.malformed_trace_lines += other.malformed_trace_lines
+        self.malformed_reasons.update(other.malformed_reasons)
+
+    def to_dict(self) -> dict:
+        return {
+            "total_lines": self.total_lines,
+            "trace_lines": self.trace_lines,
+            "non_trace_lines": self.non_trace_lines,
+            "malformed_trace_lines": self.malformed_trace_lines,
+            "malformed_reasons": dict(self.malformed_reasons),
+            "malformed_examples": [list(example) for example in self.malformed_examples],
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "LineStats":
+        return cls(
+            total_lines=values["total_lines"],
+            trace_lines=values["trace_lines"],
+            non_trace_lines=values["non_trace_lines"],
+            malformed_trace_lines=values["malformed_trace_lines"],
+            malformed_reasons=Counter(values["malformed_reasons"]),
+            malformed_examples=[tuple(example) for example in values["malformed_examples"]],
+        )
+
+
+def parse_non_negative_int(value: str, base: int = 10) -> int | None:
+    try:
+        parsed = int(value, base)
+    except ValueError:
+        return None
+
+    if parsed < 0:
+        return None
+
+    return parsed
+
+
+def parse_trace_line(line: str) -> tuple[tuple[str, int, int, int, str] | None, str | None]:
+    parts = line.split()
+
+    if not parts:
+        return None, "empty trace line"
+
+    if parts[0] != ">":
+        return None, "missing trace marker"
+
+    if len(parts) == 5:
+        _, pointer_text, size_text, access_type, thread_text = parts
+        source = ""
+    elif len(parts) == 6:
+        _, access_type, pointer_text, size_text, thread_text, source = parts
+    else:
+        return None, f"unexpected field count ({len(parts)})"
+
+    pointer = parse_non_negative_int(pointer_text, 16)
+    if pointer is None:
+        return None, "invalid pointer"
+
+    size = parse_non_negative_int(size_text)
+    if size is None:
+        return None, "invalid size"
+
+    thread = parse_non_negative_int(thread_text)
+    if thread is None:
+        return None, "invalid thread"
+
+    return (access_type, pointer, size, thread, source), None
+
+
+def iter_trace_accesses(lines: Iterable[str], line_stats: LineStats) -> Iterator[tuple[str, int, int, int, str]]:
+    """Yields parsed accesses and records line accounting into `line_stats` once exhausted."""
+    total_lines = 0
+    trace_lines = 0
+    non_trace_lines = 0
+    malformed_trace_lines = 0
+    malformed_reasons = line_stats.malformed_reasons
+    malformed_examples = line_stats.malformed_examples
+
+    try:
+        for line in lines:
+            total_lines += 1
+
+            if not line.startswith(" > "):
+                non_trace_lines += 1
+                continue
+
+            trace_lines += 1
+
+            parsed, error = parse_trace_line(line)
+            if parsed is None:
+                malformed_trace_lines += 1
+                malformed_reasons[error or "unknown parse error"] += 1
+
+                if len(malformed_examples) < MALFORMED_LINE_EXAMPLES_LIMIT:
+                    malformed_examples.append((total_lines, error or "unknown parse error", line.rstrip()))
+
+                continue
+
+            yield parsed
+    finally:
+        line_stats.total_lines += total_lines
+        line_stats.trace_lines += trace_lines
+        line_stats.non_trace_lines += non_trace_lines
+        line_stats.malformed_trace_lines += malformed_trace_lines
+
+
+def _digit_table(digits: str) -> np.ndarray:
+    table = np.full(256, 255, dtype=np.uint8)
+    for value, digit in enumerate(digits):
+        table[ord(digit)] = value
+        table[ord(digit.upper())] = value
+    return table
+
+
+if np is not None:
+    HEX_DIGIT_VALUES = _digit_table("0123456789abcdef")
+    DECIMAL_DIGIT_VALUES = _digit_table("0123456789")
+
+
+def _token_windows(padded: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the last `width` bytes before each token end as rows, with a mask of the bytes inside the token.
+
+    `padded` must start with at least `width` bytes of padding, so every row is in bounds.
+    """
+    rows = sliding_window_view(padded, width)[ends - width]
+    in_token = np.arange(width)[None, :] >= (starts - ends + width)[:, None]
+    return rows, in_token
+
+
+def _parse_block_numbers(padded: np.ndarray, starts: np.ndarray, ends: np.ndarray, base: int, max_digits: int) -> tuple[np.ndarray, np.ndarray]:
+    """Parses tokens [starts, ends) as unsigned numbers, returns (values, ok mask).
+
+    Only plain digit strings are accepted (with an optional 0x prefix for base 16);
+    anything else is left to parse_trace_line, which knows all of int()'s rules.
+    """
+    if base == 16:
+        table = HEX_DIGIT_VALUES
+        prefixed = (ends - starts > 2) & (padded[starts] == ord("0")) & ((padded[starts + 1] | 0x20) == ord("x"))
+        starts = starts + 2 * prefixed
+    else:
+        table = DECIMAL_DIGIT_VALUES
+
+    lengths = ends - starts
+    ok = (lengths >= 1) & (lengths <= max_digits)
+    width = max_digits if base == 16 else int(lengths[ok].max(initial=1))
+
+    rows, in_token = _token_windows(padded, starts, ends, width)
+    digits = table[rows]
+    ok &= ~np.any(in_token & (digits == 255), axis=1)
+    digits = np.where(in_token, digits, 0)
+
+    if base == 16:
+        # Pack the 16 right-aligned nibbles into 8 bytes and read them as a big-endian word.
+        packed = (digits[:, 0::2] << 4) | digits[:, 1::2]
+        return packed.view(">u8").ravel().astype(np.uint64), ok
+
+    values = np.zeros(len(starts), dtype=np.uint64)
+    for column in range(width):
+        values *= np.uint64(10)
+        values += digits[:, column]
+    return values, ok
+
+
+@dataclass
+class TraceBlock:
+    """Accesses parsed from one block, in trace order.
+
+    String fields are stored as ids into the per-block name lists; `sources` is
+    only filled when requested, since interning them costs a string sort.
+    """
+
+    pointers: np.ndarray
+    sizes: np.ndarray
+    threads: np.ndarray
+    access_types: np.ndarray
+    access_type_names: list[str]
+    sources: np.ndarray | None
+    source_names: list[str]
+    lines: LineStats
+
+
+def _intern_tokens(padded: np.ndarray, starts: np.ndarray, ends: np.ndarray, names: dict[str, int]) -> np.ndarray:
+    """Returns name ids for the ASCII tokens [starts, ends), adding new names to `names`."""
+    if not len(starts):
+        return np.zeros(0, dtype=np.int32)
+
+    lengths = ends - starts
+    width = int(lengths.max())
+
+    if width > NUMPY_MAX_TOKEN_WIDTH:
+        return np.array(
+            [names.setdefault(padded[start:end].tobytes().decode("ascii"), len(names)) for start, end in zip(starts.tolist(), ends.tolist())],
+            dtype=np.int32,
+        )
+
+    # Short tokens compare as fixed-width byte strings; the zero fill is dropped by the S dtype.
+    rows = sliding_window_view(padded, width)[starts]
+    token_bytes = np.where(np.arange(width)[None, :] < lengths[:, None], rows, 0)
+    unique_tokens, inverse = np.unique(token_bytes.view(f"S{width}").ravel(), return_inverse=True)
+    ids = np.array([names.setdefault(token.decode("ascii"), len(names)) for token in unique_tokens], dtype=np.int32)
+    return ids[inverse.reshape(-1)]
+
+
+def parse_trace_block(block: bytes, with_sources: bool = False) -> TraceBlock:
+    """Parses a block of whole lines.
+
+    Well-formed ASCII trace lines are tokenized with array operations; every other trace
+    line goes through parse_trace_line, so totals and rejection reasons match the
+    line-by-line loop exactly. Line numbers in the returned stats are block-relative.
+    """
+    line_stats = LineStats()
+    access_type_names: dict[str, int] = {}
+    source_names: dict[str, int] = {}
+
+    if b"\r" in block:
+        # Universal newlines may split these lines differently, use the exact slow path.
+        accesses = list(iter_trace_accesses(io.StringIO(block.decode("utf-8", errors="replace"), newline=None), line_stats))
+        return TraceBlock(
+            pointers=np.array([access[1] for access in accesses], dtype=np.uint64),
+            sizes=np.array([access[2] for access in accesses], dtype=np.uint64),
+            threads=np.array([access[3] for access in accesses], dtype=np.uint64),
+            access_types=np.array([access_type_names.setdefault(access[0], len(access_type_names)) for access in accesses], dtype=np.int32),
+            access_type_names=list(access_type_names),
+            sources=np.array([source_names.setdefault(access[4], len(source_names)) for access in accesses], dtype=np.int32) if with_sources else None,
+            source_names=list(source_names),
+            lines=line_stats,
+        )
+
+    # All offsets below are positions in `padded`: the padding keeps token windows in
+    # bounds, and the zero bytes at the end terminate the last token.
+    padding = NUMPY_BLOCK_PADDING
+    padded = np.concatenate((
+        np.full(padding, ord(" "), dtype=np.uint8),
+        np.frombuffer(block, dtype=np.uint8),
+        np.zeros(padding, dtype=np.uint8),
+    ))
+    data = padded[padding:-padding]
+
+    newlines = np.flatnonzero(data == ord("\n")) + padding
+    line_ends = newlines if block.endswith(b"\n") else np.append(newlines, padding + len(block))
+    line_starts = np.concatenate(([padding], newlines + 1))[:len(line_ends)]
+    line_count = len(line_ends)
+
+    is_trace = (padded[line_starts] == ord(" ")) & (padded[line_starts + 1] == ord(">")) & (padded[line_starts + 2] == ord(" "))
+
+    unusual = np.flatnonzero((data < ord(" ")) | (data > ord("~"))) + padding
+    unusual = unusual[padded[unusual] != ord("\n")]
+    plain_ascii = np.ones(line_count, dtype=bool)
+    plain_ascii[np.searchsorted(line_starts, unusual, side="right") - 1] = False
+
+    # The padding is blank on both sides, so token edges alternate between starts and ends.
+    in_token = padded > ord(" ")
+    token_edges = np.flatnonzero(in_token[1:] != in_token[:-1]) + 1
+    token_starts = token_edges[0::2]
+    token_ends = token_edges[1::2]
+    first_tokens = np.searchsorted(token_starts, line_starts)
+    token_counts = np.searchsorted(token_starts, line_ends) - first_tokens
+
+    candidates = np.flatnonzero(is_trace & plain_ascii & ((token_counts == 5) | (token_counts == 6)))
+    six_fields = token_counts[candidates] == 6
+    candidate_tokens = first_tokens[candidates]
+
+    pointer_tokens = candidate_tokens + np.where(six_fields, 2, 1)
+    size_tokens = candidate_tokens + np.where(six_fields, 3, 2)
+    access_type_tokens = candidate_tokens + np.where(six_fields, 1, 3)
+    thread_tokens = candidate_tokens + 4
+
+    candidate_pointers, pointers_ok = _parse_block_numbers(padded, token_starts[pointer_tokens], token_ends[pointer_tokens], 16, NUMPY_MAX_HEX_DIGITS)
+    candidate_sizes, sizes_ok = _parse_block_numbers(padded, token_starts[size_tokens], token_ends[size_tokens], 10, NUMPY_MAX_DECIMAL_DIGITS)
+    candidate_threads, threads_ok = _parse_block_numbers(padded, token_starts[thread_tokens], token_ends[thread_tokens], 10, NUMPY_MAX_DECIMAL_DIGITS)
+    parsed = pointers_ok & sizes_ok & threads_ok
+
+    pointers = np.zeros(line_count, dtype=np.uint64)
+    sizes = np.zeros(line_count, dtype=np.uint64)
+    threads = np.zeros(line_count, dtype=np.uint64)
+    access_types = np.zeros(line_count, dtype=np.int32)
+    sources = np.zeros(line_count, dtype=np.int32) if with_sources else None
+    valid = np.zeros(line_count, dtype=bool)
+
+    fast_lines = candidates[parsed]
+    pointers[fast_lines] = candidate_pointers[parsed]
+    sizes[fast_lines] = candidate_sizes[parsed]
+    threads[fast_lines] = candidate_threads[parsed]
+    valid[fast_lines] = True
+
+    fast_type_tokens = access_type_tokens[parsed]
+    access_types[fast_lines] = _intern_tokens(padded, token_starts[fast_type_tokens], token_ends[fast_type_tokens], access_type_names)
+
+    if sources is not None:
+        with_source = six_fields[parsed]
+        source_tokens = candidate_tokens[parsed][with_source] + 5
+        sources[fast_lines[with_source]] = _intern_tokens(padded, token_starts[source_tokens], token_ends[source_tokens], source_names)
+        if not with_source.all():
+            sources[fast_lines[~with_source]] = source_names.setdefault("", len(source_names))
+
+    slow_lines = np.flatnonzero(is_trace)
+    slow_lines = slow_lines[~valid[slow_lines]]
+
+    for line_index in slow_lines.tolist():
+        line = block[line_starts[line_index] - padding:line_ends[line_index] - padding].decode("utf-8", errors="replace")
+        access, error = parse_trace_line(line)
+        if access is not None and max(access[1:4]) > NUMPY_MAX_VALUE:
+            # The sequential parser takes any integer, NumPy columns only 64-bit ones
+            access, error = None, "value wider than 64 bits"
+
+        if access is None:
+            line_stats.malformed_trace_lines += 1
+            line_stats.malformed_reasons[error or "unknown parse error"] += 1
+
+            if len(line_stats.malformed_examples) < MALFORMED_LINE_EXAMPLES_LIMIT:
+                line_stats.malformed_examples.append((line_index + 1, error or "unknown parse error", line.rstrip()))
+
+            continue
+
+        access_type, pointer, size, thread, source = access
+
+        pointers[line_index] = pointer
+        sizes[line_index] = size
+        threads[line_index] = thread
+        access_types[line_index] = access_type_names.setdefault(access_type, len(access_type_names))
+        if sources is not None:
+            sources[line_index] = source_names.setdefault(source, len(source_names))
+        valid[line_index] = True
+
+    line_stats.total_lines = line_count
+    line_stats.trace_lines = int(is_trace.sum())
+    line_stats.non_trace_lines = line_count - line_stats.trace_lines
+
+    return TraceBlock(
+        pointers=pointers[valid],
+        sizes=sizes[valid],
+        threads=threads[valid],
+        access_types=access_types[valid],
+        access_type_names=list(access_type_names),
+        sources=sources[valid] if sources is not None else None,
+        source_names=list(source_names),
+        lines=line_stats,
+    )
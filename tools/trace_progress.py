@@ -0,0 +1,202 @@
+"""Progress and throughput reporting shared by the trace analyzers.
+
+While a trace is analyzed, `ProgressReporter` prints one status line to stderr
+per interval: input position and size, lines, lines per second, ETA, the sizes
+of the analyzer's big tables and the process RSS. When the analysis finishes it
+can write a JSON timing summary, so that analyzer throughput can be compared
+between versions.
+
+Scripts with their own argument parser expose `--progress` and `--timing-json`;
+the defaults (and the only knobs of the older positional-argument scripts) come
+from the environment:
+
+- `TRACE_PROGRESS`: seconds between status lines, 0 disables them
+  (default: 10 when stderr is a terminal, 0 otherwise);
+- `TRACE_TIMING_JSON`: file the timing summary is written to, `-` for stderr.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Iterator
+import json
+import os
+import resource
+import sys
+import time
+
+PROGRESS_ENV = "TRACE_PROGRESS"
+TIMING_JSON_ENV = "TRACE_TIMING_JSON"
+TTY_PROGRESS_INTERVAL = 10.0
+POLL_LINES = 1 << 14
+
+
+def default_interval() -> float:
+    value = os.environ.get(PROGRESS_ENV)
+    if value is None:
+        return TTY_PROGRESS_INTERVAL if sys.stderr.isatty() else 0.0
+    return float(value)
+
+
+def default_timing_path() -> str | None:
+    return os.environ.get(TIMING_JSON_ENV) or None
+
+
+def current_rss() -> int | None:
+    """Resident set size in bytes, from /proc (Linux only)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    """Peak resident set size in bytes (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def format_bytes(count: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if count < 1024:
+            return f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TiB"
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+
+
+class ProgressReporter:
+    """Counts processed lines and reports progress; cheap enough to call once per line."""
+
+    def __init__(
+        self,
+        tool: str,
+        path: str,
+        interval: float | None = None,
+        timing_path: str | None = None,
+    ) -> None:
+        self.tool = tool
+        self.path = path
+        self.interval = default_interval() if interval is None else interval
+        self.timing_path = default_timing_path() if timing_path is None else timing_path
+        self.lines = 0
+        self.sizes: Callable[[], dict[str, int]] | None = None
+
+        self._position: Callable[[], int] | None = None
+        self._last_position: int | None = None
+        self._total_bytes: int | None = None
+        self._total_lines: int | None = None
+        self._start = time.monotonic()
+        self._start_cpu = time.process_time()
+        self._next_report = self._start + self.interval
+        self._next_poll = POLL_LINES if self.interval > 0 else float("inf")
+
+    def start_input(self, position: Callable[[], int] | None, total_bytes: int | None = None, total_lines: int | None = None) -> None:
+        """Sets how to read the input position; ETA is derived from bytes, or from lines if only their total is known."""
+        self._position = position
+        self._total_bytes = total_bytes
+        self._total_lines = total_lines
+
+    def end_input(self) -> None:
+        """Remembers the final input position; call before closing the input."""
+        self._read_position()
+        self._position = None
+
+    def advance(self, lines: int = 1, position: int | None = None) -> None:
+        """Counts `lines` more lines; `position` updates the input position if it is not polled."""
+        self.lines += lines
+        if position is not None:
+            self._last_position = position
+        if self.lines >= self._next_poll:
+            self._next_poll = self.lines + POLL_LINES
+            now = time.monotonic()
+            if now >= self._next_report:
+                self._next_report = now + self.interval
+                self.report(now)
+
+    def wrap(self, lines: Iterable[str]) -> Iterator[str]:
+        """Passes `lines` through, counting them; returns `lines` itself when nothing is reported."""
+        if self.interval <= 0 and self.timing_path is None:
+            return iter(lines)
+        return self._counted(lines)
+
+    def _counted(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            self.lines += 1
+            if self.lines >= self._next_poll:
+                self.advance(0)
+            yield line
+
+    def _read_position(self) -> int | None:
+        """Input position, or the last one seen once the input is closed."""
+        if self._position is not None:
+            try:
+                self._last_position = self._position()
+            except (OSError, ValueError):
+                pass
+        return self._last_position
+
+    def _fraction(self, position: int | None) -> float | None:
+        if position is not None and self._total_bytes:
+            return min(position / self._total_bytes, 1.0)
+        if self._total_lines:
+            return min(self.lines / self._total_lines, 1.0)
+        return None
+
+    def report(self, now: float | None = None) -> None:
+        elapsed = (now or time.monotonic()) - self._start
+        position = self._read_position()
+        fraction = self._fraction(position)
+
+        parts = []
+        if position is not None:
+            size = f" / {format_bytes(self._total_bytes)}" if self._total_bytes else ""
+            parts.append(f"{format_bytes(position)}{size}")
+        if fraction is not None:
+            parts.append(f"{100 * fraction:.1f}%")
+        parts.append(f"{self.lines:,} lines")
+        parts.append(f"{self.lines / elapsed if elapsed else 0:,.0f} lines/s")
+        if fraction:
+            parts.append("ETA " + format_duration(elapsed * (1 - fraction) / fraction))
+        if self.sizes is not None:
+            parts.extend(f"{name} {size:,}" for name, size in self.sizes().items())
+        rss = current_rss()
+        if rss is not None:
+            parts.append("RSS " + format_bytes(rss))
+
+        print(f"[{self.tool}] {format_duration(elapsed)} " + ", ".join(parts), file=sys.stderr, flush=True)
+
+    def finish(self) -> None:
+        """Prints a last status line (if reporting) and writes the timing summary (if requested)."""
+        if self.interval > 0:
+            self.report()
+
+        if self.timing_path is None:
+            return
+
+        wall_seconds = time.monotonic() - self._start
+        bytes_read = self._read_position()
+        summary = {
+            "tool": self.tool,
+            "input": self.path,
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(time.process_time() - self._start_cpu, 3),
+            "lines": self.lines,
+            "bytes": bytes_read,
+            "lines_per_second": round(self.lines / wall_seconds) if wall_seconds else None,
+            "bytes_per_second": round(bytes_read / wall_seconds) if wall_seconds and bytes_read is not None else None,
+            "peak_rss_bytes": peak_rss(),
+            "sizes": self.sizes() if self.sizes is not None else {},
+        }
+
+        if self.timing_path == "-":
+            print(json.dumps(summary), file=sys.stderr)
+            return
+
+        with open(self.timing_path, "w", encoding="utf-8") as timing_file:
+            json.dump(summary, timing_file, indent=2)
+            timing_file.write("\n")
@@ -0,0 +1,195 @@
+"""Fixed-memory sketches for approximate trace statistics (NumPy only).
+
+Every sketch is updated with whole blocks of 64-bit keys, which are first run
+through `hash64` (the splitmix64 finalizer), and reports an error bound next
+to its estimate:
+
+- `HyperLogLog` counts distinct keys; the relative standard error is 1.04 / sqrt(registers).
+- `CountMinSketch` counts occurrences per key; an estimate never undercounts and
+  overcounts by at most e / width * total with probability 1 - e^-depth.
+- `HeavyHitters` keeps the keys with the largest Count-Min estimates.
+- `AddressSample` keeps exact thread states for a hash-selected subset of addresses,
+  shrinking the subset whenever it exceeds its capacity, and scales the sharing
+  counts back up (Horvitz-Thompson estimates with their standard errors).
+"""
+
+from __future__ import annotations
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HLL_PRECISION = 14
+COUNT_MIN_WIDTH = 1 << 16
+COUNT_MIN_DEPTH = 4
+HEAVY_HITTERS = 20
+ADDRESS_SAMPLE_CAPACITY = 1 << 18
+MULTI_THREAD = -1
+
+
+def hash64(keys: np.ndarray, seed: int = 0) -> np.ndarray:
+    """splitmix64 finalizer over uint64 keys (wrapping arithmetic)."""
+    hashes = keys.astype(np.uint64) + np.uint64((0x9E3779B97F4A7C15 * (seed + 1)) & 0xFFFFFFFFFFFFFFFF)
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Bit length of uint64 values; each 32-bit half converts to float64 exactly."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    high_bits = np.frexp(high)[1]
+    low_bits = np.frexp(low)[1]
+    return np.where(high_bits > 0, high_bits + 32, low_bits)
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = HLL_PRECISION) -> None:
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+
+        shift = np.uint64(64 - self.precision)
+        indices = (hashes >> shift).astype(np.intp)
+        # Rank of the first set bit in the remaining bits, which are capped by a sentinel bit.
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        ranks = (65 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, indices, ranks)
+
+    def estimate(self) -> float:
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        raw = alpha * registers * registers / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * registers and empty:
+            return registers * math.log(registers / empty)
+        return raw
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class CountMinSketch:
+    def __init__(self, width: int = COUNT_MIN_WIDTH, depth: int = COUNT_MIN_DEPTH) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes: np.ndarray, row: int) -> np.ndarray:
+        return (hash64(hashes, row) & np.uint64(self.width - 1)).astype(np.intp)
+
+    def add(self, hashes: np.ndarray, counts: np.ndarray) -> None:
+        for row in range(self.depth):
+            self.table[row] += np.bincount(self._columns(hashes, row), weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def query(self, hashes: np.ndarray) -> np.ndarray:
+        estimates = self.table[0, self._columns(hashes, 0)]
+        for row in range(1, self.depth):
+            estimates = np.minimum(estimates, self.table[row, self._columns(hashes, row)])
+        return estimates
+
+    @property
+    def error_bound(self) -> int:
+        """Maximum overcount, holding with probability `confidence`."""
+        return math.ceil(math.e / self.width * self.total)
+
+    @property
+    def confidence(self) -> float:
+        return 1 - math.exp(-self.depth)
+
+
+class HeavyHitters:
+    """The `count` keys with the largest Count-Min estimates seen so far."""
+
+    def __init__(self, count: int = HEAVY_HITTERS, sketch: CountMinSketch | None = None) -> None:
+        self.count = count
+        self.sketch = sketch or CountMinSketch()
+        self.keys = np.zeros(0, dtype=np.uint64)
+
+    def add(self, keys: np.ndarray) -> None:
+        """Counts a block of uint64 keys."""
+        if not len(keys):
+            return
+
+        keys, counts = np.unique(keys, return_counts=True)
+        self.sketch.add(hash64(keys), counts)
+
+        candidates = np.union1d(self.keys, keys)
+        estimates = self.sketch.query(hash64(candidates))
+        if len(candidates) > self.count:
+            top = np.argpartition(-estimates, self.count - 1)[:self.count]
+            candidates = candidates[top]
+        self.keys = candidates
+
+    def top(self) -> list[tuple[int, int]]:
+        """(key, estimated count) pairs, largest first."""
+        estimates = self.sketch.query(hash64(self.keys))
+        order = np.argsort(-estimates, kind="stable")
+        return list(zip(self.keys[order].tolist(), estimates[order].tolist()))
+
+
+class AddressSample:
+    """Exact thread states for addresses whose hash falls below a shrinking threshold."""
+
+    def __init__(self, capacity: int = ADDRESS_SAMPLE_CAPACITY) -> None:
+        self.capacity = capacity
+        self.threshold = 1 << 64
+        self.states: dict[int, int] = {}
+        self.multi_accesses: dict[int, int] = {}
+
+    @property
+    def rate(self) -> float:
+        return self.threshold / (1 << 64)
+
+    def add(self, pointers: np.ndarray, hashes: np.ndarray, threads: np.ndarray) -> None:
+        if self.threshold < 1 << 64:
+            selected = hashes < np.uint64(self.threshold)
+            pointers = pointers[selected]
+            threads = threads[selected]
+
+        states = self.states
+        multi_accesses = self.multi_accesses
+
+        # Same accounting as update_thread_state in trace-analyze2.py.
+        for pointer, thread in zip(pointers.tolist(), threads.tolist()):
+            state = states.get(pointer)
+            if state is None:
+                states[pointer] = thread
+            elif state == MULTI_THREAD:
+                multi_accesses[pointer] += 1
+            elif state != thread:
+                states[pointer] = MULTI_THREAD
+                multi_accesses[pointer] = 2
+
+        while len(states) > self.capacity:
+            self._shrink()
+
+    def _shrink(self) -> None:
+        self.threshold //= 2
+        pointers = np.fromiter(self.states, dtype=np.uint64, count=len(self.states))
+        dropped = pointers[hash64(pointers) >= np.uint64(self.threshold)]
+        for pointer in dropped.tolist():
+            del self.states[pointer]
+            self.multi_accesses.pop(pointer, None)
+
+    def shared_addresses(self) -> tuple[float, float]:
+        """(estimate, standard error) of addresses accessed by more than one thread."""
+        sampled = len(self.multi_accesses)
+        return sampled / self.rate, math.sqrt((1 - self.rate) * sampled) / self.rate
+
+    def multi_accesses_estimate(self) -> tuple[float, float]:
+        """(estimate, standard error) of multi-threaded accesses."""
+        counts = self.multi_accesses.values()
+        variance = (1 - self.rate) * sum(count * count for count in counts)
+        return sum(counts) / self.rate, math.sqrt(variance) / self.rate
@@ -0,0 +1,112 @@
+"""Per-source-location counters for TSan access traces.
+
+Source strings (`file:line:col` of the instrumented access) repeat millions of
+times in a trace, so they are interned once to small integer ids and every
+counter is an `array('Q')` indexed by that id.
+
+The sources that touched an address are a `SourceSets` entry: the only source
+id inline in an `array('i')`, or a sorted `array('I')` once there are several.
+Most addresses are accessed from a single source, so that is 4 bytes per
+address next to its record number in an `AddressIndex`.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+
+from trace_addresses import AddressIndex, AddressStateTable
+
+NO_SOURCE = -1
+MANY_SOURCES = -2
+
+
+class SourceSets:
+    """A set of source ids per record number."""
+
+    def __init__(self) -> None:
+        self.inline = array("i")
+        # record -> sorted source ids, for records with more than one source
+        self.extra: dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.inline)
+
+    def append(self) -> None:
+        """Adds an empty set for the next record."""
+        self.inline.append(NO_SOURCE)
+
+    def add(self, record: int, source_id: int) -> bool:
+        """Adds `source_id` to the set of `record`; True if it was not in it yet."""
+        current = self.inline[record]
+        if current == source_id:
+            return False
+
+        if current == NO_SOURCE:
+            self.inline[record] = source_id
+        elif current != MANY_SOURCES:
+            self.inline[record] = MANY_SOURCES
+            self.extra[record] = array("I", sorted((current, source_id)))
+        else:
+            ids = self.extra[record]
+            position = bisect_left(ids, source_id)
+            if position < len(ids) and ids[position] == source_id:
+                return False
+            ids.insert(position, source_id)
+        return True
+
+    def ids(self, record: int) -> list[int]:
+        """Source ids of `record`, sorted."""
+        current = self.inline[record]
+        if current == NO_SOURCE:
+            return []
+        if current != MANY_SOURCES:
+            return [current]
+        return list(self.extra[record])
+
+
+class SourceStats:
+    def __init__(self, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.accesses = array("Q")
+        self.multi_accesses = array("Q")
+        self.addresses = array("Q")
+        # Distinct addresses per source: the sources that touched each address so far
+        self._address_records = AddressIndex(address_table)
+        self._address_sources = SourceSets()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, source: str) -> int:
+        source_id = self.ids.get(source)
+        if source_id is None:
+            source_id = len(self.names)
+            self.ids[source] = source_id
+            self.names.append(source)
+            self.accesses.append(0)
+            self.multi_accesses.append(0)
+            self.addresses.append(0)
+        return source_id
+
+    def update(self, source: str, pointer: int, shared: bool) -> None:
+        """Counts one access; `shared` means the address is multi-threaded as of this access."""
+        source_id = self.ids.get(source)
+        if source_id is None:
+            source_id = self.intern(source)
+
+        self.accesses[source_id] += 1
+        if shared:
+            self.multi_accesses[source_id] += 1
+
+        record = self._address_records.get(pointer)
+        if record is None:
+            record = self._address_records.add(pointer)
+            self._address_sources.append()
+        if self._address_sources.add(record, source_id):
+            self.addresses[source_id] += 1
+
+    def top(self, count: int) -> list[int]:
+        """Ids of the `count` sources with the most multi-threaded accesses."""
+        return sorted(range(len(self.names)), key=lambda source_id: (-self.multi_accesses[source_id], -self.accesses[source_id], self.names[source_id]))[:count]
@@ -0,0 +1,221 @@
+"""Single-writer/multi-reader (SWMR) addresses of a TSan access trace.
+
+An address is SWMR if all its writes come from one thread and at least one
+other thread reads it. Reads of such an address by the writer thread itself
+cannot race (no other thread writes it), so they are the `__tsan_read*` calls
+a perfect SWMR optimization (the `tsan-swmr` config) could skip; all reads of
+SWMR addresses are the upper bound.
+
+A read can precede the first write, when the writer is not known yet: reads
+are then counted per reader thread until the first write decides which of them
+were the writer's. `trace-analyze-get-stats.py` instead flags addresses that
+are never written after a read, regardless of threads.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+import csv
+
+from trace_addresses import AddressIndex, AddressStateTable
+from trace_sources import MANY_SOURCES, SourceSets
+
+NO_THREAD = -2
+MULTI_THREAD = -1
+
+
+class SwmrDetector:
+    """SWMR state per address, in flat arrays indexed by the record number of an `AddressIndex`:
+
+    - writers: NO_THREAD, the only writing thread, or MULTI_THREAD;
+    - readers: NO_THREAD, the only reading thread, or MULTI_THREAD;
+    - reads, writes, writer_reads (reads by the writer thread, once the writer is known);
+    - sources: `SourceSets` of the sources accessing the address.
+
+    Reads and writes per source of an address with a single source are its totals; the few
+    addresses with several sources get `array('Q')` counts (reads, writes per source id, in
+    the order of their sorted ids) in `_source_counts`, and addresses read by two threads
+    before their first write get per-thread read counts in `_early_reads` until then.
+    36 bytes per address, next to its record number in the index.
+    """
+
+    def __init__(self, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        self.index = AddressIndex(address_table)
+        self.writers = array("i")
+        self.readers = array("i")
+        self.reads = array("Q")
+        self.writes = array("Q")
+        self.writer_reads = array("Q")
+        self.sources_of = SourceSets()
+        self.source_ids: dict[str, int] = {}
+        self.source_names: list[str] = []
+        # record -> (reads, writes) of every source, for records with more than one source
+        self._source_counts: dict[int, array] = {}
+        # record -> {thread: reads} before the first write, once two threads read
+        self._early_reads: dict[int, dict[int, int]] = {}
+        self.reads_total = 0
+        self.writes_total = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def update(self, access_type: str, pointer: int, thread_id: int, source: str) -> None:
+        record = self.index.get(pointer)
+        if record is None:
+            record = self.index.add(pointer)
+            self.writers.append(NO_THREAD)
+            self.readers.append(NO_THREAD)
+            self.reads.append(0)
+            self.writes.append(0)
+            self.writer_reads.append(0)
+            self.sources_of.append()
+
+        source_id = self.source_ids.get(source)
+        if source_id is None:
+            source_id = self.source_ids[source] = len(self.source_names)
+            self.source_names.append(source)
+
+        is_read = "read" in access_type
+        is_write = "write" in access_type
+        self.sources_of.add(record, source_id)
+        if self.sources_of.inline[record] == MANY_SOURCES:
+            self._count_source(record, source_id, is_read, is_write)
+
+        if is_read:
+            self.reads_total += 1
+            self._read(record, thread_id)
+
+        if is_write:
+            self.writes_total += 1
+            self._write(record, thread_id)
+
+    def _count_source(self, record: int, source_id: int, is_read: bool, is_write: bool) -> None:
+        """Counts an access of a record with several sources, before its totals include it."""
+        ids = self.sources_of.extra[record]
+        position = bisect_left(ids, source_id)
+        counts = self._source_counts.get(record)
+        if counts is None:
+            # Second source: every access so far came from the other one
+            counts = self._source_counts[record] = array("Q", (0, 0, 0, 0))
+            counts[2 - 2 * position] = self.reads[record]
+            counts[3 - 2 * position] = self.writes[record]
+        elif len(counts) < 2 * len(ids):
+            counts[2 * position:2 * position] = array("Q", (0, 0))
+
+        if is_read:
+            counts[2 * position] += 1
+        if is_write:
+            counts[2 * position + 1] += 1
+
+    def _read(self, record: int, thread_id: int) -> None:
+        writer = self.writers[record]
+        readers = self.readers[record]
+
+        if writer == NO_THREAD:
+            if readers == NO_THREAD:
+                self.readers[record] = thread_id
+            elif readers != thread_id and readers != MULTI_THREAD:
+                # Every read so far came from the first reader.
+                self._early_reads[record] = {readers: self.reads[record]}
+                self.readers[record] = MULTI_THREAD
+
+            early_reads = self._early_reads.get(record)
+            if early_reads is not None:
+                early_reads[thread_id] = early_reads.get(thread_id, 0) + 1
+        else:
+            if readers == NO_THREAD:
+                self.readers[record] = thread_id
+            elif readers != thread_id:
+                self.readers[record] = MULTI_THREAD
+
+            if writer == thread_id:
+                self.writer_reads[record] += 1
+
+        self.reads[record] += 1
+
+    def _write(self, record: int, thread_id: int) -> None:
+        writer = self.writers[record]
+        self.writes[record] += 1
+
+        if writer == NO_THREAD:
+            self.writers[record] = thread_id
+            early_reads = self._early_reads.pop(record, None)
+            if early_reads is not None:
+                self.writer_reads[record] = early_reads.get(thread_id, 0)
+            elif self.readers[record] == thread_id:
+                self.writer_reads[record] = self.reads[record]
+        elif writer != thread_id:
+            self.writers[record] = MULTI_THREAD
+
+    def is_swmr(self, record: int) -> bool:
+        writer = self.writers[record]
+        readers = self.readers[record]
+        return writer >= 0 and readers != NO_THREAD and readers != writer
+
+    def swmr_addresses(self) -> Iterator[tuple[int, int]]:
+        """(address, record) of the SWMR addresses."""
+        return ((pointer, record) for pointer, record in self.index.table.items() if self.is_swmr(record))
+
+    def summary(self) -> dict:
+        swmr = 0
+        swmr_reads = 0
+        swmr_writer_reads = 0
+        swmr_writes = 0
+        read_only_shared = 0
+        read_only_shared_reads = 0
+
+        for record in range(len(self.index)):
+            if self.is_swmr(record):
+                swmr += 1
+                swmr_reads += self.reads[record]
+                swmr_writer_reads += self.writer_reads[record]
+                swmr_writes += self.writes[record]
+            elif self.writers[record] == NO_THREAD and self.readers[record] == MULTI_THREAD:
+                read_only_shared += 1
+                read_only_shared_reads += self.reads[record]
+
+        return {
+            "addresses": swmr,
+            "reads": swmr_reads,
+            "writer_reads": swmr_writer_reads,
+            "writes": swmr_writes,
+            "reads_total": self.reads_total,
+            "writes_total": self.writes_total,
+            "read_only_shared_addresses": read_only_shared,
+            "read_only_shared_reads": read_only_shared_reads,
+        }
+
+    def sources(self) -> list[tuple[str, int, int, int]]:
+        """(source, SWMR addresses, reads, writes) per source location, by accesses to SWMR addresses."""
+        per_source: dict[int, list[int]] = {}
+
+        for record in range(len(self.index)):
+            if not self.is_swmr(record):
+                continue
+
+            source_counts = self._source_counts.get(record)
+            if source_counts is None:
+                address_counts = [(self.sources_of.ids(record)[0], self.reads[record], self.writes[record])]
+            else:
+                ids = self.sources_of.ids(record)
+                address_counts = [(source_id, source_counts[2 * position], source_counts[2 * position + 1]) for position, source_id in enumerate(ids)]
+
+            for source_id, reads, writes in address_counts:
+                counts = per_source.get(source_id)
+                if counts is None:
+                    counts = per_source[source_id] = [0, 0, 0]
+                counts[0] += 1
+                counts[1] += reads
+                counts[2] += writes
+
+        rows = [(self.source_names[source_id], *counts) for source_id, counts in per_source.items()]
+        rows.sort(key=lambda row: (-(row[2] + row[3]), row[0]))
+        return rows
+
+    def write_sources(self, path: str) -> None:
+        with open(path, "w", newline="", encoding="utf-8") as output:
+            writer = csv.writer(output)
+            writer.writerow(("source", "swmr_addresses", "reads", "writes"))
+            writer.writerows(self.sources())
@@ -0,0 +1,220 @@
+"""Batch symbolization of the raw PCs in trace sources.
+
+All PCs of a report are resolved at once by a single `llvm-symbolizer` (or
+`addr2line`) process: a thread feeds it the addresses while the answers are
+read back, so the pipes never fill up and output buffering does not matter.
+Results go to an on-disk cache with one file per binary, named by its GNU
+build-id (or, for binaries without one, the SHA-256 of the file), so a binary
+that was rebuilt never hits stale entries and a later report against the same
+binary starts no process at all.
+
+A resolved PC becomes `function@file:line:col`, the form `trace_locations`
+parses; PCs the tool cannot resolve are cached as such and left alone.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import subprocess
+import threading
+
+NT_GNU_BUILD_ID = 3
+PT_NOTE = 4
+SHT_NOTE = 7
+UNKNOWN = "??"
+
+
+def _read_at(binary, offset: int, size: int) -> bytes:
+    binary.seek(offset)
+    return binary.read(size)
+
+
+def read_build_id(path: str) -> str | None:
+    """GNU build-id of an ELF file as hex, from its note sections (or segments).
+
+    Only the ELF header, the section (or program) headers and the notes are read, not the whole binary.
+    """
+    with open(path, "rb") as binary:
+        ident = binary.read(0x40)
+        if len(ident) < 0x34 or ident[:4] != b"\x7fELF":
+            return None
+
+        is_64 = ident[4] == 2
+        endian = "<" if ident[5] == 1 else ">"
+
+        if is_64:
+            phoff, shoff = struct.unpack_from(endian + "QQ", ident, 0x20)
+            phentsize, phnum, shentsize, shnum = struct.unpack_from(endian + "HHHH", ident, 0x36)
+        else:
+            phoff, shoff = struct.unpack_from(endian + "II", ident, 0x1C)
+            phentsize, phnum, shentsize, shnum = struct.unpack_from(endian + "HHHH", ident, 0x2A)
+
+        notes = []
+        headers = _read_at(binary, shoff, shnum * shentsize) if shoff else b""
+        for index in range(len(headers) // shentsize if shentsize else 0):
+            header = index * shentsize
+            if is_64:
+                section_type, = struct.unpack_from(endian + "I", headers, header + 4)
+                offset, size = struct.unpack_from(endian + "QQ", headers, header + 0x18)
+            else:
+                section_type, = struct.unpack_from(endian + "I", headers, header + 4)
+                offset, size = struct.unpack_from(endian + "II", headers, header + 0x10)
+            if section_type == SHT_NOTE:
+                notes.append((offset, size))
+
+        if not notes:
+            # Stripped section headers: the notes are still mapped by PT_NOTE segments.
+            headers = _read_at(binary, phoff, phnum * phentsize) if phoff else b""
+            for index in range(len(headers) // phentsize if phentsize else 0):
+                header = index * phentsize
+                segment_type, = struct.unpack_from(endian + "I", headers, header)
+                if segment_type != PT_NOTE:
+                    continue
+                if is_64:
+                    offset, = struct.unpack_from(endian + "Q", headers, header + 8)
+                    size, = struct.unpack_from(endian + "Q", headers, header + 0x20)
+                else:
+                    offset, = struct.unpack_from(endian + "I", headers, header + 4)
+                    size, = struct.unpack_from(endian + "I", headers, header + 0x10)
+                notes.append((offset, size))
+
+        for offset, size in notes:
+            data = _read_at(binary, offset, size)
+            position = 0
+            while position + 12 <= len(data):
+                name_size, descriptor_size, note_type = struct.unpack_from(endian + "III", data, position)
+                name_start = position + 12
+                descriptor_start = name_start + (name_size + 3) // 4 * 4
+                name = data[name_start:name_start + name_size].rstrip(b"\0")
+                if note_type == NT_GNU_BUILD_ID and name == b"GNU":
+                    return data[descriptor_start:descriptor_start + descriptor_size].hex()
+                position = descriptor_start + (descriptor_size + 3) // 4 * 4
+
+    return None
+
+
+def binary_id(path: str) -> str:
+    """Cache name of a binary: its build-id, or the SHA-256 of its contents."""
+    build_id = read_build_id(path)
+    if build_id:
+        return build_id
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as binary:
+        for block in iter(lambda: binary.read(1 << 20), b""):
+            digest.update(block)
+    return "sha256-" + digest.hexdigest()
+
+
+def format_location(function: str, location: str) -> str | None:
+    """`function@file:line:col` from the two lines a symbolizer prints per frame, None if unknown."""
+    # addr2line appends " (discriminator N)"
+    location = location.split(" (", 1)[0]
+    file, _, position = location.partition(":")
+    if file in ("", UNKNOWN):
+        return None
+
+    # line:col, dropping a zero column (addr2line has none) and a zero line
+    numbers = [number for number in position.split(":") if number.isdigit()]
+    while numbers and numbers[-1] == "0":
+        numbers.pop()
+    text = ":".join([file, *numbers])
+
+    if function in ("", UNKNOWN):
+        return text
+    # Sources are whitespace-separated fields in every report
+    function = "_".join(function.replace(", ", ",").split())
+    return f"{function}@{text}"
+
+
+def _tool_command(tool: str, binary: str) -> list[str]:
+    if os.path.basename(tool).startswith("addr2line"):
+        return [tool, "--functions", "--demangle", "--exe", binary]
+    # Short names: the parameter lists of demangled names do not help and contain spaces
+    return [tool, "--obj", binary, "--functions=short", "--demangle", "--no-inlines"]
+
+
+def run_symbolizer(tool: str, binary: str, pcs: list[int]) -> dict[int, str | None]:
+    """Resolves `pcs` (file offsets into `binary`) with one `tool` process."""
+    command = _tool_command(tool, binary)
+    is_addr2line = "--exe" in command
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1 << 16)
+    except FileNotFoundError:
+        raise RuntimeError(f"'{tool}' not found, install llvm or binutils or pass another --symbolizer") from None
+
+    def feed() -> None:
+        try:
+            for start in range(0, len(pcs), 4096):
+                process.stdin.write("".join(f"{pc:#x}\n" for pc in pcs[start:start + 4096]))
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    results: dict[int, str | None] = {}
+    output = process.stdout
+    for pc in pcs:
+        function = output.readline().rstrip("\n")
+        location = output.readline().rstrip("\n")
+        if not is_addr2line:
+            # llvm-symbolizer ends every answer with an empty line
+            output.readline()
+        if not location:
+            break
+        results[pc] = format_location(function, location)
+
+    feeder.join()
+    output.close()
+    if process.wait() != 0 or len(results) != len(pcs):
+        raise RuntimeError(f"{tool} failed after {len(results)} of {len(pcs)} addresses of {binary}")
+    return results
+
+
+class SymbolCache:
+    """PC -> location of one binary, kept in `<cache_dir>/<binary id>.tsv` (`pc<TAB>location`, `-` if unknown)."""
+
+    def __init__(self, cache_dir: str, binary: str) -> None:
+        self.path = os.path.join(cache_dir, binary_id(binary) + ".tsv")
+        self.locations: dict[int, str | None] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as cache:
+                for line in cache:
+                    pc, _, location = line.rstrip("\n").partition("\t")
+                    self.locations[int(pc, 16)] = None if location == "-" else location
+
+    def add(self, locations: dict[int, str | None]) -> None:
+        """Stores new entries; appended in one write, so concurrent runs at worst store an entry twice."""
+        if not locations:
+            return
+
+        self.locations.update(locations)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        text = "".join(f"{pc:x}\t{location or '-'}\n" for pc, location in locations.items())
+        with open(self.path, "a", encoding="utf-8") as cache:
+            cache.write(text)
+
+
+def symbolize(
+    pcs: set[int],
+    binary: str,
+    tool: str = "llvm-symbolizer",
+    cache_dir: str | None = None,
+) -> tuple[dict[int, str | None], int]:
+    """(location of every PC, number of PCs that were not cached) for file offsets into `binary`."""
+    cache = SymbolCache(cache_dir, binary) if cache_dir is not None else None
+    known = cache.locations if cache is not None else {}
+
+    missing = sorted(pc for pc in pcs if pc not in known)
+    resolved = run_symbolizer(tool, binary, missing) if missing else {}
+    if cache is not None:
+        cache.add(resolved)
+
+    locations = {pc: known[pc] for pc in pcs if pc in known}
+    locations.update(resolved)
+    return locations, len(missing)
@@ -0,0 +1,181 @@
+"""Accesses to thread-local addresses of a TSan access trace, per source.
+
+An address only ever accessed by one thread cannot race, so every access to it
+is one a perfect escape analysis (`-tsan-use-escape-analysis-global`, the
+`tsan-ea` config) could leave uninstrumented. The counts are split by source
+location and by kind, i.e. access type and size, which names the `__tsan_*`
+callback (`read` of 4 bytes: `__tsan_read4`) so that they can be compared with
+the static call-site counts of `static_count_tsan_instrumentation.py`.
+
+Whether an address stays thread-local is only known at the end. Until then
+accesses are counted per (address, bucket), a bucket being a (source, kind)
+pair, in arrays indexed by the record number of an `AddressIndex`: the only
+bucket of an address and its count inline, or sorted bucket ids with their
+counts for the few addresses accessed from several buckets. The counts of an
+address are dropped as soon as it becomes multi-threaded.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+import csv
+
+from trace_addresses import AddressIndex, AddressStateTable
+
+NO_BUCKET = -1
+MANY_BUCKETS = -2
+SHARED = -3
+
+
+def tsan_function(access_type: str, size: int) -> str:
+    """Name of the TSan callback for an access, e.g. `__tsan_read4`."""
+    return f"__tsan_{access_type.replace(' ', '_')}{size}"
+
+
+class ThreadLocalStats:
+    def __init__(self, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        self.source_ids: dict[str, int] = {}
+        self.source_names: list[str] = []
+        self.kind_ids: dict[tuple[str, int], int] = {}
+        self.kinds: list[tuple[str, int]] = []
+        self.bucket_ids: dict[int, int] = {}
+        # bucket id -> (source id, kind id)
+        self.buckets: list[tuple[int, int]] = []
+        self.accesses = array("Q")
+        self.local_accesses = array("Q")
+        # Accesses while an address was single-threaded, per address record: its only bucket
+        # (NO_BUCKET, MANY_BUCKETS, or SHARED once multi-threaded) and the number of accesses
+        self._address_records = AddressIndex(address_table)
+        self._address_buckets = array("i")
+        self._address_counts = array("Q")
+        # record -> (sorted bucket ids, their counts), for records with several buckets
+        self._extra_buckets: dict[int, tuple[array, array]] = {}
+
+    def update(self, access_type: str, pointer: int, size: int, source: str, shared: bool) -> None:
+        """Counts one access; `shared` means the address is multi-threaded as of this access."""
+        source_id = self.source_ids.get(source)
+        if source_id is None:
+            source_id = self.source_ids[source] = len(self.source_names)
+            self.source_names.append(source)
+
+        kind = (access_type, size)
+        kind_id = self.kind_ids.get(kind)
+        if kind_id is None:
+            kind_id = self.kind_ids[kind] = len(self.kinds)
+            self.kinds.append(kind)
+
+        bucket = source_id << 32 | kind_id
+        bucket_id = self.bucket_ids.get(bucket)
+        if bucket_id is None:
+            bucket_id = self.bucket_ids[bucket] = len(self.buckets)
+            self.buckets.append((source_id, kind_id))
+            self.accesses.append(0)
+            self.local_accesses.append(0)
+
+        self.accesses[bucket_id] += 1
+
+        record = self._address_records.get(pointer)
+        if shared:
+            # None cannot happen: the first access to an address is never shared
+            if record is not None and self._address_buckets[record] != SHARED:
+                self._address_buckets[record] = SHARED
+                self._address_counts[record] = 0
+                self._extra_buckets.pop(record, None)
+            return
+
+        if record is None:
+            record = self._address_records.add(pointer)
+            self._address_buckets.append(NO_BUCKET)
+            self._address_counts.append(0)
+
+        current = self._address_buckets[record]
+        if current == bucket_id or current == NO_BUCKET:
+            self._address_buckets[record] = bucket_id
+            self._address_counts[record] += 1
+        elif current == MANY_BUCKETS:
+            ids, counts = self._extra_buckets[record]
+            position = bisect_left(ids, bucket_id)
+            if position == len(ids) or ids[position] != bucket_id:
+                ids.insert(position, bucket_id)
+                counts.insert(position, 0)
+            counts[position] += 1
+        elif current != SHARED:
+            self._address_buckets[record] = MANY_BUCKETS
+            pairs = sorted(((current, self._address_counts[record]), (bucket_id, 1)))
+            self._extra_buckets[record] = (array("I", [pair[0] for pair in pairs]), array("Q", [pair[1] for pair in pairs]))
+
+    def resolve(self) -> None:
+        """Credits the accesses of every address that stayed single-threaded; call once the trace is done."""
+        local_accesses = self.local_accesses
+        for record, bucket_id in enumerate(self._address_buckets):
+            if bucket_id >= 0:
+                local_accesses[bucket_id] += self._address_counts[record]
+            elif bucket_id == MANY_BUCKETS:
+                for extra_bucket_id, count in zip(*self._extra_buckets[record]):
+                    local_accesses[extra_bucket_id] += count
+
+        self._address_records = AddressIndex()
+        self._address_buckets = array("i")
+        self._address_counts = array("Q")
+        self._extra_buckets = {}
+
+    def _totals(self, index: int) -> dict[int, list[int]]:
+        """[accesses, thread-local accesses] per source (index 0) or kind (index 1) id."""
+        totals: dict[int, list[int]] = {}
+        for bucket_id, bucket in enumerate(self.buckets):
+            counts = totals.get(bucket[index])
+            if counts is None:
+                counts = totals[bucket[index]] = [0, 0]
+            counts[0] += self.accesses[bucket_id]
+            counts[1] += self.local_accesses[bucket_id]
+        return totals
+
+    def sources(self) -> list[tuple[str, int, int]]:
+        """(source, accesses, thread-local accesses), by thread-local accesses."""
+        rows = [(self.source_names[source_id], *counts) for source_id, counts in self._totals(0).items()]
+        rows.sort(key=lambda row: (-row[2], -row[1], row[0]))
+        return rows
+
+    def kinds_summary(self) -> list[tuple[str, int, int, int]]:
+        """(access type, size, accesses, thread-local accesses), by thread-local accesses."""
+        rows = [(*self.kinds[kind_id], *counts) for kind_id, counts in self._totals(1).items()]
+        rows.sort(key=lambda row: (-row[3], -row[2], row[0], row[1]))
+        return rows
+
+    def summary(self) -> dict:
+        return {
+            "accesses": sum(self.accesses),
+            "thread_local_accesses": sum(self.local_accesses),
+            "sources": len(self.source_names),
+            "kinds": [
+                {
+                    "access_type": access_type,
+                    "size": size,
+                    "tsan_function": tsan_function(access_type, size),
+                    "accesses": accesses,
+                    "thread_local_accesses": local_accesses,
+                }
+                for access_type, size, accesses, local_accesses in self.kinds_summary()
+            ],
+        }
+
+    def write(self, path: str) -> None:
+        """Writes one CSV row per (source, access type, size), by thread-local accesses."""
+        rows = []
+        for bucket_id, (source_id, kind_id) in enumerate(self.buckets):
+            access_type, size = self.kinds[kind_id]
+            rows.append((
+                self.source_names[source_id],
+                access_type,
+                size,
+                tsan_function(access_type, size),
+                self.accesses[bucket_id],
+                self.local_accesses[bucket_id],
+            ))
+        rows.sort(key=lambda row: (-row[5], -row[4], row[0], row[1], row[2]))
+
+        with open(path, "w", newline="", encoding="utf-8") as output:
+            writer = csv.writer(output)
+            writer.writerow(("source", "access_type", "size", "tsan_function", "accesses", "thread_local_accesses"))
+            writer.writerows(rows)
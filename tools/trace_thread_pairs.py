@@ -0,0 +1,195 @@
+"""Which threads share which addresses in a TSan access trace.
+
+`ThreadPairs` remembers, for every address accessed by more than one thread,
+the threads that accessed it and how often: the record number of the address
+in an `AddressIndex` indexes array columns of its first two threads and their
+access counts, and the rare addresses with three or more threads have the id
+of a further thread set, with its threads and counts in arrays. At the end, every such address is
+credited to all pairs of its threads, giving two T x T matrices over the
+sequential thread ids of trace-analyze2.py:
+
+- shared addresses: `[a, b]` counts the addresses both `a` and `b` accessed
+  (the diagonal: the shared addresses a thread accessed at all);
+- shared accesses: `[a, b]` counts the accesses of `a` to addresses that `b`
+  accessed as well (the diagonal: all accesses of `a` to shared addresses).
+
+A clique in the matrices means all-to-all sharing, a band next to the diagonal
+a pipeline. Accesses are counted like the multi-threaded access counter: from
+the access that makes an address shared on, crediting one earlier access to
+its first thread.
+
+The matrices are dense NumPy arrays for up to `DENSE_THREAD_LIMIT` threads and
+dicts of `(a, b)` entries beyond that (or without NumPy).
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import Counter
+from collections.abc import Iterator
+import csv
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from trace_addresses import AddressIndex, AddressStateTable
+
+DENSE_THREAD_LIMIT = 512
+NO_THREAD_SET = -1
+
+
+class SharingMatrix:
+    """T x T counters indexed by sequential thread ids (1-based)."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.dense = np is not None and size <= DENSE_THREAD_LIMIT
+        self.values = np.zeros((size, size), dtype=np.int64) if self.dense else {}
+
+    def add(self, threads: list[int], counts: list[int]) -> None:
+        """Adds `counts[i]` to row `threads[i]` in every column of `threads`."""
+        if self.dense:
+            indexes = np.array(threads) - 1
+            self.values[np.ix_(indexes, indexes)] += np.array(counts, dtype=np.int64)[:, None]
+            return
+
+        values = self.values
+        for row, count in zip(threads, counts):
+            for column in threads:
+                values[row, column] = values.get((row, column), 0) + count
+
+    def items(self) -> Iterator[tuple[int, int, int]]:
+        """Non-zero `(a, b, count)` entries, by row and column."""
+        if self.dense:
+            rows, columns = np.nonzero(self.values)
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                yield row + 1, column + 1, int(self.values[row, column])
+            return
+
+        for (row, column), count in sorted(self.values.items()):
+            yield row, column, count
+
+
+class ThreadPairs:
+    def __init__(self, address_table: dict[int, int] | AddressStateTable | None = None) -> None:
+        # Per shared address record: its first two threads and their accesses since the address became shared
+        self.index = AddressIndex(address_table)
+        self.first_threads = array("i")
+        self.second_threads = array("i")
+        self.first_counts = array("Q")
+        self.second_counts = array("Q")
+        # Id of the further threads of the record in `more_threads`, or NO_THREAD_SET
+        self.thread_set_ids = array("i")
+        # (further threads, their accesses) per thread set id
+        self.more_threads: list[tuple[array, array]] = []
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def update(self, pointer: int, thread_id: int, first_thread: int | None) -> None:
+        """Counts an access to a shared address; `first_thread` is set on the access that shares it."""
+        record = self.index.get(pointer)
+        if record is None:
+            self.index.add(pointer)
+            self.first_threads.append(first_thread)
+            self.second_threads.append(thread_id)
+            self.first_counts.append(1)
+            self.second_counts.append(1)
+            self.thread_set_ids.append(NO_THREAD_SET)
+            return
+
+        if thread_id == self.first_threads[record]:
+            self.first_counts[record] += 1
+        elif thread_id == self.second_threads[record]:
+            self.second_counts[record] += 1
+        else:
+            thread_set_id = self.thread_set_ids[record]
+            if thread_set_id == NO_THREAD_SET:
+                self.thread_set_ids[record] = len(self.more_threads)
+                self.more_threads.append((array("i", (thread_id,)), array("Q", (1,))))
+                return
+
+            threads, counts = self.more_threads[thread_set_id]
+            for position, thread in enumerate(threads):
+                if thread == thread_id:
+                    counts[position] += 1
+                    return
+            threads.append(thread_id)
+            counts.append(1)
+
+    def address_threads(self) -> Iterator[dict[int, int]]:
+        """{thread id: accesses} of every shared address, in the order addresses became shared."""
+        for record in range(len(self.index)):
+            threads = {self.first_threads[record]: self.first_counts[record], self.second_threads[record]: self.second_counts[record]}
+            thread_set_id = self.thread_set_ids[record]
+            if thread_set_id != NO_THREAD_SET:
+                threads.update(zip(*self.more_threads[thread_set_id]))
+            yield threads
+
+    def thread_sets(self) -> tuple[Counter, dict[tuple[int, ...], dict[int, int]]]:
+        """Shared addresses per set of threads, and the accesses of each thread in each set."""
+        addresses: Counter = Counter()
+        accesses: dict[tuple[int, ...], dict[int, int]] = {}
+
+        for threads in self.address_threads():
+            key = tuple(sorted(threads))
+            addresses[key] += 1
+            set_accesses = accesses.setdefault(key, {})
+            for thread_id, count in threads.items():
+                set_accesses[thread_id] = set_accesses.get(thread_id, 0) + count
+
+        return addresses, accesses
+
+    def matrices(self, thread_count: int) -> tuple[SharingMatrix, SharingMatrix]:
+        """(shared addresses, shared accesses) matrices for threads 1..thread_count."""
+        shared_addresses = SharingMatrix(thread_count)
+        shared_accesses = SharingMatrix(thread_count)
+
+        # Addresses with the same thread set are credited at once.
+        addresses, accesses = self.thread_sets()
+        for key, count in addresses.items():
+            threads = list(key)
+            shared_addresses.add(threads, [count] * len(threads))
+            shared_accesses.add(threads, [accesses[key][thread_id] for thread_id in threads])
+
+        return shared_addresses, shared_accesses
+
+
+def write_matrices(
+    path: str,
+    shared_addresses: SharingMatrix,
+    shared_accesses: SharingMatrix,
+    thread_ids: dict[int, int],
+) -> None:
+    """Writes the matrices to `path`: a NumPy archive if it ends with .npz, CSV triples otherwise."""
+    raw_threads = {thread_id: thread for thread, thread_id in thread_ids.items()}
+
+    if path.endswith(".npz"):
+        if np is None:
+            raise RuntimeError("writing .npz files needs the numpy module")
+
+        # Row/column i is the sequential thread id i + 1; `threads` maps it back to the trace.
+        threads = np.array([raw_threads[thread_id] for thread_id in range(1, shared_addresses.size + 1)], dtype=np.int64)
+        if shared_addresses.dense:
+            np.savez_compressed(path, threads=threads, shared_addresses=shared_addresses.values, shared_accesses=shared_accesses.values)
+            return
+
+        entries = np.array([(row, column, count, shared_accesses.values[row, column]) for row, column, count in shared_addresses.items()], dtype=np.int64).reshape(-1, 4)
+        np.savez_compressed(
+            path,
+            threads=threads,
+            rows=entries[:, 0] - 1,
+            columns=entries[:, 1] - 1,
+            shared_addresses=entries[:, 2],
+            shared_accesses=entries[:, 3],
+        )
+        return
+
+    access_counts = {(row, column): count for row, column, count in shared_accesses.items()}
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow(("thread_a", "thread_b", "trace_thread_a", "trace_thread_b", "shared_addresses", "shared_accesses"))
+        for row, column, count in shared_addresses.items():
+            writer.writerow((row, column, raw_threads[row], raw_threads[column], count, access_counts[row, column]))
@@ -0,0 +1,109 @@
+"""Sharing profile of a TSan access trace over time.
+
+The trace is cut into windows of a fixed number of accesses, and each window
+gets its own row: threads active in it, addresses it touches, addresses that
+become multi-threaded in it and its accesses to multi-threaded addresses. Runs
+of windows with a single active thread are the phases in which a
+single-threaded TSan build (`tsan-st`, `tsan-stmt`) pays off.
+"""
+
+import csv
+import json
+import sys
+
+FIELDS = (
+    "window",
+    "first_access",
+    "accesses",
+    "threads",
+    "addresses",
+    "new_shared_addresses",
+    "multi_accesses",
+    "multi_access_ratio",
+)
+
+
+class WindowProfile:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.windows: list[tuple] = []
+        self._first_access = 0
+        self._accesses = 0
+        self._threads: set[int] = set()
+        self._addresses: set[int] = set()
+        self._new_shared = 0
+        self._multi_accesses = 0
+
+    def update(self, pointer: int, thread_id: int, became_multi: bool, shared: bool) -> None:
+        """Counts one access; `shared` means the address is multi-threaded as of this access."""
+        self._threads.add(thread_id)
+        self._addresses.add(pointer)
+        if became_multi:
+            self._new_shared += 1
+        if shared:
+            self._multi_accesses += 1
+
+        self._accesses += 1
+        if self._accesses == self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Closes the current window (the last one may be shorter than `size`)."""
+        if not self._accesses:
+            return
+
+        self.windows.append((
+            len(self.windows),
+            self._first_access,
+            self._accesses,
+            len(self._threads),
+            len(self._addresses),
+            self._new_shared,
+            self._multi_accesses,
+            round(self._multi_accesses / self._accesses, 6),
+        ))
+
+        self._first_access += self._accesses
+        self._accesses = 0
+        self._threads = set()
+        self._addresses = set()
+        self._new_shared = 0
+        self._multi_accesses = 0
+
+    def single_threaded_phases(self) -> list[tuple[int, int]]:
+        """(first window, window count) of every run of windows with one active thread."""
+        phases = []
+        start = None
+
+        for window in self.windows:
+            if window[3] == 1:
+                if start is None:
+                    start = window[0]
+            elif start is not None:
+                phases.append((start, window[0] - start))
+                start = None
+
+        if start is not None:
+            phases.append((start, len(self.windows) - start))
+
+        return phases
+
+    def write(self, path: str) -> None:
+        """Writes the rows as JSON if `path` ends with .json, as CSV otherwise ('-': CSV to stdout)."""
+        if path.endswith(".json"):
+            with open(path, "w", encoding="utf-8") as output:
+                json.dump({"window_size": self.size, "fields": FIELDS, "rows": self.windows}, output, separators=(",", ":"))
+                output.write("\n")
+            return
+
+        if path == "-":
+            self._write_csv(sys.stdout)
+            return
+
+        with open(path, "w", newline="", encoding="utf-8") as output:
+            self._write_csv(output)
+
+    def _write_csv(self, output) -> None:
+        writer = csv.writer(output)
+        writer.writerow(FIELDS)
+        writer.writerows(self.windows)